@@ -0,0 +1,150 @@
+"""
+Answers requests to wikidata from the recorded fixtures in tests/fixtures, so that entityshape
+can be run without a network
+"""
+import copy
+import json
+import os
+import re
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+FIXTURE_PATH: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "fixtures")
+# The fixture entity which synthetic entities copy their statements from
+SYNTHETIC_TEMPLATE: str = "Q1728820"
+
+
+class FixtureWikidata:
+    """
+    Answers the requests entityshape makes to wikidata using the fixtures, along with any
+    synthetic entities added with add_synthetic_entity
+
+    :param fixture_path: The directory of the fixtures
+    """
+    def __init__(self, fixture_path: str = FIXTURE_PATH) -> None:
+        self._fixture_path: str = fixture_path
+        self._fixtures: dict = {}
+        self._names: dict = self._load("names").get("entities", {})
+
+    def get(self, url: str, params: (dict | None) = None, headers: (dict | None) = None) -> requests.Response:
+        """
+        Answers a request in place of wikidata.get
+
+        :param str url: The url of the request
+        :param dict params: The query parameters of the request
+        :param dict headers: The headers of the request
+        :return: the response
+        """
+        status, body = self.respond(url, params)
+        response: requests.Response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode("utf-8")
+        response.headers["Content-Type"] = "application/json"
+        response.url = url
+        return response
+
+    def respond(self, url: str, params: (dict | None) = None) -> tuple[int, dict]:
+        """
+        Gets the status and json body of the response to a request
+
+        :param str url: The url of the request, which may include a query string
+        :param dict params: Any other query parameters of the request
+        :return: the status and the json of the response
+        """
+        parts = urlsplit(url)
+        query: dict = dict(parse_qsl(parts.query))
+        query.update(params or {})
+        if parts.path.endswith("/w/api.php"):
+            return self._respond_to_api(query)
+        match = re.search(r"(?:EntitySchema:|Special:EntityData/)([EQLP]\d+)", parts.path)
+        if match:
+            fixture: dict = self._load(match.group(1))
+            if fixture:
+                return 200, fixture
+        return 404, {"error": "not found"}
+
+    def add_synthetic_entity(self, statements: int) -> str:
+        """
+        Adds an item with the given number of statements, copied from the statements of a fixture
+
+        :param int statements: The number of statements
+        :return: the id of the new item
+        """
+        entity: str = f"Q9{statements:08d}"
+        template: dict = self._load(SYNTHETIC_TEMPLATE)["entities"][SYNTHETIC_TEMPLATE]
+        template_statements: list = [statement for claim in template["claims"].values() for statement in claim]
+        item: dict = copy.deepcopy({key: value for key, value in template.items() if key != "claims"})
+        item.update({"id": entity, "title": entity, "claims": {}})
+        for number in range(statements):
+            statement: dict = copy.deepcopy(template_statements[number % len(template_statements)])
+            statement["id"] = f"{entity}$synthetic-{number}"
+            item["claims"].setdefault(statement["mainsnak"]["property"], []).append(statement)
+        self._fixtures[entity] = {"entities": {entity: item}}
+        return entity
+
+    def _respond_to_api(self, query: dict) -> tuple[int, dict]:
+        """
+        Answers a request to the action api
+
+        :param dict query: The query parameters of the request
+        :return: the status and the json of the response
+        """
+        if query.get("action") == "query":
+            pages: dict = {}
+            for number, title in enumerate(query.get("titles", "").split("|")):
+                schema: str = title.split(":")[-1]
+                if self._load(schema):
+                    pages[str(number)] = {"title": title, "lastrevid": 1}
+                else:
+                    pages[str(-number - 1)] = {"title": title, "missing": ""}
+            return 200, {"query": {"pages": pages}}
+        if query.get("action") == "wbgetentities":
+            entities: dict = {}
+            for entity in query.get("ids", "").split("|"):
+                entities[entity] = self._get_entity(entity, query.get("props", ""))
+            return 200, {"entities": entities, "success": 1}
+        if query.get("action") == "wbgetclaims":
+            fixture: dict = self._load(query.get("entity", ""))
+            if not fixture:
+                return 200, {"error": {"code": "no-such-entity"}}
+            claims: dict = fixture["entities"][query["entity"]].get("claims", {})
+            if "property" in query:
+                claims = {prop: claim for prop, claim in claims.items() if prop == query["property"]}
+            return 200, {"claims": claims}
+        return 400, {"error": {"code": "badvalue"}}
+
+    def _get_entity(self, entity: str, props: str) -> dict:
+        """
+        Gets the parts of an entity asked for by wbgetentities
+
+        :param str entity: The entity
+        :param str props: The parts of the entity, e.g. labels or claims, or "" for all of it
+        :return: the json of the entity
+        """
+        if entity in self._names:
+            return self._names[entity]
+        fixture: dict = self._load(entity)
+        if not fixture:
+            return {"id": entity, "missing": ""}
+        entity_json: dict = fixture["entities"][entity]
+        if props == "info":
+            return {"id": entity, "lastrevid": entity_json.get("lastrevid", 1)}
+        if props == "claims":
+            return {"id": entity, "claims": entity_json.get("claims", {})}
+        return entity_json
+
+    def _load(self, name: str) -> dict:
+        """
+        Loads a fixture, keeping it for later requests
+
+        :param str name: The name of the fixture, e.g. E236
+        :return: the json of the fixture, or an empty dict if there isn't one
+        """
+        if name not in self._fixtures:
+            fixture_file: str = os.path.join(self._fixture_path, f"{name}.json")
+            self._fixtures[name] = {}
+            if os.path.exists(fixture_file):
+                with open(fixture_file, "r", encoding="utf-8") as fixture:
+                    self._fixtures[name] = json.load(fixture)
+        return self._fixtures[name]
@@ -0,0 +1,188 @@
+"""
+Times each stage of checking entities against entityschemas, with requests to wikidata answered
+from the recorded fixtures
+
+Usage: python -m benchmarks.run --output results.json
+       python -m benchmarks.run --compare before.json after.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable
+from unittest.mock import patch
+
+from jsonasobj import as_json
+from pyshexc.parser_impl.generate_shexj import parse
+
+from benchmarks.fixtures import FixtureWikidata
+from entityshape import wikidata
+from entityshape.api_v1 import shape
+from entityshape.api_v2 import getjsonld
+from entityshape.api_v2.comparejsonld import CompareJSONLD, EntityContext
+from entityshape.api_v2.compiledshape import CompiledShape
+from entityshape.app import app
+from entityshape.labelstore import label_store
+
+# The entityschemas and entities to time, from tests/fixtures
+PAIRS: list = [("E236", "Q100532807"),
+               ("E236", "Q1728820"),
+               ("E295", "Q85396849"),
+               ("E297", "Q97179551"),
+               ("E300", "Q92821370"),
+               ("E56", "L42")]
+# The number of statements in the synthetic items checked against the first entityschema
+SYNTHETIC_SIZES: list = [500, 5000]
+
+
+def measure(function: Callable[[], object], repeat: int) -> dict:
+    """
+    Times a function
+
+    :param function: The function to time
+    :param int repeat: The number of times to run it
+    :return: the fastest, median and mean time in milliseconds
+    """
+    timings: list = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"min_ms": round(min(timings), 3),
+            "median_ms": round(statistics.median(timings), 3),
+            "mean_ms": round(statistics.mean(timings), 3),
+            "repeat": repeat}
+
+
+def clear_caches() -> None:
+    """
+    Empties every cache which lasts between requests
+    """
+    getjsonld.schema_cache.clear()
+    shape.shape_cache.clear()
+    wikidata.schema_store.clear()
+    wikidata.entity_store.clear()
+    wikidata.entity_schema_store.clear()
+    label_store.clear()
+
+
+def run_benchmarks(repeat: int = 5, pairs: (list | None) = None, sizes: (list | None) = None) -> dict:
+    """
+    Times parsing and compiling each entityschema, comparing statements and properties and the
+    whole of v1 and v2 requests, with empty caches (cold) and with caches filled by an earlier
+    request (warm)
+
+    :param int repeat: The number of times to run each benchmark
+    :param list pairs: The (entityschema, entity) pairs to time, by default PAIRS
+    :param list sizes: The sizes of synthetic items to time, by default SYNTHETIC_SIZES
+    :return: the results
+    """
+    pairs = PAIRS if pairs is None else pairs
+    sizes = SYNTHETIC_SIZES if sizes is None else sizes
+    fixtures: FixtureWikidata = FixtureWikidata()
+    pairs = pairs + [(pairs[0][0], fixtures.add_synthetic_entity(size)) for size in sizes if pairs]
+    results: dict = {}
+    client = app.test_client()
+    with patch("entityshape.wikidata.get", side_effect=fixtures.get):
+        for schema in dict.fromkeys(schema for schema, _ in pairs):
+            schema_text: str = fixtures.respond(f"{wikidata.WIKI_URL}/EntitySchema:{schema}")[1]["schemaText"]
+            results[f"parse/{schema}"] = measure(lambda: json.loads(as_json(parse(schema_text))), repeat)
+            schema_json: dict = json.loads(as_json(parse(schema_text)))
+            results[f"compile/{schema}"] = measure(lambda: CompiledShape(schema_json), repeat)
+
+        for schema, entity in pairs:
+            entity_json: dict = fixtures.respond(f"{wikidata.WIKI_URL}/Special:EntityData/{entity}.json")[1]
+            statements: int = sum(len(claim) for claim in entity_json["entities"][entity]["claims"].values())
+            compiled_shape: CompiledShape = CompiledShape(json.loads(as_json(parse(
+                fixtures.respond(f"{wikidata.WIKI_URL}/EntitySchema:{schema}")[1]["schemaText"]))))
+            context: EntityContext = EntityContext(entity, "en", entity_json["entities"][entity])
+            comparison: CompareJSONLD = CompareJSONLD(compiled_shape, entity, "en", context)
+            comparison.get_properties()
+            timings: dict = {
+                "compare_statements": measure(comparison.get_statements, repeat),
+                "compare_properties": measure(comparison.get_properties, repeat),
+                "v2_request_cold": measure(lambda: (clear_caches(), client.get(
+                    f"/api/v2/?entityschema={schema}&entity={entity}&language=en")), repeat),
+                "v2_request_warm": measure(lambda: client.get(
+                    f"/api/v2/?entityschema={schema}&entity={entity}&language=en"), repeat),
+                "v1_request_cold": measure(lambda: (clear_caches(), client.get(
+                    f"/api/?entityschema={schema}&entity={entity}&language=en")), repeat),
+                "v1_request_warm": measure(lambda: client.get(
+                    f"/api/?entityschema={schema}&entity={entity}&language=en"), repeat)}
+            for name, timing in timings.items():
+                results[f"{name}/{schema}/{entity}"] = {**timing, "statements": statements}
+    clear_caches()
+    return {"commit": _get_commit(),
+            "python": platform.python_version(),
+            "results": results}
+
+
+def compare(before: dict, after: dict, threshold: float) -> list:
+    """
+    Compares the median times of two runs of the benchmarks
+
+    :param dict before: The results of the earlier run
+    :param dict after: The results of the later run
+    :param float threshold: The fraction a benchmark may slow down by before it is a regression, e.g. 0.2
+    :return: a line of text for each benchmark in both runs, with regressions marked
+    """
+    lines: list = []
+    for name, result in after["results"].items():
+        if name not in before["results"]:
+            continue
+        old: float = before["results"][name]["median_ms"]
+        new: float = result["median_ms"]
+        change: float = (new - old) / old if old else 0
+        marker: str = "  REGRESSION" if change > threshold else ""
+        lines.append(f"{name}: {old:.3f}ms -> {new:.3f}ms ({change:+.1%}){marker}")
+    return lines
+
+
+def _get_commit() -> str:
+    """
+    Gets the git commit being benchmarked
+
+    :return: the commit hash, or an empty string outside a git checkout
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(arguments: (list | None) = None) -> int:
+    """
+    Runs or compares the benchmarks from the command line
+
+    :return: the exit status, 1 if a comparison found a regression
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="the number of times to run each benchmark (default: 5)")
+    parser.add_argument("--output", default="-", help="where to write the results as json (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two files of results instead of running the benchmarks")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="the slowdown counted as a regression when comparing (default: 0.2)")
+    args: argparse.Namespace = parser.parse_args(arguments)
+
+    if args.compare:
+        with open(args.compare[0], "r", encoding="utf-8") as before, open(args.compare[1], "r", encoding="utf-8") as after:
+            lines: list = compare(json.load(before), json.load(after), args.threshold)
+        print("\n".join(lines))
+        return 1 if any(line.endswith("REGRESSION") for line in lines) else 0
+
+    results: dict = run_benchmarks(args.repeat)
+    text: str = json.dumps(results, indent=2, sort_keys=True)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(text + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
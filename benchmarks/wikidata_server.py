@@ -0,0 +1,173 @@
+"""
+A stand-in for wikidata which answers from the recorded fixtures, so that entityshape can be load
+tested without a network, with optional latency, rate limiting and timeouts
+
+Usage: python -m benchmarks.wikidata_server --port 8001 --latency 0.1 --error-rate 0.05
+       ENTITYSHAPE_WIKIDATA_URL=http://localhost:8001 uvicorn entityshape.asgi:app
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fixtures import FIXTURE_PATH, FixtureWikidata
+
+
+class WikidataServer(ThreadingHTTPServer):
+    """
+    An HTTP server which answers requests to wikidata from the fixtures
+
+    :param tuple address: The host and port to listen on, port 0 picks a free port
+    :param fixtures: The fixtures to answer from
+    :param float latency: Seconds to wait before answering each request
+    :param float jitter: Up to this many seconds more are waited at random
+    :param float error_rate: The fraction of requests answered with 429 Too Many Requests
+    :param float timeout_rate: The fraction of requests which aren't answered
+    :param float timeout: Seconds to wait before closing a request which isn't answered
+    :param seed: The seed for choosing which requests fail, for repeatable runs
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple, fixtures: FixtureWikidata, latency: float = 0, jitter: float = 0,
+                 error_rate: float = 0, timeout_rate: float = 0, timeout: float = 60,
+                 seed: (int | None) = None) -> None:
+        super().__init__(address, WikidataRequestHandler)
+        self.fixtures: FixtureWikidata = fixtures
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.error_rate: float = error_rate
+        self.timeout_rate: float = timeout_rate
+        self.timeout: float = timeout
+        self.counts: dict = {"requests": 0, "errors": 0, "timeouts": 0}
+        self._random: random.Random = random.Random(seed)
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """
+        The url to set ENTITYSHAPE_WIKIDATA_URL to
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def choose_fault(self) -> str:
+        """
+        Chooses at random whether a request fails
+
+        :return: "timeout", "error" or an empty string if the request should be answered
+        """
+        with self._lock:
+            self.counts["requests"] += 1
+            chance: float = self._random.random()
+            if chance < self.timeout_rate:
+                self.counts["timeouts"] += 1
+                return "timeout"
+            if chance < self.timeout_rate + self.error_rate:
+                self.counts["errors"] += 1
+                return "error"
+            return ""
+
+    def get_delay(self) -> float:
+        """
+        Gets the number of seconds to wait before answering a request
+
+        :return: the delay
+        """
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+
+class WikidataRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers a request to the WikidataServer
+    """
+    server: WikidataServer
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        fault: str = self.server.choose_fault()
+        time.sleep(self.server.get_delay())
+        if fault == "timeout":
+            time.sleep(self.server.timeout)
+            self.close_connection = True
+            return
+        if fault == "error":
+            self._send_json(429, {"error": {"code": "ratelimited", "info": "You've exceeded your rate limit."}},
+                            {"Retry-After": "1"})
+            return
+        status, body = self.server.fixtures.respond(self.path)
+        self._send_json(status, body)
+
+    def log_message(self, format: str, *args) -> None:
+        # the default logs every request to stderr, which slows down load tests
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: (dict | None) = None) -> None:
+        """
+        Sends a json response, or 304 Not Modified if the client already has it
+
+        :param int status: The status of the response
+        :param dict body: The json of the response
+        :param dict headers: Any other headers of the response
+        """
+        data: bytes = json.dumps(body).encode("utf-8")
+        etag: str = f'"{hashlib.sha1(data).hexdigest()}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            status, data = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if status in [200, 304]:
+            self.send_header("ETag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main(arguments: (list | None) = None) -> int:
+    """
+    Runs the server from the command line
+
+    :return: the exit status
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost", help="the host to listen on (default: localhost)")
+    parser.add_argument("--port", type=int, default=8001, help="the port to listen on (default: 8001)")
+    parser.add_argument("--fixtures", default=FIXTURE_PATH, help="the directory of fixtures to answer from")
+    parser.add_argument("--latency", type=float, default=0, help="seconds to wait before each response (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0, help="up to this many seconds more to wait (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="the fraction of requests answered with 429 Too Many Requests (default: 0)")
+    parser.add_argument("--timeout-rate", type=float, default=0,
+                        help="the fraction of requests which aren't answered (default: 0)")
+    parser.add_argument("--timeout", type=float, default=60,
+                        help="seconds to hold a request which isn't answered (default: 60)")
+    parser.add_argument("--synthetic", type=int, nargs="*", default=[],
+                        help="the number of statements in each synthetic item to add, e.g. 500 5000")
+    parser.add_argument("--seed", type=int, help="the seed for choosing which requests fail")
+    args: argparse.Namespace = parser.parse_args(arguments)
+
+    fixtures: FixtureWikidata = FixtureWikidata(args.fixtures)
+    synthetic: list = [fixtures.add_synthetic_entity(size) for size in args.synthetic]
+    server: WikidataServer = WikidataServer((args.host, args.port), fixtures, args.latency, args.jitter,
+                                            args.error_rate, args.timeout_rate, args.timeout, args.seed)
+    print(f"Answering requests to wikidata at {server.url}")
+    if synthetic:
+        print(f"Synthetic items: {', '.join(synthetic)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    print(json.dumps(server.counts))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
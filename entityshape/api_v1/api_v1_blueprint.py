@@ -1,5 +1,7 @@
 from flask import Blueprint, request, json, Response
+from requests import RequestException
 
+from entityshape import metrics
 from entityshape.api_v1.shape import Shape
 from entityshape.api_v1.compareshape import CompareShape
 
@@ -19,8 +21,9 @@ def v1():
     language: str = request.args.get("language", default="", type=str)
     try:
         valid: dict = {}
-        entity_shape: Shape = Shape(schema, language)
-        comparison: CompareShape = CompareShape(entity_shape.get_schema_shape(), entity, language)
+        with metrics.schema_timing(schema):
+            entity_shape: Shape = Shape(schema, language)
+            comparison: CompareShape = CompareShape(entity_shape.get_schema_shape(), entity, language)
         payload: dict = {'schema': schema,
                          'name': entity_shape.get_name(),
                          'validity': valid,
@@ -29,7 +32,7 @@ def v1():
                          'statements': comparison.get_statements(),
                          'error': ""}
         status: int = 200
-    except (AttributeError, TypeError, KeyError, IndexError) as exception:
+    except (AttributeError, TypeError, KeyError, IndexError, RequestException) as exception:
         payload: dict = {'schema': "",
                          'name': "",
                          'validity': "",
@@ -39,6 +42,8 @@ def v1():
                          'error': "An error has occurred while translating this schema"}
         status = 500
         print(f"Schema: {schema} - {type(exception).__name__}: {exception}")
+    if request.args.get("debug") == "timing":
+        payload["timing"] = metrics.get_timing_json()
     response: Response = Response(response=json.dumps(payload),
                                   status=status,
                                   mimetype="application/json")
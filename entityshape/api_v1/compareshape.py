@@ -1,9 +1,7 @@
 """
 Compares a json shape from shape.py with wikidata json
 """
-import requests
-
-from requests import Response
+from entityshape import metrics, wikidata
 
 
 class CompareShape:
@@ -22,27 +20,30 @@ class CompareShape:
         self._entity: str = entity
         self._shape: dict = shape
         self._property_responses: dict = {}
+        self._required_claims: dict = {}
 
         self._get_entity_json()
         if self._entities["entities"][self._entity]:
             self._get_props(self._entities["entities"][self._entity]['claims'])
         self._get_property_names(language)
-        self._compare_statements()
-        self._compare_properties()
+        self._get_required_claims()
+        # Properties are assessed from the responses of the statements, so statements go first
+        self._statements: dict = self._compare_statements()
+        self._properties: dict = self._compare_properties()
 
     def get_properties(self) -> dict:
         """
         Gets the result of comparison for each property with the schema
         :return: json for comparison of properties
         """
-        return self._compare_properties()
+        return self._properties
 
     def get_statements(self) -> dict:
         """
         Gets the result of comparison of each statement with the schema
         :return: json for comparison of statements
         """
-        return self._compare_statements()
+        return self._statements
 
     def get_general(self) -> dict:
         """
@@ -60,6 +61,7 @@ class CompareShape:
                     general[item] = "correct"
         return general
 
+    @metrics.timed("statement_comparison")
     def _compare_statements(self):
         """
         Compares the statements in the entity to the schema
@@ -86,6 +88,7 @@ class CompareShape:
             self._property_responses[claim] = property_statement_results
         return statements
 
+    @metrics.timed("property_comparison")
     def _compare_properties(self):
         """
         Compares the properties in the entity to the schema
@@ -145,14 +148,12 @@ class CompareShape:
             cardinality = "not enough correct statements"
         return cardinality
 
+    @metrics.timed("entity_fetch")
     def _get_entity_json(self):
         """
-        Downloads the entity from wikidata
+        Downloads the entity from wikidata, unless it was downloaded recently and hasn't been edited since
         """
-        url: str = f"https://www.wikidata.org/wiki/Special:EntityData/{self._entity}.json"
-        response: Response = requests.get(url=url,
-                                          headers={'User-Agent': 'Userscript Entityshape by User:Teester'})
-        self._entities = response.json()
+        self._entities: dict = wikidata.get_entity(self._entity)
 
     def _get_props(self, claims: dict):
         """
@@ -167,30 +168,33 @@ class CompareShape:
             if claim not in self._props and claim.startswith("P"):
                 self._props.append(claim)
 
+    @metrics.timed("label_fetch")
     def _get_property_names(self, language: str):
         """
         Gets the names of properties from wikidata
         """
-        self._names: dict = {}
-        wikidata_property_list: list = [self._props[i * 49:(i + 1) * 49]
-                                        for i in range((len(self._props) + 48) // 48)]
-        for element in wikidata_property_list:
-            required_properties: str = "|".join(element)
-            response: Response = requests.get(url="https://www.wikidata.org/w/api.php",
-                                              params={"action": "wbgetentities",
-                                                      "ids": required_properties,
-                                                      "props": "labels",
-                                                      "languages": language,
-                                                      "format": "json"},
-                                              headers={'User-Agent': 'Entityshape API by User:Teester'}
-                                              )
-            json_text: dict = response.json()
-            for item in element:
-                try:
-                    self._names[json_text["entities"][item]["id"]] = \
-                        json_text["entities"][item]["labels"][language]["value"]
-                except KeyError:
-                    self._names[json_text["entities"][item]["id"]] = ""
+        self._names: dict = wikidata.get_property_names(self._props, language)
+
+    @metrics.timed("entity_fetch")
+    def _get_required_claims(self):
+        """
+        Downloads the claims of every entity used as the value of a statement with a required
+        constraint in the shape, so that the requirements can be checked without a request
+        for each statement
+        """
+        query_entities: list = []
+        claims: dict = self._entities["entities"][self._entity].get('claims', {})
+        for claim in claims:
+            if claim not in self._shape or "required" not in self._shape[claim]:
+                continue
+            for statement in claims[claim]:
+                value = statement["mainsnak"].get("datavalue", {}).get("value")
+                if isinstance(value, dict) and "id" in value and value["id"] not in query_entities:
+                    query_entities.append(value["id"])
+        if query_entities:
+            entities: dict = wikidata.get_entities(query_entities, {"props": "claims"})
+            for query_entity, entity in entities.items():
+                self._required_claims[query_entity] = entity.get("claims", {})
 
     def _process_allowed_in_shape_claim(self, claim, param):
         allowed = "correct"
@@ -200,8 +204,7 @@ class CompareShape:
                 allowed = "incorrect"
         return allowed
 
-    @staticmethod
-    def _process_required_in_shape_claim(shape_claim, datavalue):
+    def _process_required_in_shape_claim(self, shape_claim, datavalue):
         required: str = ""
         if "required" in shape_claim["required"]:
             shape_claim_required = shape_claim["required"]["required"]
@@ -212,15 +215,9 @@ class CompareShape:
             required_value: str = shape_claim["required"][required_property][0]
 
         query_entity: str = datavalue["value"]["id"]
-        response: Response = requests.get(url="https://www.wikidata.org/w/api.php",
-                                          params={"action": "wbgetclaims",
-                                                  "entity": query_entity,
-                                                  "property": required_property,
-                                                  "format": "json"},
-                                          headers={'User-Agent': 'Entityshape API by User:Teester'})
-        json_text: dict = response.json()
-        if required_property in json_text["claims"]:
-            for key in json_text["claims"][required_property]:
+        query_claims: dict = self._required_claims.get(query_entity, {})
+        if required_property in query_claims:
+            for key in query_claims[required_property]:
                 if key["mainsnak"]["datavalue"]["value"]["id"] == required_value:
                     required = "present"
                 else:
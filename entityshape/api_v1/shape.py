@@ -1,11 +1,38 @@
 """
 Converts entityschema to json suitable for comparing with a wikidata item
 """
+import copy
 import os
 import re
-from typing import Optional, Match, Union, Pattern, Any
+from bisect import bisect_left
+from typing import Optional, Match, Any
 
-import requests
+from entityshape import metrics, wikidata
+from entityshape.cache import LRUCache
+
+# Translated schemas shared by every Shape in the process, keyed by schema and revision.  Names
+# are read from the downloaded schema, so one translation serves every language
+shape_cache: LRUCache = LRUCache(maxsize=128)
+metrics.register_cache("v1_shape", shape_cache)
+
+# Data types we don't check because wikidata won't allow a value of the wrong type to be saved
+DATATYPE_PATTERN: re.Pattern = re.compile("|".join(re.escape(datatype) for datatype in [
+    "IRI",
+    "LITERAL",
+    "xsd:dateTime",
+    "xsd:string",
+    "xsd:decimal",
+    "[ <http://commons.wikimedia.org/wiki/Special:FilePath>~ ]",
+    "[ <http://www.wikidata.org/entity>~ ]"]))
+START_PATTERN: re.Pattern = re.compile(r"start.*=.*@<.*>", re.IGNORECASE)
+SHAPE_NAME_PATTERN: re.Pattern = re.compile(r"\n<.*>")
+SHAPE_REFERENCE_PATTERN: re.Pattern = re.compile(r"<([^<>\n]*)>")
+PROPERTY_LINE_PATTERN: re.Pattern = re.compile(r".+:P\d")
+PROPERTY_PATTERN: re.Pattern = re.compile(r"P\d+")
+SUB_SHAPE_PATTERN: re.Pattern = re.compile(r"<.*>")
+VALUE_SET_PATTERN: re.Pattern = re.compile(r"\[.*]")
+CARDINALITY_PATTERN: re.Pattern = re.compile(r"{.+}")
+CARDINALITY_VALUES_PATTERN: re.Pattern = re.compile(r"{((\d+)|(\d+,\d+))}")
 
 
 class Shape:
@@ -26,14 +53,28 @@ class Shape:
         self._schema_shapes: dict = {}
         self._language: str = language
         self._default_shape_name: str = ""
+        self._parentheses: dict = {}
+        self._openings: list = []
+        self._declarations: dict = {}
+        self._revision: str = ""
         self._get_schema_json(schema)
         self._strip_schema_comments()
-        if self._schema_text != "":
-            try:
+        if self._schema_text == "":
+            # the download failed, so nothing is cached and it is tried again by the next Shape
+            return
+        key: tuple = (schema, self._revision or wikidata.schema_digest(self._schema_text))
+        cached_shape: (dict | None) = shape_cache.get(key)
+        if cached_shape is not None:
+            # _translate_schema builds the shape in place, so each Shape gets its own copy
+            self.schema_shape = copy.deepcopy(cached_shape)
+            return
+        try:
+            with metrics.stage("schema_parse"):
                 self._get_default_shape()
                 self._translate_schema()
-            except (re.error, IndexError, KeyError):
-                print("error")
+        except (re.error, IndexError, KeyError):
+            print("error")
+        shape_cache.set(key, copy.deepcopy(self.schema_shape))
 
     def get_schema_shape(self) -> dict:
         """
@@ -47,6 +88,8 @@ class Shape:
         Gets the name of the schema
         :return: the name of the schema
         """
+        if "labels" not in self._json_text:
+            return ""
         if self._language in self._json_text["labels"]:
             return self._json_text["labels"][self._language]
         return ""
@@ -87,10 +130,10 @@ class Shape:
         except AttributeError:
             shape_json: dict = {}
         for line in shape_array:
-            if re.match(r".+:P\d", line):
+            if PROPERTY_LINE_PATTERN.match(line):
                 child: dict = {}
                 selected_property: str = ""
-                match = re.search(r"P\d+", line)
+                match = PROPERTY_PATTERN.search(line)
                 if match:
                     selected_property = match.group(0)
                 if shape_json.get(selected_property):
@@ -113,16 +156,13 @@ class Shape:
         snak: str = self._get_snak_type(line)
         if "@<" in line:
             sub_shape_name: str = ""
-            match = re.search(r"<.*>", line)
+            match = SUB_SHAPE_PATTERN.search(line)
             if match:
                 sub_shape_name = match.group(0)
             child["shape"] = sub_shape_name[1:-1]
-        if re.search(r"\[.*]", line):
-            required_parameters_string: str = ""
-            match = re.search(r"\[.*]", line)
-            if match:
-                required_parameters_string = match.group(0)
-            required_parameters_string = required_parameters_string.replace("wd:", "")
+        match = VALUE_SET_PATTERN.search(line)
+        if match:
+            required_parameters_string: str = match.group(0).replace("wd:", "")
             if "^" in line:
                 child["not_allowed"] = required_parameters_string[1:-1].split()
             else:
@@ -149,61 +189,74 @@ class Shape:
             shape_json = {"closed": "closed"}
         # a shape where values other than those specified are allowed for the specified properties
         if "EXTRA" in first_line:
-            properties = re.findall(r"P\d+", first_line)
+            properties = PROPERTY_PATTERN.findall(first_line)
             for wikidata_property in properties:
                 shape_json[wikidata_property] = {"extra": "allowed"}
         return shape_json
 
+    @metrics.timed("schema_fetch")
     def _get_schema_json(self, schema) -> None:
         """
-        Downloads the schema from wikidata
+        Downloads the schema from wikidata, unless it hasn't been edited since it was last downloaded
 
         :param schema: the entityschema to be downloaded
         """
-        url: str = f"https://www.wikidata.org/wiki/EntitySchema:{schema}?action=raw"
-        response = requests.get(url=url,
-                                headers={'User-Agent': 'Userscript Entityshape by User:Teester'})
-        self._json_text: dict = response.json()
+        self._json_text, self._revision = wikidata.get_schema(schema)
 
     def _strip_schema_comments(self) -> None:
         """
         Strips the comments out of the schema and converts parts we don't care about
         because they're enforced by wikidata
         """
-        schema_text: str = ""
+        lines: list = []
         # remove comments from the schema
-        for line in self._json_text["schemaText"].splitlines():
+        for line in self._json_text.get("schemaText", "").splitlines():
             head, _, _ = line.partition('# ')
             if line.startswith("#"):
                 head = ""
-            schema_text += f"\n{head.strip()}"
+            head = head.strip()
+            if head:
+                lines.append(head)
         # replace data types with the any value designator(.).  Since wikidata won't allow items
         # to enter the incorrect type (e.g. trying to enter a LITERAL value where an IRI (i.e. a
         # wikidata item) is required will fail to save
-        schema_text = schema_text.replace("IRI", ".")
-        schema_text = schema_text.replace("LITERAL", ".")
-        schema_text = schema_text.replace("xsd:dateTime", ".")
-        schema_text = schema_text.replace("xsd:string", ".")
-        schema_text = schema_text.replace("xsd:decimal", ".")
-        schema_text = schema_text.replace(
-            "[ <http://commons.wikimedia.org/wiki/Special:FilePath>~ ]", ".")
-        schema_text = schema_text.replace("[ <http://www.wikidata.org/entity>~ ]", ".")
-        schema_text = os.linesep.join([s for s in schema_text.splitlines() if s])
-        self._schema_text = schema_text
+        self._schema_text = DATATYPE_PATTERN.sub(".", os.linesep.join(lines))
 
     def _get_default_shape(self) -> None:
         """
         Gets the default shape to start at in the schema
         """
-        default_shape_name: Optional[Match[str]] = re.search(r"start.*=.*@<.*>",
-                                                             self._schema_text, re.IGNORECASE)
+        default_shape_name: Optional[Match[str]] = START_PATTERN.search(self._schema_text)
         if default_shape_name is not None:
             default_name: str = default_shape_name.group(0).replace(" ", "")
             self._default_shape_name = default_name[8:-1]
-            shape_names: list = re.findall(r"\n<.*>", self._schema_text)
+            shape_names: list = SHAPE_NAME_PATTERN.findall(self._schema_text)
+            if shape_names:
+                self._index_schema_text()
             for name in shape_names:
                 self._shapes[name[2:-1]] = self._get_specific_shape(name[2:-1])
 
+    def _index_schema_text(self) -> None:
+        """
+        Finds the matching brackets and where each shape is declared in a single pass over the schema,
+        so that each shape can be extracted without searching the whole schema again
+        """
+        self._parentheses = self._find_parentheses(self._schema_text)
+        self._openings = sorted(self._parentheses)
+        lines: list = self._schema_text.split("\n")
+        offset: int = 0
+        for number, line in enumerate(lines):
+            next_line_opens: bool = number + 1 < len(lines) and lines[number + 1][:1] in ["{", "["]
+            for reference in SHAPE_REFERENCE_PATTERN.finditer(line):
+                name: str = reference.group(1)
+                if name in self._declarations:
+                    continue
+                # a shape is declared where its name is followed by a bracket on the same or the next line
+                rest_of_line: str = line[reference.end():]
+                if next_line_opens or "{" in rest_of_line or "[" in rest_of_line:
+                    self._declarations[name] = offset + reference.start()
+            offset += len(line) + 1
+
     def _get_specific_shape(self, shape_name: str) -> str:
         """
         Extracts a specific shape from the schema
@@ -213,28 +266,12 @@ class Shape:
         """
         if ">" in shape_name:
             shape_name = shape_name[0:shape_name.index(">")]
-        search: Union[Pattern[Union[str, Any]], Pattern] = re.compile(r"<%s>.*\n?([{\[])"
-                                                                      % shape_name)
-        parentheses = self._find_parentheses(self._schema_text)
-        try:
-            shape_index: int = 0
-            match = re.search(search, self._schema_text)
-            if match:
-                shape_index = match.start()
-        except AttributeError:
-            shape_index: int = 0
-            match = re.search("<%s>" % shape_name, self._schema_text)
-            if match:
-                shape_index = match.start()
-        closest = None
-        for character in parentheses:
-            if (character >= shape_index) and (closest is None or character < closest):
-                closest = character
-        if closest:
-            shape_start: int = shape_index
-            shape_end: int = parentheses[closest]
-            shape: str = self._schema_text[shape_start:shape_end]
-            return shape
+        shape_index: int = self._declarations.get(shape_name, 0)
+        # the closest opening bracket at or after the start of the shape
+        position: int = bisect_left(self._openings, shape_index)
+        if position < len(self._openings) and self._openings[position]:
+            closest: int = self._openings[position]
+            return self._schema_text[shape_index:self._parentheses[closest]]
         return ""
 
     @staticmethod
@@ -298,8 +335,8 @@ class Shape:
         elif "{0}" in schema_line:
             cardinality["max"] = 0
             cardinality["min"] = 0
-        elif re.search(r"{.+}", schema_line):
-            match = re.search(r"{((\d+)|(\d+,\d+))}", schema_line)
+        elif CARDINALITY_PATTERN.search(schema_line):
+            match = CARDINALITY_VALUES_PATTERN.search(schema_line)
             if match is not None and hasattr(match, "group"):
                 match = match.group()
                 cardinalities = match[1:-1].split(",")
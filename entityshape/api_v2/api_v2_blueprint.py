@@ -1,11 +1,24 @@
-from flask import Blueprint, request, json, Response
+from typing import Iterator
 
+from flask import Blueprint, request, json, Response, stream_with_context
+from requests import RequestException
+from werkzeug.datastructures import MultiDict
+
+from entityshape import metrics, settings, wikidata
+from entityshape.cache import LRUCache
 from entityshape.api_v2.getjsonld import JSONLDShape
-from entityshape.api_v2.comparejsonld import CompareJSONLD
+from entityshape.api_v2.comparejsonld import CompareJSONLD, EntityContext
 
 
 api_v2 = Blueprint('api_v2', __name__,)
 
+NDJSON: str = "application/x-ndjson"
+# The latest result of comparing each entity with entityschemas, with the revision it was compared at
+result_store: LRUCache = LRUCache(maxsize=256)
+metrics.register_cache("result", result_store)
+# Given as an entityschema, checks the entity against the entityschemas found by discover_schemas
+AUTO_SCHEMA: str = "auto"
+
 
 @api_v2.route('/')
 def v2():
@@ -13,50 +26,593 @@ def v2():
     Compares an entityschema with a wikidata item
     :return: a response to the query
     """
-    schema: (str | None) = request.args.get("entityschema", type=str)
+    schema_list, entity, language = get_v2_arguments(request.args)
+    if _wants_ndjson():
+        return _ndjson_response(_stream_v2(schema_list, entity, language))
+    try:
+        context: EntityContext = EntityContext(entity, language)
+        schemas: list = resolve_schemas(schema_list, context)
+        shapes: list = [get_shape(schema, language) for schema in schemas]
+        payload: dict = get_v2_payload(schemas, entity, language, context, shapes)
+        store_v2_result(schema_list, entity, language, context, payload)
+        status: int = 200
+    except (AttributeError, TypeError, KeyError, IndexError, RequestException) as exception:
+        payload = get_v2_error_payload()
+        status = 500
+        print(f"Schema: {schema_list} - {type(exception).__name__}: {exception}")
+    if request.args.get("debug") == "timing":
+        payload["timing"] = metrics.get_timing_json()
+    response: Response = Response(response=json.dumps(payload),
+                                  status=status,
+                                  mimetype="application/json")
+    return response
+
+
+@api_v2.route('/delta')
+def delta():
+    """
+    Compares an entity with entityschemas again after the statements for a single property have
+    been edited.  If the entity was last compared at the revision before the edit, only that
+    property and its statements are compared and a patch to the last result is returned,
+    otherwise the whole entity is compared again
+    :return: a response to the query
+    """
+    schema_list, entity, language = get_v2_arguments(request.args)
+    prop: str = request.args.get("property", default="", type=str)
+    revision: str = request.args.get("lastrevid", default="", type=str)
+    try:
+        payload: dict = get_v2_delta_payload(schema_list, entity, language, prop, revision)
+        status: int = 200
+    except (AttributeError, TypeError, KeyError, IndexError, RequestException) as exception:
+        payload = get_v2_error_payload()
+        status = 500
+        print(f"Schema: {schema_list} - {type(exception).__name__}: {exception}")
+    if request.args.get("debug") == "timing":
+        payload["timing"] = metrics.get_timing_json()
+    response: Response = Response(response=json.dumps(payload),
+                                  status=status,
+                                  mimetype="application/json")
+    return response
+
+
+def get_v2_arguments(args: MultiDict) -> tuple[list, str, str]:
+    """
+    Gets the entityschemas, entity and language to compare from the query string
+
+    :param args: The arguments of the query string
+    :return: the list of entityschemas, the entity and the language
+    """
+    schema: (str | None) = args.get("entityschema", type=str)
     schema_list: list[str] = []
     if schema:
         schema_list = schema.split(', ')
-    entity: (str | None) = request.args.get("entity", type=str)
+    entity: (str | None) = args.get("entity", type=str)
     if entity is None:
         entity = ""
     if "Lexeme" in entity:
         entity = entity[7:]
-    language: (str | None) = request.args.get("language", type=str)
+    language: (str | None) = args.get("language", type=str)
     if language is None:
         language = ""
-    try:
-        valid: dict = {}
-        names: list = []
-        general: list = []
-        properties: list = []
-        statements: list = []
-        for schema in schema_list:
-            shape: JSONLDShape = JSONLDShape(schema, language)
-            comparison: CompareJSONLD = CompareJSONLD(shape.get_json_ld(), entity, language)
+    return schema_list, entity, language
+
+
+def get_shape(schema: str, language: str) -> JSONLDShape:
+    """
+    Downloads an entityschema, timing it as part of the entityschema
+
+    :param str schema: The entityschema
+    :param str language: The language to get the name of the entityschema in
+    :return: the entityschema
+    """
+    with metrics.schema_timing(schema):
+        return JSONLDShape(schema, language)
+
+
+def uses_discovery(schema_list: list) -> bool:
+    """
+    Checks whether the entityschemas to compare with include AUTO_SCHEMA
+
+    :param list schema_list: The entityschemas from the query string
+    :return: True if entityschemas need to be discovered
+    """
+    return any(schema.lower() == AUTO_SCHEMA for schema in schema_list)
+
+
+def resolve_schemas(schema_list: list, context: EntityContext) -> list:
+    """
+    Replaces AUTO_SCHEMA in the entityschemas to compare with by the entityschemas discovered
+    from the claims of the already downloaded entity
+
+    :param list schema_list: The entityschemas from the query string
+    :param EntityContext context: The downloaded entity
+    :return: the entityschemas to compare with, without duplicates
+    """
+    if not uses_discovery(schema_list):
+        return schema_list
+    return _replace_auto_schema(schema_list, discover_schemas(context.claims))
+
+
+def _replace_auto_schema(schema_list: list, discovered: list) -> list:
+    """
+    Replaces AUTO_SCHEMA in the entityschemas to compare with by the discovered entityschemas
+
+    :param list schema_list: The entityschemas from the query string
+    :param list discovered: The entityschemas discovered for the entity
+    :return: the entityschemas to compare with, without duplicates
+    """
+    schemas: list = []
+    for schema in schema_list:
+        if schema.lower() == AUTO_SCHEMA:
+            schemas.extend(discovered)
+        else:
+            schemas.append(schema)
+    return list(dict.fromkeys(schemas))
+
+
+def get_v2_payload(schema_list: list, entity: str, language: str, context: EntityContext, shapes: list) -> dict:
+    """
+    Compares an entity with each entityschema
+
+    :param list schema_list: The entityschemas
+    :param str entity: The entity
+    :param str language: The language to return property names in
+    :param EntityContext context: The downloaded entity
+    :param list shapes: The JSONLDShape of each entityschema
+    :return: the payload of the response
+    """
+    valid: dict = {}
+    names: list = []
+    general: list = []
+    properties: list = []
+    statements: list = []
+    for schema, shape in zip(schema_list, shapes):
+        with metrics.schema_timing(schema):
+            comparison: CompareJSONLD = CompareJSONLD(shape.get_compiled_shape(), entity, language, context)
             names.append(shape.get_name())
             general.append(comparison.get_general())
             properties.append(comparison.get_properties())
             statements.append(comparison.get_statements())
-        payload: dict = {'schema': schema_list,
-                         'name': names,
-                         'validity': valid,
-                         'general': general,
-                         'properties': properties,
-                         'statements': statements,
+    return {'schema': schema_list,
+            'name': names,
+            'validity': valid,
+            'general': general,
+            'properties': properties,
+            'statements': statements,
+            'error': ""}
+
+
+def store_v2_result(schema_list: list, entity: str, language: str, context: EntityContext, payload: dict) -> None:
+    """
+    Keeps the result of comparing an entity with entityschemas, so that it can be patched by
+    get_v2_delta_payload after an edit.  If the entityschemas were discovered, it is kept for
+    both the entityschemas asked for and those they were resolved to
+
+    :param list schema_list: The entityschemas from the query string
+    :param str entity: The entity
+    :param str language: The language property names are in
+    :param EntityContext context: The downloaded entity
+    :param dict payload: The payload of the response
+    """
+    entity_json: dict = context.entities.get("entities", {}).get(entity, {})
+    if "lastrevid" not in entity_json:
+        return
+    # the payload is copied, as the timing block is added to it after it is stored
+    stored: dict = {"revision": str(entity_json["lastrevid"]), "payload": dict(payload)}
+    if uses_discovery(schema_list):
+        stored["links"] = get_schema_links(context.claims)
+    _set_result(schema_list, entity, language, stored)
+
+
+def _set_result(schema_list: list, entity: str, language: str, stored: dict) -> None:
+    """
+    Puts a result in result_store, for the entityschemas asked for and those they were resolved to
+
+    :param list schema_list: The entityschemas from the query string
+    :param str entity: The entity
+    :param str language: The language property names are in
+    :param dict stored: The revision the entity was compared at, the payload and, if entityschemas
+                        were discovered, the links they were discovered from
+    """
+    result_store.set((entity, tuple(stored["payload"]["schema"]), language), stored)
+    if tuple(schema_list) != tuple(stored["payload"]["schema"]):
+        result_store.set((entity, tuple(schema_list), language), stored)
+
+
+def get_v2_delta_payload(schema_list: list, entity: str, language: str, prop: str, revision: str) -> dict:
+    """
+    Compares an entity with entityschemas after the statements for a property have been edited
+
+    :param list schema_list: The entityschemas
+    :param str entity: The entity
+    :param str language: The language to return property names in
+    :param str prop: The property whose statements were edited
+    :param str revision: The revision id of the edit, or an empty string to use the latest revision
+    :return: the payload of the response, with "full" false and a "patch" to the properties and
+             statements of the last result for each entityschema, or "full" true and the whole
+             result as from get_v2_payload
+    """
+    stored: (dict | None) = result_store.get((entity, tuple(schema_list), language))
+    if stored is not None and prop:
+        schemas: list = stored["payload"]["schema"]
+        if revision == "":
+            revision = wikidata.get_entity_revision(entity)
+        if revision == stored["revision"]:
+            return {'schema': schemas,
+                    'lastrevid': revision,
+                    'full': False,
+                    'patch': [{} for _ in schemas],
+                    'error': ""}
+        parent, latest = wikidata.get_revision_parent(revision)
+        if parent == stored["revision"] and latest == revision:
+            claims: (list | None) = wikidata.get_claims(entity, prop)
+            # the whole entity is compared again if the edit changed the entityschemas discovered
+            links: (dict | None) = None if claims is None else _get_patched_links(stored, schema_list, prop, claims)
+            if claims is not None and links is not None:
+                response, patched_payload = _patch_result(stored["payload"], entity, language, prop, claims,
+                                                          revision)
+                patched: dict = {"revision": revision, "payload": patched_payload}
+                if uses_discovery(schema_list):
+                    patched["links"] = links
+                _set_result(schema_list, entity, language, patched)
+                return response
+
+    context: EntityContext = EntityContext(entity, language)
+    schemas = resolve_schemas(schema_list, context)
+    shapes: list = [get_shape(schema, language) for schema in schemas]
+    payload: dict = get_v2_payload(schemas, entity, language, context, shapes)
+    store_v2_result(schema_list, entity, language, context, payload)
+    entity_json: dict = context.entities.get("entities", {}).get(entity, {})
+    return {**payload, 'lastrevid': str(entity_json.get("lastrevid", "")), 'full': True}
+
+
+def _get_patched_links(stored: dict, schema_list: list, prop: str, claims: list) -> (dict | None):
+    """
+    Gets the links entityschemas are discovered from once the statements for a property have been edited
+
+    :param dict stored: The last result, from result_store
+    :param list schema_list: The entityschemas from the query string
+    :param str prop: The property whose statements were edited
+    :param list claims: The statements the entity now has for the property
+    :return: the links, an empty dict if entityschemas aren't discovered, or None if the edit
+             changed which entityschemas are discovered
+    """
+    if not uses_discovery(schema_list):
+        return {}
+    links: dict = {**stored["links"], **get_schema_links({prop: claims})}
+    if not claims:
+        del links[prop]
+    if _replace_auto_schema(schema_list, get_linked_schemas(links)) != stored["payload"]["schema"]:
+        return None
+    return links
+
+
+def _patch_result(stored_payload: dict, entity: str, language: str, prop: str, claims: list,
+                  revision: str) -> tuple[dict, dict]:
+    """
+    Compares the edited property of an entity with each entityschema, and patches the last result
+
+    :param dict stored_payload: The payload of the last result, from result_store
+    :param list claims: The statements the entity now has for the property
+    :param str revision: The revision id of the edit
+    :return: the payload of the response and the patched payload of the last result
+    """
+    schema_list: list = stored_payload["schema"]
+    # the result for a property only depends on its own statements, so the rest of the entity
+    # isn't needed
+    context: EntityContext = EntityContext(entity, language, {"claims": {prop: claims} if claims else {}})
+    payload: dict = {**stored_payload,
+                     'properties': list(stored_payload["properties"]),
+                     'statements': list(stored_payload["statements"])}
+    patches: list = []
+    for index, schema in enumerate(schema_list):
+        with metrics.schema_timing(schema):
+            shape: JSONLDShape = JSONLDShape(schema, language)
+            comparison: CompareJSONLD = CompareJSONLD(shape.get_compiled_shape(), entity, language, context)
+            property_result: (dict | None) = comparison.get_property(prop)
+            statements: dict = comparison.get_property_statements(prop)
+        for statement, result in payload["statements"][index].items():
+            if result.get("property") == prop and statement not in statements:
+                statements[statement] = None
+        patch: dict = {'properties': {prop: property_result},
+                       'statements': statements}
+        patches.append(patch)
+        payload["properties"][index] = _merge_patch(payload["properties"][index], patch["properties"])
+        payload["statements"][index] = _merge_patch(payload["statements"][index], patch["statements"])
+    return {'schema': schema_list,
+            'lastrevid': revision,
+            'full': False,
+            'patch': patches,
+            'error': ""}, payload
+
+
+def _merge_patch(result: dict, patch: dict) -> dict:
+    """
+    Applies a patch to a result, where a value of None removes the key
+
+    :param dict result: The result
+    :param dict patch: The patch
+    :return: a patched copy of the result
+    """
+    patched: dict = dict(result)
+    for key, value in patch.items():
+        if value is None:
+            patched.pop(key, None)
+        else:
+            patched[key] = value
+    return patched
+
+
+def get_v2_error_payload() -> dict:
+    """
+    Gets the payload of the response when an entity can't be compared
+
+    :return: the payload of the response
+    """
+    return {'schema': "",
+            'name': "",
+            'validity': "",
+            'general': "",
+            'properties': "",
+            'statements': "",
+            'error': "An error has occurred while translating this schema"}
+
+
+@api_v2.route('/batch', methods=['POST'])
+def batch():
+    """
+    Compares entityschemas with many wikidata entities, downloading and parsing each
+    schema once and downloading the entities in bulk
+
+    The body of the request is json of the form
+    {"entityschema": ["E10"], "entities": ["Q42", "Q1"], "language": "en"}
+    :return: a response to the query
+    """
+    body: dict = request.get_json(silent=True) or {}
+    if not _is_valid_batch(body):
+        return _batch_error_response([], "entityschema and entities must be lists of strings, "
+                                         "and language must be a string")
+    schema_list: list = body.get("entityschema", [])
+    if isinstance(schema_list, str):
+        schema_list = schema_list.split(', ')
+    entity_list: list = [entity[7:] if "Lexeme" in entity else entity
+                         for entity in body.get("entities", [])]
+    language: str = body.get("language", "")
+    if len(entity_list) > settings.BATCH_SIZE_LIMIT:
+        return _batch_error_response(schema_list,
+                                     f"A batch can contain at most {settings.BATCH_SIZE_LIMIT} entities")
+    if _wants_ndjson():
+        return _ndjson_response(_stream_batch(schema_list, entity_list, language))
+    try:
+        shapes: list = [JSONLDShape(schema, language) for schema in schema_list]
+        compiled_shapes: list = [shape.get_compiled_shape() for shape in shapes]
+        entities: dict = _get_entities(entity_list, language)
+        results: list = []
+        for entity in entity_list:
+            context: EntityContext = EntityContext(entity, language, entities.get(entity, {}))
+            result: dict = {'entity': entity,
+                            'validity': {},
+                            'general': [],
+                            'properties': [],
+                            'statements': []}
+            for compiled_shape in compiled_shapes:
+                comparison: CompareJSONLD = CompareJSONLD(compiled_shape, entity, language, context)
+                result['general'].append(comparison.get_general())
+                result['properties'].append(comparison.get_properties())
+                result['statements'].append(comparison.get_statements())
+            results.append(result)
+        payload = {'schema': schema_list,
+                   'name': [shape.get_name() for shape in shapes],
+                   'entities': results,
+                   'error': ""}
+        status: int = 200
+    except (AttributeError, TypeError, KeyError, IndexError, RequestException) as exception:
+        payload = {'schema': "",
+                   'name': "",
+                   'entities': "",
+                   'error': "An error has occurred while translating this schema"}
+        status = 500
+        print(f"Schema: {schema_list} - {type(exception).__name__}: {exception}")
+    response: Response = Response(response=json.dumps(payload),
+                                  status=status,
+                                  mimetype="application/json")
+    return response
+
+
+def _is_valid_batch(body: dict) -> bool:
+    """
+    Checks that the body of a batch request has the types batch expects
+
+    :param dict body: The json body of the request
+    :return: True if entityschema is a string or a list of strings, entities is a list of strings
+             and language is a string
+    """
+    if not isinstance(body, dict):
+        return False
+    schemas: (str | list) = body.get("entityschema", [])
+    entities: list = body.get("entities", [])
+    if isinstance(schemas, str):
+        schemas = [schemas]
+    return isinstance(schemas, list) and all(isinstance(schema, str) for schema in schemas) \
+        and isinstance(entities, list) and all(isinstance(entity, str) for entity in entities) \
+        and isinstance(body.get("language", ""), str)
+
+
+def _batch_error_response(schema_list: list, error: str) -> Response:
+    """
+    Gets the response to a batch request which can't be answered
+
+    :param list schema_list: The entityschemas of the request
+    :param str error: What was wrong with the request
+    :return: the response, with status 400
+    """
+    payload: dict = {'schema': schema_list,
+                     'name': "",
+                     'entities': "",
+                     'error': error}
+    return Response(response=json.dumps(payload), status=400, mimetype="application/json")
+
+
+@api_v2.route('/discover')
+def discover():
+    """
+    Finds the entityschemas which may apply to a wikidata entity, from the "has entity schema"
+    (P12861) statements of its properties and of the items it links to
+    :return: a response to the query
+    """
+    entity: str = request.args.get("entity", default="", type=str)
+    if "Lexeme" in entity:
+        entity = entity[7:]
+    try:
+        context: EntityContext = EntityContext(entity, "")
+        payload: dict = {'entity': entity,
+                         'schemas': discover_schemas(context.claims),
                          'error': ""}
         status: int = 200
-    except (AttributeError, TypeError, KeyError, IndexError) as exception:
-        payload: dict = {'schema': "",
-                         'name': "",
-                         'validity': "",
-                         'general': "",
-                         'properties': "",
-                         'statements': "",
-                         'error': "An error has occurred while translating this schema"}
+    except (AttributeError, TypeError, KeyError, IndexError, RequestException) as exception:
+        payload = {'entity': entity,
+                   'schemas': [],
+                   'error': "An error has occurred while finding entityschemas for this entity"}
         status = 500
-        print(f"Schema: {schema} - {type(exception).__name__}: {exception}")
+        print(f"Entity: {entity} - {type(exception).__name__}: {exception}")
     response: Response = Response(response=json.dumps(payload),
                                   status=status,
                                   mimetype="application/json")
     return response
+
+
+def discover_schemas(claims: dict) -> list:
+    """
+    Gets the entityschemas linked with "has entity schema" (P12861) to the properties of an entity
+    and to the items they have as values
+
+    :param dict claims: The claims of the entity
+    :return: the entityschemas, in the order they were found
+    """
+    return get_linked_schemas(get_schema_links(claims))
+
+
+def get_schema_links(claims: dict) -> dict:
+    """
+    Gets the items each property of an entity has as values, which along with the properties
+    themselves may be linked to entityschemas
+
+    :param dict claims: The claims of the entity
+    :return: a list of items, by property
+    """
+    links: dict = {}
+    for prop in claims:
+        links[prop] = []
+        for claim in claims[prop]:
+            snak: dict = claim["mainsnak"]
+            if snak.get("datatype") == "wikibase-item" and "datavalue" in snak:
+                links[prop].append(snak["datavalue"]["value"]["id"])
+    return links
+
+
+def get_linked_schemas(links: dict) -> list:
+    """
+    Gets the entityschemas linked with "has entity schema" (P12861) to properties and their values
+
+    :param dict links: The items each property has as values, from get_schema_links
+    :return: the entityschemas, in the order they were found
+    """
+    linked: list = list(links)
+    for items in links.values():
+        linked.extend(items)
+    linked = list(dict.fromkeys(linked))
+    schemas: list = []
+    for entity_schemas in wikidata.get_entity_schemas(linked).values():
+        schemas.extend(entity_schemas)
+    return list(dict.fromkeys(schemas))
+
+
+def _get_entities(entity_list: list, language: str) -> dict:
+    """
+    Downloads entities in bulk along with the names of all of their properties
+
+    :param list entity_list: The entities to download
+    :param str language: The language to get property names in
+    :return: a dict of the json for each entity, by id
+    """
+    with metrics.stage("entity_fetch"):
+        entities: dict = wikidata.get_entities(entity_list, {})
+    props: list = []
+    for entity_json in entities.values():
+        for prop in entity_json.get("claims", {}):
+            if prop not in props:
+                props.append(prop)
+    with metrics.stage("label_fetch"):
+        wikidata.get_property_names(props, language)
+    return entities
+
+
+def _wants_ndjson() -> bool:
+    """
+    Checks whether the client asked for results to be streamed as newline delimited json
+
+    :return: True if results should be streamed
+    """
+    return request.accept_mimetypes.best_match(["application/json", NDJSON]) == NDJSON
+
+
+def _ndjson_response(results: Iterator[dict]) -> Response:
+    """
+    Streams results to the client as newline delimited json, one line per result as it is computed
+
+    :param results: The results to be streamed
+    :return: a streaming response
+    """
+    def generate() -> Iterator[str]:
+        try:
+            for result in results:
+                yield json.dumps(result) + "\n"
+        except (AttributeError, TypeError, KeyError, IndexError, RequestException) as exception:
+            print(f"{type(exception).__name__}: {exception}")
+            yield json.dumps({'error': "An error has occurred while translating this schema"}) + "\n"
+    return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+
+def _stream_v2(schema_list: list, entity: str, language: str) -> Iterator[dict]:
+    """
+    Compares an entity with each entityschema in turn
+
+    :return: the result for each schema
+    """
+    context: EntityContext = EntityContext(entity, language)
+    for schema in resolve_schemas(schema_list, context):
+        shape: JSONLDShape = JSONLDShape(schema, language)
+        comparison: CompareJSONLD = CompareJSONLD(shape.get_compiled_shape(), entity, language, context)
+        yield _get_result(entity, schema, shape.get_name(), comparison)
+
+
+def _stream_batch(schema_list: list, entity_list: list, language: str) -> Iterator[dict]:
+    """
+    Compares each entity with each entityschema, downloading the entities a chunk at a time
+
+    :return: the result for each entity and schema
+    """
+    shapes: list = [JSONLDShape(schema, language) for schema in schema_list]
+    compiled_shapes: list = [shape.get_compiled_shape() for shape in shapes]
+    for i in range(0, len(entity_list), wikidata.MAX_IDS_PER_REQUEST):
+        chunk: list = entity_list[i:i + wikidata.MAX_IDS_PER_REQUEST]
+        entities: dict = _get_entities(chunk, language)
+        for entity in chunk:
+            context: EntityContext = EntityContext(entity, language, entities.get(entity, {}))
+            for schema, shape, compiled_shape in zip(schema_list, shapes, compiled_shapes):
+                comparison: CompareJSONLD = CompareJSONLD(compiled_shape, entity, language, context)
+                yield _get_result(entity, schema, shape.get_name(), comparison)
+
+
+def _get_result(entity: str, schema: str, name: str, comparison: CompareJSONLD) -> dict:
+    """
+    Gets the result of comparing an entity with a single entityschema
+
+    :return: the result
+    """
+    return {'entity': entity,
+            'schema': schema,
+            'name': name,
+            'general': comparison.get_general(),
+            'properties': comparison.get_properties(),
+            'statements': comparison.get_statements()}
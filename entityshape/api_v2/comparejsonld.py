@@ -1,14 +1,69 @@
 """
 A class to compare a wikidata entity with a JSON-LD representation of an entityschema
 """
-import json
-import re
-
-import requests
-from requests import Response
-
+from entityshape import metrics, wikidata
 from entityshape.api_v2.compareproperties import CompareProperties
 from entityshape.api_v2.comparestatements import CompareStatements
+from entityshape.api_v2.compiledshape import CompiledShape
+
+
+class EntityContext:
+    """
+    Holds the parts of a wikidata entity which are shared by every schema it is compared with,
+    so that a request checking several schemas only downloads the entity and its property names once
+
+    :param entity: The Q number of the wikidata entity
+    :param language: The language to get property names in as a 2-letter code
+    :param entity_json: The json of the entity if it has already been downloaded, e.g. by wbgetentities
+    :param names: The names of properties if they are already known, e.g. from a dump.  When given,
+                  names are never downloaded and properties not in names are given an empty name
+    """
+
+    def __init__(self, entity: str, language: str, entity_json: (dict | None) = None,
+                 names: (dict | None) = None) -> None:
+        self._entity: str = entity
+        self._language: str = language
+        self.entities: dict = {}
+        self.claims: dict = {}
+        self._names: dict = names if names is not None else {}
+        self._offline: bool = names is not None
+
+        if entity_json is None:
+            self._get_entity_json()
+        elif entity_json and "missing" not in entity_json:
+            self.entities = {"entities": {self._entity: entity_json}}
+        if "entities" in self.entities and self.entities["entities"][self._entity]:
+            self.claims = self.entities["entities"][self._entity]['claims']
+
+    def get_names(self, props: list) -> dict:
+        """
+        Gets the names of the given properties, only downloading names not already known
+
+        :param list props: The properties to get names for
+        :return: a dict of property names
+        """
+        missing: list = [prop for prop in props if prop not in self._names]
+        if missing and not self._offline:
+            self._get_property_names(missing)
+        return {prop: self._names.get(prop, "") for prop in props}
+
+    @metrics.timed("entity_fetch")
+    def _get_entity_json(self) -> None:
+        """
+        Downloads the entity from wikidata, unless it was downloaded recently and hasn't been
+        edited since, and assigns the json to self.entities
+        """
+        self.entities = wikidata.get_entity(self._entity)
+
+    @metrics.timed("label_fetch")
+    def _get_property_names(self, props: list) -> None:
+        """
+        Gets the names of properties from wikidata and adds them to self._names
+
+        :param list props: The properties to get names for
+        :return: Nothing
+        """
+        self._names.update(wikidata.get_property_names(props, self._language))
 
 
 class CompareJSONLD:
@@ -16,33 +71,38 @@ class CompareJSONLD:
     A class to compare a wikidata entity with a JSON-LD representation of an entityschema
     """
 
-    def __init__(self, shape: dict, entity: str, language: str) -> None:
+    def __init__(self, shape: (dict | CompiledShape), entity: str, language: str,
+                 context: (EntityContext | None) = None) -> None:
         """
         Compares json from a wikidata entity with the json-ld representation of an entityschema
 
-        :param dict shape: The json-ld representation of the entityschema to be assessed against
+        :param shape: The json-ld representation of the entityschema to be assessed against,
+                      or the entityschema already compiled by JSONLDShape.get_compiled_shape
         :param str entity: The Q number of the wikidata entity to be assessed
         :param str language: The language to return the results in as a 2-letter code
+        :param EntityContext context: The already downloaded entity, shared between comparisons
         """
+        if context is None:
+            context = EntityContext(entity, language)
+        self._compiled: CompiledShape = shape if isinstance(shape, CompiledShape) else CompiledShape(shape)
         self._entity: str = entity
-        self._shape: dict = shape
-        self._entities: dict = {}
+        self._shape: dict = self._compiled.schema
+        self._entities: dict = context.entities
         self._props: list = []
         self._property_responses: dict = {}
 
-        self._get_entity_json()
         if "entities" in self._entities and self._entities["entities"][self._entity]:
-            self._get_props(self._entities["entities"][self._entity]['claims'])
-        self._get_property_names(language)
-        self.start_shape: dict = self._get_start_shape()
+            self._get_props(context.claims)
+        self._names: dict = context.get_names(self._props)
+        self.start_shape: dict = self._compiled.start_shape
 
     def get_properties(self) -> dict:
         """
         Gets the result of comparison for each property with the schema
         :return: json for comparison of properties
         """
-        props: CompareProperties = CompareProperties(self._entity, self._entities,
-                                                     self._props, self._names, self.start_shape)
+        props: CompareProperties = CompareProperties(self._entity, self._entities, self._props,
+                                                     self._names, self.start_shape, self._compiled)
         return props.compare_properties()
 
     def get_statements(self) -> dict:
@@ -50,7 +110,36 @@ class CompareJSONLD:
         Gets the result of comparison of each statement with the schema
         :return: json for comparison of statements
         """
-        statements: CompareStatements = CompareStatements(self._entities, self._entity, self.start_shape)
+        statements: CompareStatements = CompareStatements(self._entities, self._entity,
+                                                          self.start_shape, self._compiled)
+        return statements.compare_statements()
+
+    def get_property(self, prop: str) -> (dict | None):
+        """
+        Gets the result of comparison for a single property with the schema
+
+        :param str prop: The property
+        :return: json for comparison of the property, or None if it is neither in the entity nor the schema
+        """
+        if prop not in self._props:
+            return None
+        props: CompareProperties = CompareProperties(self._entity, self._entities, [prop],
+                                                     self._names, self.start_shape, self._compiled)
+        return props.compare_properties().get(prop)
+
+    def get_property_statements(self, prop: str) -> dict:
+        """
+        Gets the result of comparison of each of the statements for a single property with the schema
+
+        :param str prop: The property
+        :return: json for comparison of the statements
+        """
+        if "entities" not in self._entities:
+            return {}
+        claims: dict = self._entities["entities"][self._entity]['claims']
+        entities: dict = {"entities": {self._entity: {"claims": {prop: claims.get(prop, [])}}}}
+        statements: CompareStatements = CompareStatements(entities, self._entity,
+                                                          self.start_shape, self._compiled)
         return statements.compare_statements()
 
     def get_general(self) -> dict:
@@ -67,25 +156,14 @@ class CompareJSONLD:
         general: dict = {}
         properties: list = ["lexicalCategory", "language"]
         for item in properties:
-            data_string: str = json.dumps(self._shape["shapes"])
-            if item in data_string and item in self._entities["entities"][self._entity]:
+            if item in self._compiled.general_constraints and item in self._entities["entities"][self._entity]:
                 general[item] = "incorrect"
-                expected: list = self._shape["shapes"]
+                expected: list = self._compiled.general_constraints[item]
                 actual: str = self._entities["entities"][self._entity][item]
-                if actual in expected:
+                if not expected or f"http://www.wikidata.org/entity/{actual}" in expected:
                     general[item] = "correct"
         return general
 
-    def _get_entity_json(self) -> None:
-        """
-        Downloads the entity from wikidata and assigns the json to self._entities
-        """
-        url: str = f"https://www.wikidata.org/wiki/Special:EntityData/{self._entity}.json"
-        response: Response = requests.get(url=url,
-                                          headers={'User-Agent': 'Userscript Entityshape by User:Teester'})
-        if response.status_code == 200:
-            self._entities = response.json()
-
     def _get_props(self, claims: dict) -> None:
         """
         Gets a list of properties included in the entity and assigns them to self._props
@@ -98,52 +176,6 @@ class CompareJSONLD:
             if claim not in self._props:
                 self._props.append(claim)
         # Get properties from the shape
-        if "shapes" in self._shape:
-            for shape in self._shape["shapes"]:
-                properties: list = re.findall(r'P\d+', json.dumps(shape))
-                for prop in properties:
-                    if prop not in self._props and prop.startswith("P") and len(prop) > 1:
-                        self._props.append(prop)
-
-    def _get_property_names(self, language: str) -> None:
-        """
-        Gets the names of properties from wikidata and assigns them as a dict to self._names
-
-        :param str language: The language in which to get the property names
-        :return: Nothing
-        """
-        self._names: dict = {}
-        wikidata_property_list: list = [self._props[i * 49:(i + 1) * 49]
-                                        for i in range((len(self._props) + 48) // 48)]
-        for element in wikidata_property_list:
-            required_properties: str = "|".join(element)
-            response: Response = requests.get(url="https://www.wikidata.org/w/api.php",
-                                              params={"action": "wbgetentities",
-                                                      "ids": required_properties,
-                                                      "props": "labels",
-                                                      "languages": language,
-                                                      "format": "json"},
-                                              headers={'User-Agent': 'Entityshape API by User:Teester'})
-            json_text: dict = response.json()
-            for item in element:
-                try:
-                    self._names[json_text["entities"][item]["id"]] = \
-                        json_text["entities"][item]["labels"][language]["value"]
-                except KeyError:
-                    self._names[json_text["entities"][item]["id"]] = ""
-
-    def _get_start_shape(self) -> dict:
-        """
-        Gets the shape associated with the start parameter of the entityschema
-
-        :return: the start shape
-        """
-        if "start" not in self._shape:
-            return {}
-        if "shapes" not in self._shape:
-            return {}
-
-        for shape in self._shape['shapes']:
-            if shape["id"] == self._shape["start"]:
-                return shape
-        return {}
+        for prop in self._compiled.properties:
+            if prop not in self._props:
+                self._props.append(prop)
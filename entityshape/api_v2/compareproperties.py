@@ -1,15 +1,21 @@
+from entityshape import metrics
+from entityshape.api_v2.compiledshape import CompiledShape
 from entityshape.api_v2.utilities import Utilities
 
 
 class CompareProperties:
 
-    def __init__(self, entity: str, entities: dict, props: list, names: dict, start_shape: dict) -> None:
+    def __init__(self, entity: str, entities: dict, props: list, names: dict, start_shape: dict,
+                 compiled_shape: (CompiledShape | None) = None) -> None:
         self._entities: dict = entities
         self._names: dict = names
         self._entity: str = entity
         self._props: list = props
         self._start_shape: dict = start_shape
+        self._compiled: CompiledShape = compiled_shape if compiled_shape is not None \
+            else CompiledShape({}, start_shape)
 
+    @metrics.timed("property_comparison")
     def compare_properties(self) -> dict:
         """
 
@@ -26,10 +32,9 @@ class CompareProperties:
         properties: dict = {}
         if self._start_shape is None:
             return properties
-        utilities: Utilities = Utilities()
         for prop in self._props:
             child: dict = {"name": self._names[prop],
-                           "necessity": utilities.calculate_necessity(prop, self._start_shape)}
+                           "necessity": self._compiled.necessity(prop)}
             if prop in claims:
                 response: str = self.check_claims_for_props(claims, prop)
             else:
@@ -49,18 +54,15 @@ class CompareProperties:
         """
         cardinality: str = "correct"
         allowed: str = "present"
-        if "expression" not in self._start_shape:
+        if not self._compiled.has_expressions:
             return "present"
-        if "expressions" not in self._start_shape["expression"]:
-            return "present"
-        for expression in self._start_shape["expression"]["expressions"]:
-            if "predicate" in expression and expression["predicate"].endswith(prop):
-                allowed_list = self._get_allowed_list(claims, prop, expression)
-                cardinality2 = self._process_cardinalities(expression, allowed_list, self._start_shape, prop)
-                if cardinality2 not in ["", "correct"]:
-                    cardinality = cardinality2
-                if "correct" in allowed_list:
-                    allowed = "correct"
+        for expression in self._compiled.constraints(prop):
+            allowed_list = self._get_allowed_list(claims, prop, expression)
+            cardinality2 = self._process_cardinalities(expression, allowed_list, self._start_shape, prop)
+            if cardinality2 not in ["", "correct"]:
+                cardinality = cardinality2
+            if "correct" in allowed_list:
+                allowed = "correct"
         if cardinality == "correct":
             response: str = allowed
         else:
@@ -78,10 +80,8 @@ class CompareProperties:
                 is_it_allowed = self._process_triple_constraint(statement["mainsnak"],
                                                                 expression,
                                                                 "")
-            if "extra" in self._start_shape:
-                for extra in self._start_shape["extra"]:
-                    if extra.endswith(prop) and is_it_allowed == "incorrect":
-                        is_it_allowed = "allowed"
+            if is_it_allowed == "incorrect" and self._compiled.is_extra(prop):
+                is_it_allowed = "allowed"
             allowed_list.append(is_it_allowed)
         return allowed_list
 
@@ -92,26 +92,30 @@ class CompareProperties:
             return ""
         occurrences: int = allowed_list.count("correct")
         occurrences += allowed_list.count("present")
-        cardinality: str = "correct"
-        for expression in shape["expression"]["expressions"]:
-            if "predicate" in expression and expression["predicate"].endswith(prop):
-                cardinality = self._get_cardinalities(occurrences, expression)
-                predicate: str = f'http://www.wikidata.org/prop/direct/{prop}'
-                if "extra" in shape and predicate in shape["extra"] and cardinality == "too many statements":
-                    cardinality = "correct"
+        compiled: CompiledShape = self._compiled if shape is self._start_shape else CompiledShape({}, shape)
+        if not compiled.constraints(prop):
+            return "correct"
+        min_card, max_card = compiled.bounds(prop)
+        cardinality: str = self._check_cardinality(occurrences, min_card, max_card)
+        if cardinality == "too many statements" and compiled.is_direct_extra(prop):
+            cardinality = "correct"
         return cardinality
 
     @staticmethod
     def _get_cardinalities(occurrences: int, expression: dict) -> str:
-        cardinality: str = "correct"
-        min_cardinality: bool = True
-        max_cardinality: bool = True
         max_card: int = 1
         min_card: int = 1
         if "max" in expression:
             max_card = expression["max"]
         if "min" in expression:
             min_card = expression["min"]
+        return CompareProperties._check_cardinality(occurrences, min_card, max_card)
+
+    @staticmethod
+    def _check_cardinality(occurrences: int, min_card: int, max_card: int) -> str:
+        cardinality: str = "correct"
+        min_cardinality: bool = True
+        max_cardinality: bool = True
         if max_card < occurrences:
             max_cardinality = False
         if min_card > occurrences:
@@ -1,15 +1,21 @@
 from typing import Tuple, Any
 
+from entityshape import metrics
+from entityshape.api_v2.compiledshape import CompiledShape
 from entityshape.api_v2.utilities import Utilities
 
 
 class CompareStatements:
 
-    def __init__(self, entities: dict, entity: str, start_shape: dict) -> None:
+    def __init__(self, entities: dict, entity: str, start_shape: dict,
+                 compiled_shape: (CompiledShape | None) = None) -> None:
         self._entities: dict = entities
         self._entity: str = entity
         self.start_shape: dict = start_shape
+        self._compiled: CompiledShape = compiled_shape if compiled_shape is not None \
+            else CompiledShape({}, start_shape)
 
+    @metrics.timed("statement_comparison")
     def compare_statements(self) -> dict:
         """
         Compares the statements with the shape
@@ -25,8 +31,7 @@ class CompareStatements:
             property_statement_results: list = []
             for statement in claims[claim]:
                 child: dict = {"property": claim}
-                utilities: Utilities = Utilities()
-                necessity = utilities.calculate_necessity(statement["mainsnak"]["property"], self.start_shape)
+                necessity = self._compiled.necessity(statement["mainsnak"]["property"])
                 if necessity != "absent":
                     child["necessity"] = necessity
                 child, allowed = self._process_shape(statement["mainsnak"], self.start_shape, child)
@@ -45,12 +50,11 @@ class CompareStatements:
         :param child: The current response from the assessment
         :return: child and allowed
         """
-        expressions: dict = {}
-        if "expression" in shape and "expressions" in shape["expression"]:
-            expressions = shape["expression"]["expressions"]
+        compiled: CompiledShape = self._compiled if shape is self.start_shape else CompiledShape({}, shape)
         allowed: str = "not in schema"
-        for expression in expressions:
-            allowed = self.process_expressions(expression, shape, statement, allowed)
+        if "property" in statement:
+            for expression in compiled.triple_constraints(statement["property"]):
+                allowed = self.process_expressions(expression, shape, statement, allowed)
         if allowed != "":
             child["response"] = allowed
         return child, allowed
@@ -90,7 +94,6 @@ class CompareStatements:
 
         if expression["predicate"].endswith(statement["property"]):
             allowed = "allowed"
-            Utilities.process_cardinalities(expression, {"mainsnak": statement})
             try:
                 if expression["valueExpr"]["type"] == "NodeConstraint":
                     allowed = Utilities.process_node_constraint(statement,
@@ -0,0 +1,190 @@
+"""
+An index of the constraints in the start shape of an entityschema, built once per schema
+"""
+import re
+
+from entityshape.api_v2.utilities import Utilities
+
+PROPERTY_NAMESPACE: str = "http://www.wikidata.org/prop/"
+# The predicates of constraints on parts of an entity other than its statements
+GENERAL_PREDICATES: dict = {"http://wikiba.se/ontology#lexicalCategory": "lexicalCategory",
+                            "http://purl.org/dc/terms/language": "language"}
+PROPERTY_PATTERN: re.Pattern = re.compile(r"P\d+")
+
+
+class CompiledShape:
+    """
+    Indexes the triple constraints of the start shape of an entityschema by property, so that
+    comparisons look up the constraints for a property instead of scanning every expression
+    of the shape for every property and statement.
+
+    Lookups are worked out the first time a property is asked for and kept for the lifetime
+    of the compiled shape, which is cached with the parsed schema.  The properties referred to
+    by every shape and the general constraints (lexicalCategory and language) are found when
+    the shape is compiled.
+
+    :param schema: The json-ld representation of the entityschema
+    :param start_shape: The shape to index, if not the start shape of the schema
+    """
+    def __init__(self, schema: dict, start_shape: (dict | None) = None) -> None:
+        self.schema: dict = schema
+        self.start_shape: dict = self._get_start_shape() if start_shape is None else start_shape
+        self.has_expressions: bool = False
+        self._expressions: list = []
+        self._necessity_expressions: list = []
+        self._extra: list = []
+        self._constraints: dict = {}
+        self._triple_constraints: dict = {}
+        self._necessities: dict = {}
+        self._bounds: dict = {}
+        self._extras: dict = {}
+        self.properties: list = []
+        self.general_constraints: dict = {}
+
+        self._walk_shapes()
+        shape: dict = self.start_shape or {}
+        if "expression" in shape:
+            if "expressions" in shape["expression"]:
+                self.has_expressions = True
+                self._expressions = shape["expression"]["expressions"]
+                self._necessity_expressions = self._expressions
+            else:
+                self._necessity_expressions = [shape["expression"]]
+        if "extra" in shape:
+            self._extra = shape["extra"]
+
+    def constraints(self, prop: str) -> list:
+        """
+        Gets the expressions of the start shape with a predicate ending in the property
+
+        :param str prop: The property, e.g. P31
+        :return: the expressions in the order they appear in the shape
+        """
+        if prop not in self._constraints:
+            self._constraints[prop] = [expression for expression in self._expressions
+                                       if "predicate" in expression and expression["predicate"].endswith(prop)]
+        return self._constraints[prop]
+
+    def triple_constraints(self, prop: str) -> list:
+        """
+        Gets the triple constraints of the start shape with a predicate ending in the property
+
+        :param str prop: The property, e.g. P31
+        :return: the triple constraints in the order they appear in the shape
+        """
+        if prop not in self._triple_constraints:
+            self._triple_constraints[prop] = [expression for expression in self.constraints(prop)
+                                              if "type" in expression and expression["type"] == "TripleConstraint"]
+        return self._triple_constraints[prop]
+
+    def necessity(self, prop: str) -> str:
+        """
+        Gets whether a property is required, optional or absent from the start shape
+
+        :param str prop: The property, e.g. P31
+        :return: necessity
+        """
+        if prop not in self._necessities:
+            necessity: str = "absent"
+            for expression in self._necessity_expressions:
+                if "predicate" in expression and expression["predicate"].endswith(prop):
+                    necessity = Utilities.required_or_absent(expression)
+            self._necessities[prop] = necessity
+        return self._necessities[prop]
+
+    def bounds(self, prop: str) -> tuple:
+        """
+        Gets the cardinality of a property from the last of its expressions in the start shape
+
+        :param str prop: The property, e.g. P31
+        :return: the minimum and maximum number of statements, where -1 is unbounded
+        """
+        if prop not in self._bounds:
+            min_card: int = 1
+            max_card: int = 1
+            constraints: list = self.constraints(prop)
+            if constraints:
+                min_card = constraints[-1].get("min", 1)
+                max_card = constraints[-1].get("max", 1)
+            self._bounds[prop] = (min_card, max_card)
+        return self._bounds[prop]
+
+    def is_extra(self, prop: str) -> bool:
+        """
+        Checks whether values other than those in the shape are allowed for a property
+
+        :param str prop: The property, e.g. P31
+        :return: True if the property is listed as EXTRA in the start shape
+        """
+        if prop not in self._extras:
+            self._extras[prop] = any(extra.endswith(prop) for extra in self._extra)
+        return self._extras[prop]
+
+    def is_direct_extra(self, prop: str) -> bool:
+        """
+        Checks whether the direct (wdt:) predicate of a property is listed as EXTRA in the start shape
+
+        :param str prop: The property, e.g. P31
+        :return: True if the direct predicate is listed as EXTRA
+        """
+        return f'http://www.wikidata.org/prop/direct/{prop}' in self._extra
+
+    def _walk_shapes(self) -> None:
+        """
+        Walks every shape in the schema once, finding the properties it refers to and the values
+        allowed by its general constraints
+        """
+        if "shapes" not in self.schema:
+            return
+        stack: list = [self.schema["shapes"]]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                self._add_property(node)
+            elif isinstance(node, list):
+                stack.extend(reversed(node))
+            elif isinstance(node, dict):
+                if node.get("type") == "TripleConstraint" and node.get("predicate") in GENERAL_PREDICATES:
+                    self._add_general_constraint(node)
+                stack.extend(reversed(list(node.values())))
+
+    def _add_property(self, iri: str) -> None:
+        """
+        Adds the property an IRI refers to (e.g. http://www.wikidata.org/prop/direct/P31) to self.properties
+
+        :param str iri: The IRI
+        """
+        if not iri.startswith(PROPERTY_NAMESPACE):
+            return
+        prop: str = iri.rsplit("/", 1)[-1]
+        if PROPERTY_PATTERN.fullmatch(prop) and prop not in self.properties:
+            self.properties.append(prop)
+
+    def _add_general_constraint(self, expression: dict) -> None:
+        """
+        Adds the values allowed by a lexicalCategory or language constraint to self.general_constraints.
+        An empty list means any value is allowed
+
+        :param dict expression: The triple constraint
+        """
+        item: str = GENERAL_PREDICATES[expression["predicate"]]
+        allowed: list = self.general_constraints.setdefault(item, [])
+        value_expression = expression.get("valueExpr")
+        if isinstance(value_expression, dict) and "values" in value_expression:
+            allowed.extend(value for value in value_expression["values"] if isinstance(value, str))
+
+    def _get_start_shape(self) -> dict:
+        """
+        Gets the shape associated with the start parameter of the entityschema
+
+        :return: the start shape
+        """
+        if "start" not in self.schema:
+            return {}
+        if "shapes" not in self.schema:
+            return {}
+
+        for shape in self.schema['shapes']:
+            if shape["id"] == self.schema["start"]:
+                return shape
+        return {}
@@ -1,9 +1,17 @@
+import copy
 import json
 
-import requests
 from jsonasobj import as_json
 from pyshexc.parser_impl.generate_shexj import Schema, parse
 
+from entityshape import metrics, wikidata
+from entityshape.api_v2.compiledshape import CompiledShape
+from entityshape.cache import LRUCache
+
+# Compiled schemas shared by every JSONLDShape in the process, keyed by schema and revision
+schema_cache: LRUCache = LRUCache(maxsize=128)
+metrics.register_cache("compiled_schema", schema_cache)
+
 
 class JSONLDShape:
     """
@@ -11,42 +19,58 @@ class JSONLDShape:
 
     :param schema: The identifier of the entityschema to be processed
     :param language: The language to get the schema name in
+    :param json_text: The json of the entityschema if it has already been loaded, e.g. from a file
 
     :return name: the name of the entityschema
     :return shape: a json representation of the entityschema
     """
-    def __init__(self, schema: str, language: str) -> None:
+    def __init__(self, schema: str, language: str, json_text: (dict | None) = None) -> None:
+        self._schema: str = schema
         self._language: str = language
         self._json_text: dict = {}
-        self._get_schema_json(schema)
+        self._revision: str = ""
+        if json_text is None:
+            self._get_schema_json(schema)
+        else:
+            self._json_text = json_text
 
     def get_json_ld(self) -> dict:
         """
-        Gets the JSON_LD form of the Schema
+        Gets the JSON_LD form of the Schema, parsing it only if this revision isn't already cached
+        """
+        return copy.deepcopy(self.get_compiled_shape().schema)
+
+    def get_compiled_shape(self) -> CompiledShape:
+        """
+        Gets the Schema compiled into an index of its constraints, parsing and compiling it
+        only if this revision isn't already cached.  The compiled shape is shared, so it
+        must not be modified
         """
         try:
             schema_text: (str | None) = self._json_text.get("schemaText")
             if not schema_text:
-                return {}
-            parsed_schema: (Schema | None) = parse(schema_text)
-            if parsed_schema is None:
-                return {}
-
-            return json.loads(as_json(parsed_schema))
+                return CompiledShape({})
+            key: tuple = (self._schema, self._revision or wikidata.schema_digest(schema_text))
+            compiled_shape: (CompiledShape | None) = schema_cache.get(key)
+            if compiled_shape is None:
+                with metrics.stage("schema_parse"):
+                    parsed_schema: (Schema | None) = parse(schema_text)
+                    if parsed_schema is None:
+                        return CompiledShape({})
+                    compiled_shape = CompiledShape(json.loads(as_json(parsed_schema)))
+                schema_cache.set(key, compiled_shape)
+            return compiled_shape
         except (KeyError, IndexError, AttributeError, ValueError):
-            return {}
+            return CompiledShape({})
 
+    @metrics.timed("schema_fetch")
     def _get_schema_json(self, schema) -> None:
         """
-        Downloads the schema from wikidata
+        Downloads the schema from wikidata, unless it hasn't been edited since it was last downloaded
 
         :param schema: the entityschema to be downloaded
         """
-        url: str = f"https://www.wikidata.org/wiki/EntitySchema:{schema}?action=raw"
-        response = requests.get(url=url,
-                                headers={'User-Agent': 'Userscript Entityshape by User:Teester'})
-        if response.status_code == 200:
-            self._json_text = response.json()
+        self._json_text, self._revision = wikidata.get_schema(schema)
 
     def get_name(self) -> str:
         """
@@ -1,9 +1,13 @@
 """
 A Flask app to compare entityschema with wikidata items without using SPARQL
 """
-from flask import Flask
+from contextvars import Token
+
+from flask import Flask, Response, g, request
 from flask_cors import CORS
 
+from entityshape import metrics
+
 from entityshape.api_v1.api_v1_blueprint import api_v1
 from entityshape.api_v2.api_v2_blueprint import api_v2
 
@@ -14,5 +18,57 @@ app.register_blueprint(api_v1, url_prefix="/api")
 app.register_blueprint(api_v2, url_prefix="/api/v2")
 
 
+@app.before_request
+def start_request() -> None:
+    """
+    Counts the request as in flight until it has been answered, and times the stages of
+    answering requests to the api
+    """
+    g.metrics_endpoint = request.endpoint or "unknown"
+    metrics.requests_in_flight.inc(g.metrics_endpoint)
+    if request.blueprint in ["api_v1", "api_v2"]:
+        g.timing_token = metrics.start_timings()
+
+
+@app.after_request
+def add_server_timing(response: Response) -> Response:
+    """
+    Adds the time taken by each stage to responses from the api, unless they are streamed
+    and so sent before the stages are finished
+    """
+    timings: (metrics.RequestTimings | None) = metrics.get_timings()
+    if timings is not None and not response.is_streamed:
+        try:
+            response.headers["Server-Timing"] = timings.get_header()
+            response.headers["Timing-Allow-Origin"] = "*"
+        except ValueError as exception:
+            # the timings are only for debugging, so the response is sent without them
+            print(f"Server-Timing - {type(exception).__name__}: {exception}")
+    return response
+
+
+@app.teardown_request
+def end_request(exception: (BaseException | None) = None) -> None:
+    """
+    Counts the request as answered, once any streamed response has been sent
+    """
+    # the teardown runs again once a streamed response has been sent, so each is only ended once
+    endpoint: (str | None) = g.pop("metrics_endpoint", None)
+    if endpoint is not None:
+        metrics.requests_in_flight.dec(endpoint)
+    timing_token: (Token | None) = g.pop("timing_token", None)
+    if timing_token is not None:
+        metrics.stop_timings(timing_token)
+
+
+@app.route("/metrics")
+def get_metrics() -> Response:
+    """
+    Gets the metrics of this process in the Prometheus text format
+    :return: the metrics
+    """
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == '__main__':
     app.run()
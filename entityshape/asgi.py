@@ -0,0 +1,282 @@
+"""
+An ASGI app to compare entityschema with wikidata items, for running with an ASGI server, e.g.
+uvicorn entityshape.asgi:app
+
+Checks of an entity against entityschemas (/api/v2/) download the entity, each schema and the
+property names at the same time, so a single process can handle many checks at once.  Every
+other route is passed to the Flask app.
+"""
+import asyncio
+import contextvars
+import functools
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+from urllib.parse import parse_qsl
+
+from requests import RequestException
+from werkzeug.datastructures import MIMEAccept, MultiDict
+from werkzeug.http import parse_accept_header
+
+from entityshape import metrics, settings, wikidata
+from entityshape.api_v2.api_v2_blueprint import (NDJSON, get_v2_arguments, get_v2_error_payload, get_v2_payload,
+                                                 resolve_schemas, store_v2_result, uses_discovery)
+from entityshape.api_v2.comparejsonld import EntityContext
+from entityshape.api_v2.getjsonld import JSONLDShape
+from entityshape.app import app as flask_app
+
+# The requests to wikidata are blocking, so they are made from a pool of threads
+_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=settings.ASGI_THREADS,
+                                                   thread_name_prefix="entityshape")
+# each thread may be waiting on wikidata at the same time, so each can keep a connection open
+wikidata.set_pool_size(max(settings.POOL_SIZE, settings.ASGI_THREADS))
+
+
+async def app(scope: dict, receive: Callable[[], Awaitable[dict]], send: Callable[[dict], Awaitable[None]]) -> None:
+    """
+    The ASGI app
+
+    :param dict scope: The connection scope
+    :param receive: Receives events from the client
+    :param send: Sends events to the client
+    """
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+    elif scope["type"] == "http":
+        headers: dict = _get_headers(scope)
+        if scope["method"] == "GET" and scope["path"] == "/api/v2/" and not _wants_ndjson(headers):
+            metrics.requests_in_flight.inc("api_v2.v2")
+            try:
+                await _v2(scope, headers, send)
+            finally:
+                metrics.requests_in_flight.dec("api_v2.v2")
+        else:
+            await _call_flask_app(scope, receive, send)
+
+
+async def _run(function: Callable, *args: Any) -> Any:
+    """
+    Runs a blocking function in the thread pool
+
+    :param function: The function to run
+    :param args: The arguments of the function
+    :return: the result of the function
+    """
+    context: contextvars.Context = contextvars.copy_context()
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, function, *args))
+
+
+async def _v2(scope: dict, headers: dict, send: Callable[[dict], Awaitable[None]]) -> None:
+    """
+    Compares an entity with entityschemas, downloading the entity and each entityschema at the
+    same time, then the names of every property in them
+
+    :param dict scope: The connection scope
+    :param dict headers: The headers of the request
+    :param send: Sends events to the client
+    """
+    args: MultiDict = MultiDict(parse_qsl(scope["query_string"].decode("utf-8", "replace"), keep_blank_values=True))
+    schema_list, entity, language = get_v2_arguments(args)
+    # each request is answered in its own task, so its timings are kept apart from other requests'
+    timing_token: contextvars.Token = metrics.start_timings()
+    try:
+        if uses_discovery(schema_list):
+            # the entityschemas can only be downloaded once the entity has been
+            context = await _run(EntityContext, entity, language)
+            schemas: list = await _run(resolve_schemas, schema_list, context)
+            shapes = await asyncio.gather(*[_run(_get_shape, schema, language) for schema in schemas])
+        else:
+            schemas = schema_list
+            context, *shapes = await asyncio.gather(_run(EntityContext, entity, language),
+                                                    *[_run(_get_shape, schema, language) for schema in schemas])
+        props: list = list(context.claims)
+        for shape in shapes:
+            props.extend(prop for prop in shape.get_compiled_shape().properties if prop not in props)
+        await _run(context.get_names, props)
+        payload: dict = await _run(get_v2_payload, schemas, entity, language, context, shapes)
+        store_v2_result(schema_list, entity, language, context, payload)
+        status: int = 200
+    except (AttributeError, TypeError, KeyError, IndexError, RequestException) as exception:
+        payload = get_v2_error_payload()
+        status = 500
+        print(f"Schema: {schema_list} - {type(exception).__name__}: {exception}")
+    timings: metrics.RequestTimings = metrics.get_timings()
+    metrics.stop_timings(timing_token)
+    if args.get("debug") == "timing":
+        payload["timing"] = timings.get_json()
+    body: bytes = flask_app.json.dumps(payload).encode("utf-8")
+    response_headers: list = [(b"content-type", b"application/json"),
+                              (b"content-length", str(len(body)).encode("latin-1"))]
+    try:
+        response_headers.append((b"server-timing", timings.get_header().encode("latin-1")))
+        response_headers.append((b"timing-allow-origin", b"*"))
+    except ValueError as exception:
+        # the timings are only for debugging, so the response is sent without them
+        print(f"Schema: {schema_list} - {type(exception).__name__}: {exception}")
+    # the same headers flask_cors adds to the responses of the Flask app
+    if "origin" in headers:
+        response_headers.append((b"access-control-allow-origin", headers["origin"].encode("latin-1")))
+        response_headers.append((b"vary", b"Origin"))
+    else:
+        response_headers.append((b"access-control-allow-origin", b"*"))
+    await send({"type": "http.response.start", "status": status, "headers": response_headers})
+    await send({"type": "http.response.body", "body": body, "more_body": False})
+
+
+def _get_shape(schema: str, language: str) -> JSONLDShape:
+    """
+    Downloads and parses an entityschema
+
+    :param str schema: The entityschema
+    :param str language: The language to get the name of the entityschema in
+    :return: the entityschema
+    """
+    with metrics.schema_timing(schema):
+        shape: JSONLDShape = JSONLDShape(schema, language)
+        shape.get_compiled_shape()
+    return shape
+
+
+async def _call_flask_app(scope: dict, receive: Callable[[], Awaitable[dict]],
+                          send: Callable[[dict], Awaitable[None]]) -> None:
+    """
+    Passes a request to the Flask app, sending each part of its response as soon as it is made,
+    so that streamed responses are still streamed
+
+    :param dict scope: The connection scope
+    :param receive: Receives events from the client
+    :param send: Sends events to the client
+    """
+    body: bytes = b""
+    more_body: bool = True
+    while more_body:
+        message: dict = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue()
+    response_start: dict = {"status": 500, "headers": []}
+
+    def start_response(status: str, headers: list, exc_info: Any = None) -> Callable[[bytes], None]:
+        response_start["status"] = int(status.split(" ", 1)[0])
+        response_start["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                     for name, value in headers]
+        return lambda data: loop.call_soon_threadsafe(chunks.put_nowait, data)
+
+    def run() -> None:
+        # the response is iterated in a single thread, as streamed responses keep the request context
+        try:
+            result = flask_app.wsgi_app(_get_environ(scope, body), start_response)
+            try:
+                for chunk in result:
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        finally:
+            loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+    future: asyncio.Future = loop.run_in_executor(_executor, run)
+    await _send_chunks(chunks, response_start, send)
+    await future
+
+
+async def _send_chunks(chunks: asyncio.Queue, response_start: dict, send: Callable[[dict], Awaitable[None]]) -> None:
+    """
+    Sends the parts of a response from the Flask app as they are put in the queue, starting the
+    response once the first part which isn't empty is made
+
+    :param chunks: The parts of the body of the response, ending with None
+    :param dict response_start: The status and headers of the response, set by start_response
+    :param send: Sends events to the client
+    """
+    started: bool = False
+    while True:
+        chunk: (bytes | None) = await chunks.get()
+        if not started and (chunk is None or chunk):
+            await send({"type": "http.response.start", **response_start})
+            started = True
+        if chunk is None:
+            break
+        if chunk:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _get_environ(scope: dict, body: bytes) -> dict:
+    """
+    Gets the WSGI environ of a request
+
+    :param dict scope: The connection scope
+    :param bytes body: The body of the request
+    :return: the environ
+    """
+    server: tuple = scope.get("server") or ("localhost", 80)
+    environ: dict = {"REQUEST_METHOD": scope["method"],
+                     "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+                     "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+                     "QUERY_STRING": scope["query_string"].decode("latin-1"),
+                     "SERVER_NAME": server[0],
+                     "SERVER_PORT": str(server[1]),
+                     "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+                     "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+                     "CONTENT_LENGTH": str(len(body)),
+                     "wsgi.version": (1, 0),
+                     "wsgi.url_scheme": scope.get("scheme", "http"),
+                     "wsgi.input": io.BytesIO(body),
+                     "wsgi.errors": sys.stderr,
+                     "wsgi.multithread": True,
+                     "wsgi.multiprocess": True,
+                     "wsgi.run_once": False}
+    for name, value in _get_headers(scope).items():
+        # the whole body has already been read, so its length is known even if it was sent in chunks
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name not in ["content-length", "transfer-encoding"]:
+            environ[f"HTTP_{name.upper().replace('-', '_')}"] = value
+    return environ
+
+
+def _get_headers(scope: dict) -> dict:
+    """
+    Gets the headers of a request, joining repeated headers with commas
+
+    :param dict scope: The connection scope
+    :return: a dict of header values, by lower case name
+    """
+    headers: dict = {}
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").lower()
+        value = value.decode("latin-1")
+        headers[name] = f"{headers[name]},{value}" if name in headers else value
+    return headers
+
+
+def _wants_ndjson(headers: dict) -> bool:
+    """
+    Checks whether the client asked for results to be streamed as newline delimited json
+
+    :param dict headers: The headers of the request
+    :return: True if results should be streamed
+    """
+    accept: MIMEAccept = parse_accept_header(headers.get("accept"), MIMEAccept)
+    return accept.best_match(["application/json", NDJSON]) == NDJSON
+
+
+async def _lifespan(receive: Callable[[], Awaitable[dict]], send: Callable[[dict], Awaitable[None]]) -> None:
+    """
+    Answers the startup and shutdown events of the ASGI server
+
+    :param receive: Receives events from the server
+    :param send: Sends events to the server
+    """
+    while True:
+        message: dict = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
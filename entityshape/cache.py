@@ -0,0 +1,87 @@
+"""
+A small thread safe least recently used cache shared by the api versions
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """
+    A bounded cache which evicts the least recently used entry once it is full
+
+    :param maxsize: The maximum number of entries to keep
+    :param maxweight: The maximum total weight of the entries to keep, e.g. their size in bytes,
+                      or 0 to only limit the number of entries
+    """
+    def __init__(self, maxsize: int = 128, maxweight: int = 0) -> None:
+        self._maxsize: int = maxsize
+        self._maxweight: int = maxweight
+        self._data: OrderedDict = OrderedDict()
+        self._weights: dict = {}
+        self._weight: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Gets an entry from the cache, marking it as recently used
+
+        :param key: The key of the entry
+        :param default: The value to return if the key is not in the cache
+        :return: the cached value or default
+        """
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any, weight: int = 0) -> None:
+        """
+        Adds an entry to the cache, evicting the least recently used entries if it is full.
+        An entry heavier than the maximum weight is not kept
+
+        :param key: The key of the entry
+        :param value: The value to be cached
+        :param weight: The weight of the entry, e.g. its size in bytes
+        """
+        with self._lock:
+            self._weight -= self._weights.pop(key, 0)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if weight:
+                self._weights[key] = weight
+                self._weight += weight
+            while len(self._data) > self._maxsize or (self._maxweight and self._weight > self._maxweight):
+                evicted, _ = self._data.popitem(last=False)
+                self._weight -= self._weights.pop(evicted, 0)
+
+    def clear(self) -> None:
+        """
+        Empties the cache and resets its counters
+        """
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self._weight = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Gets the counters for the cache
+
+        :return: a dict of hits, misses, the current size and the maximum size of the cache
+        """
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "size": len(self._data),
+                    "maxsize": self._maxsize}
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,328 @@
+"""
+Checks the entities in a wikidata json dump against entityschemas without using the wikidata api
+
+Usage: python -m entityshape.dump latest-all.json.gz --schema E10 --language en --output results.ndjson
+"""
+import argparse
+import bz2
+import gzip
+import io
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Iterator, TextIO
+
+from entityshape.api_v2.comparejsonld import CompareJSONLD, EntityContext
+from entityshape.api_v2.getjsonld import JSONLDShape
+
+# The arguments for the DumpValidator of each worker process, sent once when the worker starts
+_worker_arguments: tuple = ()
+# The property entities are filtered on with --instance-of
+INSTANCE_OF: str = "P31"
+
+
+class DumpValidator:
+    """
+    Checks entities from a wikidata json dump against a set of already loaded entityschemas
+
+    :param shapes: The entityschemas to check against, as (schema, name, compiled shape) tuples from load_shapes
+    :param language: The language of the property names
+    :param names: The names of properties, e.g. from read_property_names
+    :param instance_of: If given, only entities which are an instance of (P31) one of these classes are checked
+
+    :returns summary: the number of entities checked, the number of lines which couldn't be checked
+                      and a count of each property response by schema
+    """
+    def __init__(self, shapes: list, language: str, names: dict, instance_of: (list | None) = None) -> None:
+        self._shapes: list = shapes
+        self._language: str = language
+        self._names: dict = names
+        self._instance_of: set = set(instance_of or [])
+        self.summary: dict = _get_empty_summary(shapes)
+
+    def validate(self, lines: Iterable[str], output: TextIO) -> dict:
+        """
+        Checks each entity in a dump, writing a line of json for each entity and schema as it goes
+
+        :param lines: The lines of the dump
+        :param output: Where to write the results
+        :return: the summary of the results
+        """
+        for line in lines:
+            for result in self.validate_line(line):
+                output.write(json.dumps(result, sort_keys=True) + "\n")
+        return self.summary
+
+    def validate_line(self, line: str) -> list:
+        """
+        Checks the entity on a single line of a dump against each entityschema
+
+        :param str line: The line of the dump
+        :return: the result for each entityschema, or an empty list if the line has no entity to
+                 check or it can't be checked
+        """
+        try:
+            entity_json: (dict | None) = self._parse_entity(line)
+            if entity_json is None:
+                return []
+            entity: str = entity_json["id"]
+            context: EntityContext = EntityContext(entity, self._language, entity_json, self._names)
+            results: list = []
+            for schema, name, compiled_shape in self._shapes:
+                comparison: CompareJSONLD = CompareJSONLD(compiled_shape, entity, self._language, context)
+                results.append({'entity': entity,
+                                'schema': schema,
+                                'name': name,
+                                'general': comparison.get_general(),
+                                'properties': comparison.get_properties(),
+                                'statements': comparison.get_statements()})
+        except (ValueError, AttributeError, TypeError, KeyError, IndexError) as exception:
+            # a single bad line shouldn't stop a check of the whole dump
+            self.summary["errors"] += 1
+            print(f"Line skipped - {type(exception).__name__}: {exception}", file=sys.stderr)
+            return []
+        for result in results:
+            self._count(result)
+        self.summary["entities"] += 1
+        return results
+
+    def _parse_entity(self, line: str) -> (dict | None):
+        """
+        Parses the entity on a line of a dump, if it is to be checked
+
+        :param str line: The line of the dump
+        :return: the json of the entity, or None if the line has no entity or it isn't an
+                 instance of one of the classes being checked
+        """
+        # most entities aren't instances of the classes, so they can be skipped without parsing them
+        if self._instance_of and not any(f'"{item}"' in line for item in self._instance_of):
+            return None
+        entity_json: (dict | None) = parse_line(line)
+        if entity_json is None or not self._instance_of:
+            return entity_json
+        classes: set = {claim["mainsnak"].get("datavalue", {}).get("value", {}).get("id")
+                        for claim in entity_json.get("claims", {}).get(INSTANCE_OF, [])}
+        return entity_json if classes & self._instance_of else None
+
+    def _count(self, result: dict) -> None:
+        """
+        Adds the property responses of a result to the summary
+
+        :param dict result: The result of checking an entity against an entityschema
+        """
+        counts: dict = self.summary["properties"][result["schema"]]
+        for prop in result["properties"].values():
+            response: str = prop.get("response", "")
+            counts[response] = counts.get(response, 0) + 1
+
+
+def validate_in_parallel(lines: Iterable[str], output: TextIO, shapes: list, language: str,
+                         names: dict, processes: int, chunk_size: int = 1000,
+                         instance_of: (list | None) = None) -> dict:
+    """
+    Checks each entity in a dump using a pool of worker processes, each checking a chunk of
+    lines at a time.  The results are written in the same order as DumpValidator.validate writes
+    them, and only a few chunks are held in memory at once
+
+    :param lines: The lines of the dump
+    :param output: Where to write the results
+    :param list shapes: The entityschemas to check against, from load_shapes
+    :param str language: The language of the property names
+    :param dict names: The names of properties
+    :param int processes: The number of worker processes
+    :param int chunk_size: The number of lines sent to a worker at a time
+    :param list instance_of: If given, only entities which are an instance of one of these classes are checked
+    :return: the summary of the results
+    """
+    summary: dict = _get_empty_summary(shapes)
+    line_iterator: Iterator[str] = iter(lines)
+    with ProcessPoolExecutor(max_workers=processes,
+                             initializer=_initialise_worker,
+                             initargs=(shapes, language, names, instance_of)) as executor:
+        pending: deque = deque()
+        while True:
+            while len(pending) < processes * 2:
+                chunk: list = list(itertools.islice(line_iterator, chunk_size))
+                if not chunk:
+                    break
+                pending.append(executor.submit(_validate_chunk, chunk))
+            if not pending:
+                break
+            future: Future = pending.popleft()
+            results, chunk_summary = future.result()
+            output.write(results)
+            _merge_summaries(summary, chunk_summary)
+    return summary
+
+
+def _initialise_worker(shapes: list, language: str, names: dict, instance_of: (list | None)) -> None:
+    """
+    Keeps the entityschemas and property names in a worker process for every chunk it checks
+    """
+    global _worker_arguments
+    _worker_arguments = (shapes, language, names, instance_of)
+
+
+def _validate_chunk(lines: list) -> tuple:
+    """
+    Checks a chunk of lines of a dump in a worker process
+
+    :param list lines: The lines to check
+    :return: the results as text and the summary of the results
+    """
+    validator: DumpValidator = DumpValidator(*_worker_arguments)
+    output: io.StringIO = io.StringIO()
+    summary: dict = validator.validate(lines, output)
+    return output.getvalue(), summary
+
+
+def _get_empty_summary(shapes: list) -> dict:
+    """
+    Gets the summary of checking no entities
+
+    :param list shapes: The entityschemas being checked against, from load_shapes
+    :return: the summary
+    """
+    return {"entities": 0,
+            "errors": 0,
+            "properties": {schema: {} for schema, _, _ in shapes}}
+
+
+def _merge_summaries(summary: dict, chunk_summary: dict) -> None:
+    """
+    Adds the summary of a chunk of results to the overall summary
+
+    :param dict summary: The overall summary
+    :param dict chunk_summary: The summary of the chunk
+    """
+    summary["entities"] += chunk_summary["entities"]
+    summary["errors"] += chunk_summary["errors"]
+    for schema, counts in chunk_summary["properties"].items():
+        for response, count in counts.items():
+            summary["properties"][schema][response] = summary["properties"][schema].get(response, 0) + count
+
+
+def open_dump(path: str) -> TextIO:
+    """
+    Opens a wikidata json dump, which may be compressed with gzip or bzip2
+
+    :param str path: The path of the dump
+    :return: the dump as text
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def parse_line(line: str) -> (dict | None):
+    """
+    Parses a line of a wikidata json dump, which holds a single entity followed by a comma
+
+    :param str line: The line of the dump
+    :return: the json of the entity, or None for the opening and closing lines of the dump
+    """
+    line = line.strip().rstrip(",")
+    if line in ["", "[", "]"]:
+        return None
+    return json.loads(line)
+
+
+def read_property_names(lines: Iterable[str], language: str) -> dict:
+    """
+    Gets the names of the properties in a wikidata json dump
+
+    :param lines: The lines of the dump
+    :param str language: The language of the names
+    :return: a dict of property names
+    """
+    names: dict = {}
+    for line in lines:
+        # Entities in dumps start with their type, so items can be skipped without parsing them
+        if '"type":"property"' not in line[:32]:
+            continue
+        entity_json: (dict | None) = parse_line(line)
+        if entity_json is not None:
+            names[entity_json["id"]] = entity_json.get("labels", {}).get(language, {}).get("value", "")
+    return names
+
+
+def load_shapes(schemas: list, language: str) -> list:
+    """
+    Loads and parses entityschemas, from files where a path is given or otherwise from wikidata
+
+    :param list schemas: Entityschema ids (e.g. E10) or paths to entityschema json or ShExC files
+    :param str language: The language to get the schema names in
+    :return: a list of (schema, name, compiled shape) tuples
+    """
+    shapes: list = []
+    for schema in schemas:
+        if os.path.exists(schema):
+            with open(schema, "r", encoding="utf-8") as schema_file:
+                if schema.endswith(".json"):
+                    json_text: dict = json.load(schema_file)
+                else:
+                    json_text = {"schemaText": schema_file.read()}
+            schema_id: str = json_text.get("id", os.path.splitext(os.path.basename(schema))[0])
+            shape: JSONLDShape = JSONLDShape(schema_id, language, json_text)
+        else:
+            schema_id = schema
+            shape = JSONLDShape(schema, language)
+        shapes.append((schema_id, shape.get_name(), shape.get_compiled_shape()))
+    return shapes
+
+
+def _read_lines(path: str) -> Iterator[str]:
+    """
+    Reads the lines of a dump one at a time
+
+    :param str path: The path of the dump
+    :return: the lines of the dump
+    """
+    with open_dump(path) as dump:
+        yield from dump
+
+
+def main(arguments: (list | None) = None) -> None:
+    """
+    Checks a wikidata json dump against entityschemas from the command line
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("dump", help="a wikidata json dump, optionally compressed with gzip or bzip2")
+    parser.add_argument("--schema", action="append", required=True,
+                        help="an entityschema id, or a path to an entityschema json or ShExC file")
+    parser.add_argument("--language", default="en", help="the language to return property names in")
+    parser.add_argument("--output", default="-", help="where to write the results (default: stdout)")
+    parser.add_argument("--property-names", default=None,
+                        help="a dump to read property names from (default: the dump being checked)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="the number of worker processes to check entities with (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="the number of lines sent to a worker process at a time (default: 1000)")
+    parser.add_argument("--instance-of", action="append", default=None,
+                        help="only check entities which are an instance of (P31) this class, e.g. Q5; "
+                             "can be given more than once")
+    args: argparse.Namespace = parser.parse_args(arguments)
+
+    names: dict = read_property_names(_read_lines(args.property_names or args.dump), args.language)
+    shapes: list = load_shapes(args.schema, args.language)
+    output: TextIO = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        if args.processes > 1:
+            summary: dict = validate_in_parallel(_read_lines(args.dump), output, shapes, args.language,
+                                                 names, args.processes, args.chunk_size, args.instance_of)
+        else:
+            validator: DumpValidator = DumpValidator(shapes, args.language, names, args.instance_of)
+            summary = validator.validate(_read_lines(args.dump), output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(summary, sort_keys=True), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+A store of property names which lasts between requests and can be shared between processes
+"""
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from entityshape import metrics, settings
+from entityshape.cache import LRUCache
+
+# The maximum number of properties to look up in a single sqlite query
+_MAX_QUERY_PARAMETERS: int = 500
+
+
+class LabelStore:
+    """
+    Stores the names of properties by property and language for a limited time, in memory
+    and optionally in a sqlite database shared by every worker process
+
+    :param ttl: The number of seconds a name is kept for
+    :param path: The path of the sqlite database, or "" to only keep names in memory
+    :param maxsize: The maximum number of names to keep in memory
+    """
+    def __init__(self, ttl: float, path: str = "", maxsize: int = 50000) -> None:
+        self._ttl: float = ttl
+        self._path: str = path
+        self._memory: LRUCache = LRUCache(maxsize=maxsize)
+        self._lock: threading.Lock = threading.Lock()
+        self._table_created: bool = False
+
+    def get_names(self, props: list, language: str) -> dict:
+        """
+        Gets the names of the given properties which are stored and haven't expired
+
+        :param list props: The properties to get names for
+        :param str language: The language of the names
+        :return: a dict of the names found, by property
+        """
+        now: float = time.time()
+        names: dict = {}
+        missing: list = []
+        for prop in props:
+            entry: (tuple | None) = self._memory.get((prop, language))
+            if entry is not None and entry[1] > now:
+                names[prop] = entry[0]
+            else:
+                missing.append(prop)
+        if missing and self._path:
+            for prop, label, expires in self._select_names(missing, language, now):
+                names[prop] = label
+                self._memory.set((prop, language), (label, expires))
+        return names
+
+    def set_names(self, names: dict, language: str) -> None:
+        """
+        Stores the names of properties
+
+        :param dict names: The names to store, by property
+        :param str language: The language of the names
+        """
+        expires: float = time.time() + self._ttl
+        for prop, label in names.items():
+            self._memory.set((prop, language), (label, expires))
+        if names and self._path:
+            with closing(self._connect()) as connection, connection:
+                connection.executemany("INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?)",
+                                       [(prop, language, label, expires) for prop, label in names.items()])
+
+    def clear(self) -> None:
+        """
+        Removes every stored name
+        """
+        self._memory.clear()
+        if self._path:
+            with closing(self._connect()) as connection, connection:
+                connection.execute("DELETE FROM labels")
+
+    def stats(self) -> dict:
+        """
+        Gets the counters for the names kept in memory
+
+        :return: a dict of hits, misses, the current size and the maximum size of the store
+        """
+        return self._memory.stats()
+
+    def _select_names(self, props: list, language: str, now: float) -> list:
+        """
+        Gets the names of properties from the sqlite database which haven't expired
+
+        :param list props: The properties to get names for
+        :param str language: The language of the names
+        :param float now: The current time
+        :return: a list of (property, name, expiry time) tuples
+        """
+        rows: list = []
+        with closing(self._connect()) as connection:
+            for i in range(0, len(props), _MAX_QUERY_PARAMETERS):
+                chunk: list = props[i:i + _MAX_QUERY_PARAMETERS]
+                placeholders: str = ", ".join("?" * len(chunk))
+                rows.extend(connection.execute(f"SELECT property, label, expires FROM labels "
+                                               f"WHERE language = ? AND expires > ? "
+                                               f"AND property IN ({placeholders})",
+                                               [language, now, *chunk]).fetchall())
+        return rows
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Connects to the sqlite database, creating the labels table the first time
+
+        :return: the connection
+        """
+        connection: sqlite3.Connection = sqlite3.connect(self._path, timeout=5)
+        with self._lock:
+            if not self._table_created:
+                with connection:
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.execute("CREATE TABLE IF NOT EXISTS labels (property TEXT, language TEXT, "
+                                       "label TEXT, expires REAL, PRIMARY KEY (property, language))")
+                self._table_created = True
+        return connection
+
+
+label_store: LabelStore = LabelStore(settings.LABEL_CACHE_TTL,
+                                     settings.LABEL_CACHE_PATH,
+                                     settings.LABEL_CACHE_SIZE)
+metrics.register_cache("label", label_store)
@@ -0,0 +1,449 @@
+"""
+Counters, gauges and histograms describing what entityshape is doing, served in the Prometheus
+text format at /metrics.  Each worker process keeps its own metrics.  The stages of answering a
+single request can also be timed, for its Server-Timing header
+"""
+import bisect
+import contextvars
+import functools
+import re
+import threading
+import time
+from typing import Any, Callable
+
+# The upper bounds in seconds of the buckets of the histograms
+DEFAULT_BUCKETS: tuple = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE: str = "text/plain; version=0.0.4; charset=utf-8"
+# The names of the stages in Server-Timing headers and timing blocks
+TIMING_NAMES: dict = {"schema_fetch": "fetch-schema",
+                      "schema_parse": "parse",
+                      "entity_fetch": "fetch-entity",
+                      "label_fetch": "labels",
+                      "statement_comparison": "compare",
+                      "property_comparison": "compare"}
+# The entityschemas which are described in Server-Timing headers, as anything else from the query string
+# could break the header
+TIMING_SCHEMA_PATTERN: re.Pattern = re.compile(r"E\d+")
+
+
+class _Metric:
+    """
+    A metric with a value for each combination of its label values
+
+    :param name: The name of the metric
+    :param documentation: A description of the metric
+    :param labelnames: The names of the labels of the metric
+    """
+    kind: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: tuple = labelnames
+        self._values: dict = {}
+        self._lock: threading.Lock = threading.Lock()
+        self.clear()
+        _registry.append(self)
+
+    def render(self) -> list:
+        """
+        Gets the lines of the metric in the Prometheus text format
+
+        :return: the lines
+        """
+        lines: list = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values: dict = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+    def get(self, *labels: str) -> float:
+        """
+        Gets the value of the metric for the given label values
+
+        :param labels: The values of the labels
+        :return: the value
+        """
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def clear(self) -> None:
+        """
+        Removes every value of the metric, leaving a metric without labels at 0
+        """
+        with self._lock:
+            self._values.clear()
+            if not self.labelnames and self.kind != "histogram":
+                self._values[()] = 0
+
+
+class Counter(_Metric):
+    """
+    A count which only goes up, e.g. of requests made
+    """
+    kind: str = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """
+        Adds to the count for the given label values
+
+        :param labels: The values of the labels
+        :param amount: The amount to add
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A value which goes up and down, e.g. the number of requests in progress
+    """
+    kind: str = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """
+        Adds to the value for the given label values
+
+        :param labels: The values of the labels
+        :param amount: The amount to add
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        """
+        Subtracts from the value for the given label values
+
+        :param labels: The values of the labels
+        :param amount: The amount to subtract
+        """
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """
+    The distribution of observed values, e.g. durations, counted in buckets
+
+    :param buckets: The upper bounds of the buckets
+    """
+    kind: str = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._buckets: tuple = buckets
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Counts a value in the first bucket it fits in
+
+        :param value: The value
+        :param labels: The values of the labels
+        """
+        index: int = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            entry: (list | None) = self._values.get(labels)
+            if entry is None:
+                # a count for each bucket and for +Inf, followed by the sum of the values
+                entry = self._values[labels] = [0] * (len(self._buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def get(self, *labels: str) -> float:
+        """
+        Gets the number of values observed for the given label values
+
+        :param labels: The values of the labels
+        :return: the number of values
+        """
+        with self._lock:
+            entry: (list | None) = self._values.get(labels)
+            return sum(entry[:-1]) if entry is not None else 0
+
+    def render(self) -> list:
+        lines: list = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values: dict = {labels: list(entry) for labels, entry in self._values.items()}
+        for labels, entry in sorted(values.items()):
+            count: int = 0
+            for bound, bucket_count in zip(self._buckets + (float("inf"),), entry[:-1]):
+                count += bucket_count
+                bucket_labels: str = _format_labels(self.labelnames + ("le",), labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class stage:
+    """
+    Times a stage of checking an entity, e.g. parsing a schema, as a context manager
+
+    :param name: The name of the stage
+    """
+    __slots__ = ("_name", "_start")
+
+    def __init__(self, name: str) -> None:
+        self._name: str = name
+        self._start: float = 0
+
+    def __enter__(self) -> "stage":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        _record(self._name, time.perf_counter() - self._start)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """
+    Times every call of a function as a stage of checking an entity
+
+    :param str name: The name of the stage
+    :return: a decorator
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start: float = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _record(name: str, seconds: float) -> None:
+    """
+    Records the time taken by a stage, in the metrics and in the timings of the current request
+
+    :param str name: The name of the stage
+    :param float seconds: The time taken
+    """
+    stage_seconds.observe(seconds, name)
+    timings: (RequestTimings | None) = _request_timings.get()
+    if timings is not None:
+        timings.add(name, seconds, _timing_schema.get())
+
+
+class RequestTimings:
+    """
+    The time spent in each stage while answering a single request, in total and for each entityschema
+    """
+    def __init__(self) -> None:
+        self._start: float = time.perf_counter()
+        self._stages: dict = {}
+        self._schemas: dict = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, schema: str = "") -> None:
+        """
+        Adds the time taken by a stage
+
+        :param str name: The name of the stage, e.g. schema_parse
+        :param float seconds: The time taken
+        :param str schema: The entityschema the stage was for, or "" if it was shared by every entityschema
+        """
+        timing_name: str = TIMING_NAMES.get(name, name)
+        with self._lock:
+            self._stages[timing_name] = self._stages.get(timing_name, 0) + seconds
+            if schema:
+                schema_stages: dict = self._schemas.setdefault(schema, {})
+                schema_stages[timing_name] = schema_stages.get(timing_name, 0) + seconds
+
+    def get_json(self) -> dict:
+        """
+        Gets the timings in milliseconds, for the timing block of a response
+
+        :return: the total time, the time in each stage and the time in each stage for each entityschema
+        """
+        with self._lock:
+            return {"total": _milliseconds(time.perf_counter() - self._start),
+                    "stages": {name: _milliseconds(seconds) for name, seconds in self._stages.items()},
+                    "schemas": {schema: {name: _milliseconds(seconds) for name, seconds in stages.items()}
+                                for schema, stages in self._schemas.items()}}
+
+    def get_header(self) -> str:
+        """
+        Gets the timings as the value of a Server-Timing header, with the time in each stage for each
+        entityschema described by the entityschema.  Entityschemas which aren't ids, e.g. E10, are
+        left out, though their stages are still counted in the total for each stage
+
+        :return: the header
+        """
+        timings: dict = self.get_json()
+        entries: list = [f"{name};dur={duration}" for name, duration in timings["stages"].items()]
+        for schema, stages in timings["schemas"].items():
+            if not TIMING_SCHEMA_PATTERN.fullmatch(schema):
+                continue
+            entries.extend(f'{name};desc="{schema}";dur={duration}' for name, duration in stages.items())
+        entries.append(f"total;dur={timings['total']}")
+        return ", ".join(entries)
+
+
+class schema_timing:
+    """
+    Attributes the stages timed within it to an entityschema, as a context manager
+
+    :param schema: The entityschema
+    """
+    __slots__ = ("_schema", "_token")
+
+    def __init__(self, schema: str) -> None:
+        self._schema: str = schema
+        self._token: (contextvars.Token | None) = None
+
+    def __enter__(self) -> "schema_timing":
+        self._token = _timing_schema.set(self._schema)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self._token is not None:
+            _timing_schema.reset(self._token)
+
+
+def start_timings() -> contextvars.Token:
+    """
+    Starts timing the stages of answering a request, in the current context and any copied from it
+
+    :return: a token to give to stop_timings
+    """
+    return _request_timings.set(RequestTimings())
+
+
+def stop_timings(token: contextvars.Token) -> None:
+    """
+    Stops timing the stages of answering a request
+
+    :param token: The token from start_timings
+    """
+    _request_timings.reset(token)
+
+
+def get_timings() -> (RequestTimings | None):
+    """
+    Gets the timings of the request being answered
+
+    :return: the timings, or None if they aren't being recorded
+    """
+    return _request_timings.get()
+
+
+def get_timing_json() -> dict:
+    """
+    Gets the timings of the request being answered, for the timing block of a response
+
+    :return: the timings, or an empty dict if they aren't being recorded
+    """
+    timings: (RequestTimings | None) = _request_timings.get()
+    return timings.get_json() if timings is not None else {}
+
+
+def _milliseconds(seconds: float) -> float:
+    """
+    Converts a time to milliseconds, rounded for display
+
+    :param float seconds: The time in seconds
+    :return: the time in milliseconds
+    """
+    return round(seconds * 1000, 3)
+
+
+def register_cache(name: str, cache: Any) -> None:
+    """
+    Adds a cache to the hit ratios in the metrics
+
+    :param str name: The name of the cache in the metrics
+    :param cache: The cache, which must have a stats method like LRUCache's
+    """
+    _caches[name] = cache
+
+
+def render() -> str:
+    """
+    Gets every metric in the Prometheus text format
+
+    :return: the metrics
+    """
+    lines: list = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(_render_caches())
+    return "\n".join(lines) + "\n"
+
+
+def _render_caches() -> list:
+    """
+    Gets the hits, misses, hit ratio and size of each registered cache in the Prometheus text format
+
+    :return: the lines
+    """
+    stats: dict = {name: cache.stats() for name, cache in sorted(_caches.items())}
+    lines: list = []
+    for metric, kind, documentation, get_value in [
+            ("entityshape_cache_hits_total", "counter", "Lookups which found an entry in the cache",
+             lambda cache: cache["hits"]),
+            ("entityshape_cache_misses_total", "counter", "Lookups which didn't find an entry in the cache",
+             lambda cache: cache["misses"]),
+            ("entityshape_cache_hit_ratio", "gauge", "The fraction of lookups which found an entry in the cache",
+             lambda cache: cache["hits"] / (cache["hits"] + cache["misses"]) if cache["hits"] + cache["misses"] else 0),
+            ("entityshape_cache_entries", "gauge", "The number of entries in the cache",
+             lambda cache: cache["size"])]:
+        lines.extend([f"# HELP {metric} {documentation}", f"# TYPE {metric} {kind}"])
+        for name, cache in stats.items():
+            lines.append(f'{metric}{{cache="{name}"}} {_format_value(get_value(cache))}')
+    return lines
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    """
+    Formats the labels of a value of a metric
+
+    :param tuple names: The names of the labels
+    :param tuple values: The values of the labels
+    :return: the labels in braces, or an empty string if there are none
+    """
+    if not names:
+        return ""
+    labels: list = []
+    for name, value in zip(names, values):
+        escaped: str = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        labels.append(f'{name}="{escaped}"')
+    return "{" + ",".join(labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    """
+    Formats a value of a metric
+
+    :param value: The value
+    :return: the value as text
+    """
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+_registry: list = []
+_caches: dict = {}
+_request_timings: contextvars.ContextVar = contextvars.ContextVar("entityshape_request_timings", default=None)
+_timing_schema: contextvars.ContextVar = contextvars.ContextVar("entityshape_timing_schema", default="")
+
+stage_seconds: Histogram = Histogram("entityshape_stage_seconds",
+                                     "The time taken by each stage of checking entities against entityschemas",
+                                     ("stage",))
+wikidata_requests: Counter = Counter("entityshape_wikidata_requests_total",
+                                     "Requests made to wikidata, by api action and response status",
+                                     ("action", "status"))
+wikidata_request_seconds: Histogram = Histogram("entityshape_wikidata_request_seconds",
+                                                "The time taken by requests to wikidata, by api action",
+                                                ("action",))
+wikidata_requests_in_flight: Gauge = Gauge("entityshape_wikidata_requests_in_flight",
+                                           "Requests to wikidata waiting for a response")
+requests_in_flight: Gauge = Gauge("entityshape_requests_in_flight",
+                                  "Requests to entityshape being answered, by endpoint",
+                                  ("endpoint",))
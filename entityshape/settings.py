@@ -0,0 +1,35 @@
+"""
+Settings for entityshape, which can be overridden with environment variables
+"""
+import os
+
+# The wikidata site entities and entityschemas are downloaded from, e.g. a local stand-in for load testing
+WIKIDATA_URL: str = os.environ.get("ENTITYSHAPE_WIKIDATA_URL", "https://www.wikidata.org").rstrip("/")
+
+# The number of connections to wikidata kept open for reuse
+POOL_SIZE: int = int(os.environ.get("ENTITYSHAPE_POOL_SIZE", "10"))
+# The number of seconds to wait for a connection to wikidata to be made
+CONNECT_TIMEOUT: float = float(os.environ.get("ENTITYSHAPE_CONNECT_TIMEOUT", "5"))
+# The number of seconds to wait for wikidata to respond once connected
+READ_TIMEOUT: float = float(os.environ.get("ENTITYSHAPE_READ_TIMEOUT", "30"))
+# The User-Agent sent with every request to wikidata
+USER_AGENT: str = os.environ.get("ENTITYSHAPE_USER_AGENT", "Entityshape API by User:Teester")
+# The number of requests to wikidata a single comparison may make at the same time
+FETCH_WORKERS: int = int(os.environ.get("ENTITYSHAPE_FETCH_WORKERS", "4"))
+# The number of seconds a property name is kept before it is downloaded again
+LABEL_CACHE_TTL: float = float(os.environ.get("ENTITYSHAPE_LABEL_CACHE_TTL", "86400"))
+# The maximum number of property names kept in memory by each process
+LABEL_CACHE_SIZE: int = int(os.environ.get("ENTITYSHAPE_LABEL_CACHE_SIZE", "50000"))
+# The path of a sqlite database in which property names are shared between processes, if any
+LABEL_CACHE_PATH: str = os.environ.get("ENTITYSHAPE_LABEL_CACHE_PATH", "")
+# The maximum number of entities which can be checked in a single batch request
+BATCH_SIZE_LIMIT: int = int(os.environ.get("ENTITYSHAPE_BATCH_SIZE_LIMIT", "500"))
+# The number of seconds a downloaded entity may be reused for, as long as it hasn't been edited
+ENTITY_CACHE_TTL: float = float(os.environ.get("ENTITYSHAPE_ENTITY_CACHE_TTL", "60"))
+# The maximum number of bytes of memory the entities kept by each process may take, estimated from their
+# downloaded size
+ENTITY_CACHE_BYTES: int = int(os.environ.get("ENTITYSHAPE_ENTITY_CACHE_BYTES", str(64 * 1024 * 1024)))
+# The number of seconds the entityschemas linked to an item or property are kept before they are looked up again
+SCHEMA_DISCOVERY_TTL: float = float(os.environ.get("ENTITYSHAPE_SCHEMA_DISCOVERY_TTL", "3600"))
+# The number of threads the ASGI app makes blocking requests to wikidata from
+ASGI_THREADS: int = int(os.environ.get("ENTITYSHAPE_ASGI_THREADS", "200"))
@@ -0,0 +1,358 @@
+"""
+A pooled connection shared by every request entityshape makes to wikidata
+"""
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+
+from entityshape import metrics, settings
+from entityshape.cache import LRUCache
+from entityshape.labelstore import label_store
+
+API_URL: str = f"{settings.WIKIDATA_URL}/w/api.php"
+WIKI_URL: str = f"{settings.WIKIDATA_URL}/wiki"
+# wbgetentities accepts at most 50 ids in a single request
+MAX_IDS_PER_REQUEST: int = 50
+# The "has entity schema" property, linking a class or property to the entityschemas which apply to it
+ENTITY_SCHEMA_PROPERTY: str = "P12861"
+# Parsed entity json takes about five times as much memory as the downloaded text it was parsed from
+JSON_MEMORY_FACTOR: int = 5
+
+# The json of each downloaded entityschema, with the revision id and ETag it was downloaded at
+schema_store: LRUCache = LRUCache(maxsize=256)
+# The json of recently downloaded entities, with their revision id and when they expire, weighted by
+# the memory their json takes
+entity_store: LRUCache = LRUCache(maxsize=1000, maxweight=settings.ENTITY_CACHE_BYTES)
+# The entityschemas linked to recently looked up items and properties, with when they expire
+entity_schema_store: LRUCache = LRUCache(maxsize=20000)
+metrics.register_cache("schema", schema_store)
+metrics.register_cache("entity", entity_store)
+metrics.register_cache("entity_schema", entity_schema_store)
+
+
+def _create_session() -> requests.Session:
+    """
+    Creates a session which keeps connections to wikidata alive between requests
+
+    :return: the session
+    """
+    new_session: requests.Session = requests.Session()
+    _mount_adapter(new_session, settings.POOL_SIZE)
+    new_session.headers.update({'User-Agent': settings.USER_AGENT})
+    return new_session
+
+
+def _mount_adapter(target: requests.Session, pool_size: int) -> None:
+    """
+    Makes a session keep up to pool_size connections to each host open
+
+    :param target: The session
+    :param int pool_size: The number of connections
+    """
+    adapter: HTTPAdapter = HTTPAdapter(pool_connections=settings.POOL_SIZE,
+                                       pool_maxsize=pool_size)
+    target.mount("https://", adapter)
+    target.mount("http://", adapter)
+
+
+def set_pool_size(pool_size: int) -> None:
+    """
+    Keeps up to pool_size connections to wikidata open for reuse, for when more requests than
+    POOL_SIZE are made at the same time.  Connections opened beyond the size of the pool are
+    closed once their request is answered, so each later request has to connect again
+
+    :param int pool_size: The number of connections
+    """
+    _mount_adapter(session, pool_size)
+
+
+session: requests.Session = _create_session()
+
+
+def get(url: str, params: (dict | None) = None, headers: (dict | None) = None) -> Response:
+    """
+    Makes a GET request to wikidata using the shared session
+
+    :param str url: The url to request
+    :param dict params: The query parameters of the request
+    :param dict headers: Any headers to send in addition to the session's headers
+    :return: the response
+    """
+    action: str = _get_action(url, params)
+    status: str = "error"
+    metrics.wikidata_requests_in_flight.inc()
+    start: float = time.perf_counter()
+    try:
+        response: Response = session.get(url=url,
+                                         params=params,
+                                         headers=headers,
+                                         timeout=(settings.CONNECT_TIMEOUT, settings.READ_TIMEOUT))
+        status = str(response.status_code)
+        return response
+    finally:
+        metrics.wikidata_requests_in_flight.dec()
+        metrics.wikidata_request_seconds.observe(time.perf_counter() - start, action)
+        metrics.wikidata_requests.inc(action, status)
+
+
+def _get_action(url: str, params: (dict | None)) -> str:
+    """
+    Names the kind of request made to wikidata, for the metrics
+
+    :param str url: The url of the request
+    :param dict params: The query parameters of the request
+    :return: the api action, e.g. wbgetentities, or entityschema or entitydata for downloads
+    """
+    if params and "action" in params:
+        return params["action"]
+    if "/EntitySchema:" in url:
+        return "entityschema"
+    if "/Special:EntityData/" in url:
+        return "entitydata"
+    return "other"
+
+
+def schema_digest(schema_text: str) -> str:
+    """
+    Identifies a version of an entityschema by a digest of its text, for when its
+    revision id isn't known
+
+    :param str schema_text: The text of the entityschema
+    :return: the digest of the text
+    """
+    return hashlib.sha1(schema_text.encode("utf-8")).hexdigest()
+
+
+def get_schema(schema: str) -> tuple[dict, str]:
+    """
+    Gets the json of an entityschema, only downloading it again if it has been edited since
+    it was last downloaded.  The latest revision id is looked up first, and if that fails the
+    download is made conditional on the ETag of the last download
+
+    :param str schema: The entityschema, e.g. E10
+    :return: the json of the entityschema, or an empty dict if it can't be downloaded, and
+             the revision id of the entityschema, or an empty string if it isn't known
+    """
+    revision: str = get_schema_revision(schema)
+    stored: (dict | None) = schema_store.get(schema)
+    if stored is not None and revision != "" and stored["revision"] == revision:
+        return stored["json"], revision
+
+    headers: (dict | None) = None
+    if stored is not None and stored["etag"]:
+        headers = {"If-None-Match": stored["etag"]}
+    response: Response = get(url=f"{WIKI_URL}/EntitySchema:{schema}?action=raw",
+                             headers=headers)
+    if response.status_code == 304 and stored is not None:
+        json_text: dict = stored["json"]
+    elif response.status_code == 200:
+        json_text = response.json()
+    else:
+        return {}, revision
+    schema_store.set(schema, {"json": json_text,
+                              "revision": revision,
+                              "etag": response.headers.get("ETag", "")})
+    return json_text, revision
+
+
+def get_schema_revision(schema: str) -> str:
+    """
+    Gets the id of the latest revision of an entityschema from the api, which is much
+    smaller than the entityschema itself
+
+    :param str schema: The entityschema, e.g. E10
+    :return: the revision id, or an empty string if it can't be found
+    """
+    response: Response = get(url=API_URL,
+                             params={"action": "query",
+                                     "prop": "info",
+                                     "titles": f"EntitySchema:{schema}",
+                                     "format": "json"})
+    if response.status_code != 200:
+        return ""
+    pages: dict = response.json().get("query", {}).get("pages", {})
+    for page in pages.values():
+        if "lastrevid" in page:
+            return str(page["lastrevid"])
+    return ""
+
+
+def get_entity(entity: str) -> dict:
+    """
+    Gets the json of an entity from Special:EntityData.  A copy downloaded in the last
+    ENTITY_CACHE_TTL seconds is reused if the entity's latest revision id shows it hasn't been
+    edited since.  The json is shared, so it must not be modified
+
+    :param str entity: The entity, e.g. Q42
+    :return: the json of the entity, or an empty dict if it can't be downloaded
+    """
+    stored: (dict | None) = entity_store.get(entity)
+    if stored is not None and stored["expires"] > time.time() \
+            and get_entity_revision(entity) == stored["revision"]:
+        return stored["json"]
+
+    response: Response = get(url=f"{WIKI_URL}/Special:EntityData/{entity}.json")
+    if response.status_code != 200:
+        return {}
+    json_text: dict = response.json()
+    revision: str = str(json_text.get("entities", {}).get(entity, {}).get("lastrevid", ""))
+    if revision:
+        entity_store.set(entity,
+                         {"json": json_text, "revision": revision, "expires": time.time() + settings.ENTITY_CACHE_TTL},
+                         len(response.content) * JSON_MEMORY_FACTOR)
+    return json_text
+
+
+def get_entity_revision(entity: str) -> str:
+    """
+    Gets the id of the latest revision of an entity from the api, which is much smaller
+    than the entity itself
+
+    :param str entity: The entity, e.g. Q42
+    :return: the revision id, or an empty string if it can't be found
+    """
+    entities: dict = get_entities([entity], {"props": "info"})
+    if "lastrevid" not in entities.get(entity, {}):
+        return ""
+    return str(entities[entity]["lastrevid"])
+
+
+def get_revision_parent(revision: str) -> tuple[str, str]:
+    """
+    Gets the revision an edit was made to, and the latest revision of the page it was made on
+
+    :param str revision: The revision id of the edit
+    :return: the revision id before the edit and the latest revision id of the page, or empty
+             strings if they can't be found
+    """
+    response: Response = get(url=API_URL,
+                             params={"action": "query",
+                                     "prop": "info|revisions",
+                                     "revids": revision,
+                                     "rvprop": "ids",
+                                     "format": "json"})
+    if response.status_code != 200:
+        return "", ""
+    pages: dict = response.json().get("query", {}).get("pages", {})
+    for page in pages.values():
+        for page_revision in page.get("revisions", []):
+            if str(page_revision.get("revid")) == revision:
+                return str(page_revision.get("parentid", "")), str(page.get("lastrevid", ""))
+    return "", ""
+
+
+def get_claims(entity: str, prop: str) -> (list | None):
+    """
+    Gets the statements an entity has for a single property from wikidata's wbgetclaims api
+
+    :param str entity: The entity, e.g. Q42
+    :param str prop: The property, e.g. P31
+    :return: the statements, or None if they can't be downloaded
+    """
+    response: Response = get(url=API_URL,
+                             params={"action": "wbgetclaims",
+                                     "entity": entity,
+                                     "property": prop,
+                                     "format": "json"})
+    if response.status_code != 200:
+        return None
+    json_text: dict = response.json()
+    if "claims" not in json_text:
+        return None
+    return json_text["claims"].get(prop, [])
+
+
+def get_entities(ids: list, params: dict) -> dict:
+    """
+    Gets entities from wikidata's wbgetentities api, requesting each chunk of
+    ids at the same time
+
+    :param list ids: The ids of the entities to get
+    :param dict params: Any parameters to send in addition to the action and ids, e.g. props
+    :return: a dict of the json for each entity returned, by id
+    """
+    chunks: list = [ids[i:i + MAX_IDS_PER_REQUEST] for i in range(0, len(ids), MAX_IDS_PER_REQUEST)]
+    if len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(settings.FETCH_WORKERS, len(chunks))) as executor:
+            results: list = list(executor.map(lambda chunk: _get_entities_chunk(chunk, params), chunks))
+    else:
+        results = [_get_entities_chunk(chunk, params) for chunk in chunks]
+    entities: dict = {}
+    for result in results:
+        entities.update(result)
+    return entities
+
+
+def _get_entities_chunk(ids: list, params: dict) -> dict:
+    """
+    Gets a single chunk of entities from wikidata's wbgetentities api
+
+    :param list ids: The ids of the entities to get, at most MAX_IDS_PER_REQUEST
+    :param dict params: Any parameters to send in addition to the action and ids
+    :return: a dict of the json for each entity returned, by id
+    """
+    response: Response = get(url=API_URL,
+                             params={"action": "wbgetentities",
+                                     "ids": "|".join(ids),
+                                     **params,
+                                     "format": "json"})
+    json_text: dict = response.json()
+    if "entities" not in json_text:
+        return {}
+    return json_text["entities"]
+
+
+def get_entity_schemas(ids: list) -> dict:
+    """
+    Gets the entityschemas linked to items and properties with "has entity schema" (P12861),
+    only asking wikidata about those which weren't looked up in the last SCHEMA_DISCOVERY_TTL seconds
+
+    :param list ids: The items and properties, e.g. Q5 or P31
+    :return: a dict of the list of entityschemas linked to each item or property, by id,
+             in the same order as ids
+    """
+    now: float = time.time()
+    schemas: dict = {}
+    for entity in ids:
+        stored: (dict | None) = entity_schema_store.get(entity)
+        if stored is not None and stored["expires"] > now:
+            schemas[entity] = stored["schemas"]
+    missing: list = [entity for entity in dict.fromkeys(ids) if entity not in schemas]
+    if missing:
+        entities: dict = get_entities(missing, {"props": "claims"})
+        for entity in missing:
+            if entity not in entities:
+                # the request for this chunk failed, so it is looked up again next time
+                schemas[entity] = []
+                continue
+            schemas[entity] = [claim["mainsnak"]["datavalue"]["value"]["id"]
+                               for claim in entities[entity].get("claims", {}).get(ENTITY_SCHEMA_PROPERTY, [])
+                               if "datavalue" in claim["mainsnak"]]
+            entity_schema_store.set(entity, {"schemas": schemas[entity],
+                                             "expires": now + settings.SCHEMA_DISCOVERY_TTL})
+    return {entity: schemas[entity] for entity in ids}
+
+
+def get_property_names(props: list, language: str) -> dict:
+    """
+    Gets the names of properties, only asking wikidata for names which aren't in the label store
+
+    :param list props: The properties to get names for
+    :param str language: The language in which to get the property names
+    :return: a dict of property names, by property, in the same order as props
+    """
+    names: dict = label_store.get_names(props, language)
+    missing: list = [prop for prop in props if prop not in names]
+    if missing:
+        entities: dict = get_entities(missing, {"props": "labels", "languages": language})
+        downloaded: dict = {}
+        for prop in missing:
+            if prop in entities:
+                downloaded[prop] = entities[prop].get("labels", {}).get(language, {}).get("value", "")
+        label_store.set_names(downloaded, language)
+        names.update(downloaded)
+    return {prop: names.get(prop, "") for prop in props}
@@ -14,7 +14,7 @@
     let value = mw.storage.get("entityschema-auto");
     let schema = mw.storage.get("entityschema");
     let lang = mw.config.get( 'wgUserLanguage' );
-    let property_list = [];
+    let entityschema_result = null;
 
     mw.hook( 'wikibase.entityPage.entityLoaded' ).add( function ( data ) {
         let valid_values = ['item', 'lexeme', 'property'];
@@ -25,59 +25,59 @@
         $("#entityschema-schemaSearchButton").click(function(){ entityschema_update(); });
         $("#entityschema-checkbox").click(function() { entityschema_checkbox(); });
 
-        let claims = data["claims"];
-        for (let claim in claims) {
-            property_list.push(claim);
-            let statements = claims[claim];
-            for (let statement in statements) {
-                let mainsnak = statements[statement]["mainsnak"];
-                if (mainsnak["datavalue"] && mainsnak["datatype"] == "wikibase-item") {
-                    if (!property_list.includes(mainsnak["datavalue"]["value"]["id"])) {
-                        property_list.push(mainsnak["datavalue"]["value"]["id"]);
-                    }
-                }
-            }
+        if (value == "true" && !schema) {
+            // finds the schemas and checks the entity against them in a single request
+            entityschema_checkEntity(document.location.pathname.substring(6), "auto", lang);
+        } else {
+            check_entity_for_schemas(mw.config.get( 'wbEntityId' ));
         }
-        check_entity_for_schemas(property_list);
     });
 
-    mw.hook( 'wikibase.statement.saved' ).add( function ( data ) {
+    mw.hook( 'wikibase.statement.saved' ).add( function ( entityId, statementId, oldStatement, newStatement ) {
         if (value == "true") {
-            entityschema_update();
+            if (entityschema_result && newStatement) {
+                entityschema_checkDelta(document.location.pathname.substring(6),
+                                        newStatement.getClaim().getMainSnak().getPropertyId(), lang);
+            } else {
+                entityschema_update();
+            }
         }
     });
 
-    mw.hook( 'wikibase.statement.removed' ).add( function ( data ) {
+    mw.hook( 'wikibase.statement.removed' ).add( function ( entityId, statementId ) {
         if (value == "true") {
-            entityschema_update();
+            let property = entityschema_result ? entityschema_get_statement_property(statementId) : null;
+            if (property) {
+                entityschema_checkDelta(document.location.pathname.substring(6), property, lang);
+            } else {
+                entityschema_update();
+            }
         }
     });
 
-    function check_entity_for_schemas(entity_list) {
-        const api = new mw.Api({'User-Agent': 'Userscript Entityshape by User:Teester'});
-        for (let item in entity_list) {
-            api.get({
-                action: 'wbgetclaims',
-                property: 'P12861',
-                entity: entity_list[item],
-                format: 'json'})
-                .fail(function() { console.log("failed to get schemas") })
-                .done(function(data) {
-                    if (data["claims"].hasOwnProperty("P12861")) {
-                        let claims = data["claims"]["P12861"];
-                        for (let claim in claims) {
-                            entityschema_list.push(claims[claim]["mainsnak"]["datavalue"]["value"]["id"]);
-                        }
+    function check_entity_for_schemas(entity) {
+        // finds the schemas linked with P12861 to the entity's properties and item values in one request
+        let url = "https://entityshape.toolforge.org/api/v2/discover?entity=" + entity;
+        $.ajax({
+            type: "GET",
+            dataType: "json",
+            url: url,
+            success: function(data) {
+                for (let item in data["schemas"]) {
+                    if (!entityschema_list.includes(data["schemas"][item])) {
+                        entityschema_list.push(data["schemas"][item]);
                     }
-                });
-        }
+                }
+            },
+            error: function() { console.log("failed to get schemas") }
+        });
     }
 
     $(document).ajaxStop(function () {
         if (entityschema_list.length != 0) {
             $('#entityschema-entityToCheck').attr("placeholder", entityschema_translate("Check against", entityschema_list.join(', ') ) );
         }
-        if (value == "true" && mw.config.get( 'wbEntityId' )) {
+        if (value == "true" && schema && mw.config.get( 'wbEntityId' )) {
             entityschema_update();
         }
         $("#entityschema-entityToCheck:text").val(schema);
@@ -133,52 +133,110 @@
                 $(".entityshape-spinner").show();
             },
             success: function(data){
-                for (let i = 0; i < data.schema.length; i++ ) {
-                    if (data.properties[i]) {
-                        entityschema_add_to_properties(data.properties[i], data.schema[i], data.name[i]);
-                    }
-                    if (data.statements[i]) {
-                        entityschema_add_to_statements(data.statements[i], data.schema[i], data.name[i]);
-                    }
-                    if (data.general[i]) {
-                        entityschema_add_general(data.general[i]);
+                if (entitySchema == "auto") {
+                    entityschema_list = data.schema;
+                    if (entityschema_list.length != 0) {
+                        $('#entityschema-entityToCheck').attr("placeholder", entityschema_translate("Check against", entityschema_list.join(', ') ) );
                     }
                 }
+                entityschema_result = data;
+                entityschema_display(data);
+                $(".entityshape-spinner").hide();
+            },
+            error: function(data) {
+                let message = new OO.ui.MessageWidget( {type: 'error', inline: true,
+                                label: 'Unable to validate schema'} );
+                $("#entityschema-response" ).append( message.$element );
+                $(".entityshape-spinner").hide();
+            }
+        });
+    }
 
-                const combined_properties = entityschema_combine_properties(data.properties, data.schema);
+    function entityschema_display(data) {
+        $("#entityschema-response").contents().remove();
+        $(".entityschema-property").remove();
+        $(".entityschema-span").remove();
+        for (let i = 0; i < data.schema.length; i++ ) {
+            if (data.properties[i]) {
+                entityschema_add_to_properties(data.properties[i], data.schema[i], data.name[i]);
+            }
+            if (data.statements[i]) {
+                entityschema_add_to_statements(data.statements[i], data.schema[i], data.name[i]);
+            }
+            if (data.general[i]) {
+                entityschema_add_general(data.general[i]);
+            }
+        }
 
-                let message_data = [];
-                for (let schema in data.schema) {
-                    message_data.push(`<a href='https://www.wikidata.org/wiki/EntitySchema:${data.schema[schema]}'>
-                                      ${data.name[schema]} <small>(${data.schema[schema]})</small></a>`);
-                }
-                let message = `${entityschema_translate('Checking against', message_data.join(', '))}:`;
+        const combined_properties = entityschema_combine_properties(data.properties, data.schema);
 
-                let message_widget = new OO.ui.MessageWidget( {type: 'notice', inline: true,
-                                                        label: new OO.ui.HtmlSnippet( message )} );
-                $("#entityschema-response" ).append( message_widget.$element );
+        let message_data = [];
+        for (let schema in data.schema) {
+            message_data.push(`<a href='https://www.wikidata.org/wiki/EntitySchema:${data.schema[schema]}'>
+                              ${data.name[schema]} <small>(${data.schema[schema]})</small></a>`);
+        }
+        let message = `${entityschema_translate('Checking against', message_data.join(', '))}:`;
+
+        let message_widget = new OO.ui.MessageWidget( {type: 'notice', inline: true,
+                                                label: new OO.ui.HtmlSnippet( message )} );
+        $("#entityschema-response" ).append( message_widget.$element );
 
-                let html = `<div style="overflow-y: scroll; max-height:200px;">
-                            <table style="width:100%;">
-                            <th class="entityschema_table" title="${entityschema_translate('Properties in this item which must be present')}">${entityschema_translate("Required properties")}</th>
-                            <th class="entityschema_table" title="${entityschema_translate('Properties in this item which can be present but do not have to be')}">${entityschema_translate("Optional properties")}</th>
-                            <th class="entityschema_table" title="${entityschema_translate('Properties in this item which are not allowed to be present or not mentioned in the entityschema')}">${entityschema_translate("Other properties")}</th>
-                            <tr>`;
+        let html = `<div style="overflow-y: scroll; max-height:200px;">
+                    <table style="width:100%;">
+                    <th class="entityschema_table" title="${entityschema_translate('Properties in this item which must be present')}">${entityschema_translate("Required properties")}</th>
+                    <th class="entityschema_table" title="${entityschema_translate('Properties in this item which can be present but do not have to be')}">${entityschema_translate("Optional properties")}</th>
+                    <th class="entityschema_table" title="${entityschema_translate('Properties in this item which are not allowed to be present or not mentioned in the entityschema')}">${entityschema_translate("Other properties")}</th>
+                    <tr>`;
 
-                html += entityschema_process_combined_properties(combined_properties);
+        html += entityschema_process_combined_properties(combined_properties);
+
+        $("#entityschema-response" ).append( html );
+    }
 
-                $("#entityschema-response" ).append( html );
+    function entityschema_checkDelta(entity, property, language) {
+        // compares only the edited property again, and patches the last result with the response
+        let url = "https://entityshape.toolforge.org/api/v2/delta?entityschema=" + entityschema_result.schema.join(", ") + "&entity=" + entity + "&language=" + language + "&property=" + property;
+        $.ajax({
+            type: "GET",
+            dataType: "json",
+            url: url,
+            beforeSend: function() {
+                $(".entityshape-spinner").show();
+            },
+            success: function(data){
+                if (data.full) {
+                    entityschema_result = data;
+                } else {
+                    for (let i = 0; i < data.patch.length; i++ ) {
+                        for (let part of ["properties", "statements"]) {
+                            for (let key in data.patch[i][part]) {
+                                if (data.patch[i][part][key] === null) {
+                                    delete entityschema_result[part][i][key];
+                                } else {
+                                    entityschema_result[part][i][key] = data.patch[i][part][key];
+                                }
+                            }
+                        }
+                    }
+                }
+                entityschema_display(entityschema_result);
                 $(".entityshape-spinner").hide();
             },
             error: function(data) {
-                let message = new OO.ui.MessageWidget( {type: 'error', inline: true,
-                                label: 'Unable to validate schema'} );
-                $("#entityschema-response" ).append( message.$element );
-                $(".entityshape-spinner").hide();
+                entityschema_update();
             }
         });
     }
 
+    function entityschema_get_statement_property(statementId) {
+        for (let i = 0; i < entityschema_result.statements.length; i++ ) {
+            if (entityschema_result.statements[i][statementId]) {
+                return entityschema_result.statements[i][statementId].property;
+            }
+        }
+        return null;
+    }
+
     function entityschema_process_combined_properties(properties) {
         let required_html = '<td class="entityschema_table required"><ul style="list-style-type:none";>';
         let optional_html = '<td class="entityschema_table optional"><ul style="list-style-type:none";>';
@@ -0,0 +1,231 @@
+"""
+Tests to test the ASGI version of the api against the Flask app
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from entityshape import settings, wikidata
+from entityshape.app import app as flask_app
+from entityshape.asgi import app
+
+
+class ASGITests(unittest.TestCase):
+    """
+    Testcases to test that the ASGI app gives the same responses as the Flask app
+    """
+
+    def setUp(self) -> None:
+        flask_app.config["TESTING"] = True
+        self.flask_client = flask_app.test_client()
+        self.fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+        self.delay: float = 0
+        self.active: int = 0
+        self.most_active: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+        self.wikidata_patcher = patch('entityshape.wikidata.get')
+        self.mock_get = self.wikidata_patcher.start()
+        self.mock_get.side_effect = self.dynamic_mock_response
+
+    def tearDown(self) -> None:
+        self.wikidata_patcher.stop()
+
+    def load_fixture(self, target_id: str) -> dict:
+        fixture_file = os.path.join(self.fixture_path, f"{target_id}.json")
+        if not os.path.exists(fixture_file):
+            return {}
+        with open(fixture_file, 'r') as f:
+            return json.load(f)
+
+    def dynamic_mock_response(self, url, *args, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        mock_resp = MagicMock()
+        mock_resp.status_code = 200
+        params = kwargs.get('params') or {}
+        if url == "https://www.wikidata.org/w/api.php":
+            ids: list = params.get("ids", "").split("|")
+            if ids[0].startswith("P"):
+                mock_resp.json.return_value = self.load_fixture("names")
+                return mock_resp
+            entities: dict = {target_id: self.load_fixture(target_id).get("entities", {}).get(target_id, {})
+                              for target_id in ids}
+            mock_resp.json.return_value = {"entities": entities}
+            return mock_resp
+        match = re.search(r'([EQL]\d+)', url)
+        fixture = self.load_fixture(match.group(1)) if match else {}
+        if fixture:
+            mock_resp.json.return_value = fixture
+            return mock_resp
+        mock_resp.status_code = 404
+        return mock_resp
+
+    @staticmethod
+    def call(method: str, path: str, query: str = "", headers: (dict | None) = None, body: bytes = b"") -> tuple:
+        """
+        Makes a request to the ASGI app
+
+        :return: the status, headers and body of the response and the number of parts the body was sent in
+        """
+        scope: dict = {"type": "http",
+                       "method": method,
+                       "path": path,
+                       "query_string": query.encode("latin-1"),
+                       "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                   for name, value in (headers or {}).items()],
+                       "server": ("localhost", 80),
+                       "scheme": "http",
+                       "http_version": "1.1",
+                       "root_path": ""}
+        requests: list = [{"type": "http.request", "body": body, "more_body": False}]
+        messages: list = []
+
+        async def receive() -> dict:
+            return requests.pop(0)
+
+        async def send(message: dict) -> None:
+            messages.append(message)
+
+        asyncio.run(app(scope, receive, send))
+        start: dict = messages[0]
+        response_headers: dict = {name.decode("latin-1"): value.decode("latin-1") for name, value in start["headers"]}
+        parts: list = [message["body"] for message in messages[1:] if message["body"]]
+        return start["status"], response_headers, b"".join(parts), len(parts)
+
+    def assert_same_response(self, method: str, path: str, query: str = "",
+                             headers: (dict | None) = None, body: bytes = b"") -> tuple:
+        status, response_headers, response_body, parts = self.call(method, path, query, headers, body)
+        expected = self.flask_client.open(f"{path}?{query}", method=method, headers=headers, data=body)
+        self.assertEqual(expected.status_code, status)
+        self.assertEqual(expected.data, response_body)
+        for name in ["Content-Type", "Access-Control-Allow-Origin", "Vary", "Location"]:
+            self.assertEqual(expected.headers.get(name), response_headers.get(name.lower()))
+        # the timings differ between requests, so only whether they were sent is compared
+        for name in ["Server-Timing", "Timing-Allow-Origin"]:
+            self.assertEqual(name in expected.headers, name.lower() in response_headers)
+        return status, response_headers, response_body, parts
+
+    def test_v2(self):
+        """
+        Tests that checking an entity gives the same response as the Flask app
+        """
+        test_pairs: list = [("E236", "Q1728820"), ("E236, E297", "Q97179551"),
+                            ("E56", "Lexeme:L42"), ("E236", "Q0"), ("", "Q1728820"),
+                            ("auto", "Q1728820")]
+        for schema, entity in test_pairs:
+            with self.subTest(schema=schema, entity=entity):
+                status, _, body, _ = self.assert_same_response(
+                    "GET", "/api/v2/", f"entityschema={schema}&entity={entity}&language=en")
+                self.assertEqual(200, status)
+                self.assertIn(b'"statements"', body)
+
+    def test_v2_cors(self):
+        """
+        Tests that the CORS headers are the same as the Flask app's when an origin is sent
+        """
+        self.assert_same_response("GET", "/api/v2/", "entityschema=E236&entity=Q1728820&language=en",
+                                  {"Origin": "https://www.wikidata.org"})
+
+    def test_v2_downloads_at_the_same_time(self):
+        """
+        Tests that the entity and each entityschema are downloaded at the same time
+        """
+        self.delay = 0.05
+        status, _, _, _ = self.call("GET", "/api/v2/", "entityschema=E236, E297&entity=Q1728820&language=en")
+        self.assertEqual(200, status)
+        self.assertGreater(self.most_active, 1)
+
+    def test_v2_timing(self):
+        """
+        Tests that the time taken by each stage is sent for each entityschema
+        """
+        status, headers, body, _ = self.call("GET", "/api/v2/",
+                                             "entityschema=E236, E297&entity=Q1728820&language=en&debug=timing")
+        self.assertEqual(200, status)
+        timing: dict = json.loads(body)["timing"]
+        self.assertEqual(["E236", "E297"], sorted(timing["schemas"]))
+        self.assertIn("fetch-entity", timing["stages"])
+        self.assertIn('compare;desc="E297";dur=', headers["server-timing"])
+
+    def test_v2_timing_with_unusual_schemas(self):
+        """
+        Tests that entityschemas which could break the Server-Timing header are left out of it
+        """
+        status, headers, body, _ = self.assert_same_response(
+            "GET", "/api/v2/", "entityschema=E236%22%2C%20E297%0A%2C%20E236%E2%9C%93&entity=Q1728820&language=en")
+        self.assertEqual(200, status)
+        self.assertEqual("application/json", headers["content-type"])
+        self.assertEqual(['E236"', 'E297\n', 'E236\u2713'], json.loads(body)["schema"])
+        self.assertNotIn("desc", headers["server-timing"])
+        self.assertNotIn("\n", headers["server-timing"])
+
+    def test_v2_timing_header_fails(self):
+        """
+        Tests that the response is still sent if the Server-Timing header can't be made
+        """
+        with patch("entityshape.metrics.RequestTimings.get_header", side_effect=ValueError("bad header")):
+            status, headers, body, _ = self.call("GET", "/api/v2/", "entityschema=E236&entity=Q1728820&language=en")
+        self.assertEqual(200, status)
+        self.assertNotIn("server-timing", headers)
+        self.assertIn(b'"statements"', body)
+
+    def test_pool_fits_threads(self):
+        """
+        Tests that every thread can keep a connection to wikidata open
+        """
+        adapter = wikidata.session.get_adapter("https://www.wikidata.org/w/api.php")
+        self.assertGreaterEqual(adapter._pool_maxsize, settings.ASGI_THREADS)
+
+    def test_other_routes_use_flask_app(self):
+        """
+        Tests that v1, redirects and batch requests are passed to the Flask app
+        """
+        self.assert_same_response("GET", "/api/", "entityschema=E236&entity=Q1728820&language=en")
+        self.assert_same_response("GET", "/api/v2", "entityschema=E236&entity=Q1728820&language=en")
+        self.assert_same_response("POST", "/api/v2/batch",
+                                  headers={"Content-Type": "application/json"},
+                                  body=json.dumps({"entityschema": ["E236"],
+                                                   "entities": ["Q1728820", "Q100532807"],
+                                                   "language": "en"}).encode("utf-8"))
+
+    def test_ndjson_is_streamed(self):
+        """
+        Tests that streamed results are sent a line at a time
+        """
+        status, headers, body, parts = self.assert_same_response(
+            "GET", "/api/v2/", "entityschema=E236, E297&entity=Q1728820&language=en",
+            {"Accept": "application/x-ndjson"})
+        self.assertEqual(200, status)
+        self.assertEqual("application/x-ndjson", headers["content-type"])
+        self.assertEqual(2, parts)
+        self.assertEqual(2, len(body.splitlines()))
+
+    def test_lifespan(self):
+        """
+        Tests that the startup and shutdown events are answered
+        """
+        events: list = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        messages: list = []
+
+        async def receive() -> dict:
+            return events.pop(0)
+
+        async def send(message: dict) -> None:
+            messages.append(message)
+
+        asyncio.run(app({"type": "lifespan"}, receive, send))
+        self.assertEqual([{"type": "lifespan.startup.complete"}, {"type": "lifespan.shutdown.complete"}], messages)
+
+
+if __name__ == '__main__':
+    unittest.main()
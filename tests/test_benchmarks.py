@@ -0,0 +1,98 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from benchmarks import run
+from benchmarks.fixtures import FixtureWikidata
+from benchmarks.wikidata_server import WikidataServer
+from entityshape import wikidata
+from entityshape.app import app
+
+
+class BenchmarkTests(unittest.TestCase):
+
+    def test_fixture_wikidata(self):
+        fixtures = FixtureWikidata()
+        self.assertEqual(200, fixtures.get("https://www.wikidata.org/wiki/EntitySchema:E236?action=raw").status_code)
+        self.assertEqual(404, fixtures.get("https://www.wikidata.org/wiki/Special:EntityData/Q1.json").status_code)
+        response = fixtures.get("https://www.wikidata.org/w/api.php",
+                                params={"action": "wbgetentities", "ids": "Q1728820|P31", "props": "info"})
+        self.assertEqual({"id": "Q1728820", "lastrevid": 2454179461}, response.json()["entities"]["Q1728820"])
+        self.assertEqual("instance of", response.json()["entities"]["P31"]["labels"]["en"]["value"])
+
+    def test_synthetic_entity(self):
+        fixtures = FixtureWikidata()
+        entity: str = fixtures.add_synthetic_entity(250)
+        entity_json: dict = fixtures.respond(f"https://www.wikidata.org/wiki/Special:EntityData/{entity}.json")[1]
+        claims: dict = entity_json["entities"][entity]["claims"]
+        self.assertEqual(250, sum(len(claim) for claim in claims.values()))
+
+    def test_run_benchmarks(self):
+        results: dict = run.run_benchmarks(repeat=1, pairs=[("E236", "Q100532807")], sizes=[50])
+        self.assertIn("parse/E236", results["results"])
+        self.assertEqual(50, results["results"]["v2_request_warm/E236/Q900000050"]["statements"])
+        self.assertEqual(6, results["results"]["compare_statements/E236/Q100532807"]["statements"])
+
+    def test_compare(self):
+        before: dict = {"results": {"parse/E236": {"median_ms": 10.0}, "compile/E236": {"median_ms": 1.0}}}
+        after: dict = {"results": {"parse/E236": {"median_ms": 20.0}, "compile/E236": {"median_ms": 1.1}}}
+        self.assertEqual(["parse/E236: 10.000ms -> 20.000ms (+100.0%)  REGRESSION",
+                          "compile/E236: 1.000ms -> 1.100ms (+10.0%)"],
+                         run.compare(before, after, 0.2))
+
+
+class WikidataServerTests(unittest.TestCase):
+
+    def start_server(self, **options) -> WikidataServer:
+        server: WikidataServer = WikidataServer(("localhost", 0), FixtureWikidata(), **options)
+        thread: threading.Thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_fixtures_are_served(self):
+        server: WikidataServer = self.start_server()
+        response = requests.get(f"{server.url}/wiki/EntitySchema:E236?action=raw")
+        self.assertEqual(200, response.status_code)
+        self.assertIn("schemaText", response.json())
+        not_modified = requests.get(f"{server.url}/wiki/EntitySchema:E236?action=raw",
+                                    headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(304, not_modified.status_code)
+        claims = requests.get(f"{server.url}/w/api.php",
+                              params={"action": "wbgetclaims", "entity": "Q1728820", "property": "P31"}).json()
+        self.assertEqual(["P31"], list(claims["claims"]))
+        self.assertEqual(404, requests.get(f"{server.url}/wiki/Special:EntityData/Q1.json").status_code)
+
+    def test_errors(self):
+        server: WikidataServer = self.start_server(error_rate=1)
+        response = requests.get(f"{server.url}/wiki/Special:EntityData/Q1728820.json")
+        self.assertEqual(429, response.status_code)
+        self.assertEqual("1", response.headers["Retry-After"])
+        self.assertEqual({"requests": 1, "errors": 1, "timeouts": 0}, server.counts)
+
+    def test_timeouts(self):
+        server: WikidataServer = self.start_server(timeout_rate=1, timeout=0.5)
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            requests.get(f"{server.url}/wiki/Special:EntityData/Q1728820.json", timeout=0.1)
+
+    def test_app_uses_server(self):
+        server: WikidataServer = self.start_server()
+        with patch("entityshape.wikidata.get", side_effect=FixtureWikidata().get):
+            run.clear_caches()
+            expected = app.test_client().get("/api/v2/?entityschema=E236&entity=Q1728820&language=en")
+        with patch.object(wikidata, "API_URL", f"{server.url}/w/api.php"), \
+                patch.object(wikidata, "WIKI_URL", f"{server.url}/wiki"):
+            run.clear_caches()
+            response = app.test_client().get("/api/v2/?entityschema=E236&entity=Q1728820&language=en")
+        run.clear_caches()
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(expected.json, response.json)
+        self.assertGreater(server.counts["requests"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from entityshape.cache import LRUCache
+
+
+class LRUCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LRUCache(maxsize=2)
+
+    def test_get_with_nothing(self):
+        self.assertIsNone(self.cache.get("E1"))
+        self.assertEqual({"hits": 0, "misses": 1, "size": 0, "maxsize": 2}, self.cache.stats())
+
+    def test_get_with_values(self):
+        self.cache.set("E1", {"shapes": []})
+        self.assertEqual({"shapes": []}, self.cache.get("E1"))
+        self.assertEqual(1, self.cache.hits)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set("E1", 1)
+        self.cache.set("E2", 2)
+        self.cache.get("E1")
+        self.cache.set("E3", 3)
+        self.assertEqual(1, self.cache.get("E1"))
+        self.assertIsNone(self.cache.get("E2"))
+        self.assertEqual(2, len(self.cache))
+
+    def test_clear(self):
+        self.cache.set("E1", 1)
+        self.cache.get("E1")
+        self.cache.clear()
+        self.assertEqual({"hits": 0, "misses": 0, "size": 0, "maxsize": 2}, self.cache.stats())
+
+    def test_evicts_by_weight(self):
+        cache = LRUCache(maxsize=10, maxweight=100)
+        cache.set("Q1", 1, 60)
+        cache.set("Q2", 2, 30)
+        cache.set("Q1", 1, 50)
+        self.assertEqual(2, len(cache))
+        cache.set("Q3", 3, 40)
+        self.assertIsNone(cache.get("Q2"))
+        self.assertEqual(1, cache.get("Q1"))
+        cache.set("Q4", 4, 101)
+        self.assertIsNone(cache.get("Q4"))
+
+
+if __name__ == '__main__':
+    unittest.main()
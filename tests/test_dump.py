@@ -0,0 +1,142 @@
+"""
+Tests to test checking a wikidata json dump against entityschemas
+"""
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from entityshape import dump
+from entityshape.api_v2.comparejsonld import CompareJSONLD, EntityContext
+
+
+class DumpTests(unittest.TestCase):
+    """
+    Testcases to test checking a wikidata json dump against entityschemas
+    """
+    def setUp(self) -> None:
+        self.fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+        self.directory = tempfile.TemporaryDirectory()
+        self.dump_path = os.path.join(self.directory.name, "dump.json.gz")
+        self.entities: list = [self.load_fixture("Q1728820")["entities"]["Q1728820"],
+                               self.load_fixture("Q100532807")["entities"]["Q100532807"]]
+        properties: list = [{**prop, "claims": {}} for prop in self.load_fixture("names")["entities"].values()]
+        with gzip.open(self.dump_path, "wt", encoding="utf-8") as dump_file:
+            dump_file.write("[\n")
+            for entity in self.entities + properties:
+                dump_file.write(json.dumps(entity, separators=(",", ":")) + ",\n")
+            dump_file.write("]\n")
+        self.wikidata_patcher = patch('entityshape.wikidata.get')
+        self.mock_get = self.wikidata_patcher.start()
+
+    def tearDown(self) -> None:
+        self.wikidata_patcher.stop()
+        self.directory.cleanup()
+
+    def load_fixture(self, target_id: str) -> dict:
+        with open(os.path.join(self.fixture_path, f"{target_id}.json"), 'r') as f:
+            return json.load(f)
+
+    def test_parse_line(self):
+        self.assertIsNone(dump.parse_line("[\n"))
+        self.assertIsNone(dump.parse_line("]"))
+        self.assertEqual({"id": "Q1"}, dump.parse_line('{"id": "Q1"},\n'))
+
+    def test_read_property_names(self):
+        with dump.open_dump(self.dump_path) as lines:
+            names: dict = dump.read_property_names(lines, "en")
+        self.assertEqual("instance of", names["P31"])
+        self.assertNotIn("Q1728820", names)
+
+    def test_validate_dump(self):
+        with dump.open_dump(self.dump_path) as lines:
+            names: dict = dump.read_property_names(lines, "en")
+        shapes: list = dump.load_shapes([os.path.join(self.fixture_path, "E236.json")], "en")
+        self.assertEqual("E236", shapes[0][0])
+        validator: dump.DumpValidator = dump.DumpValidator(shapes, "en", names)
+        output: io.StringIO = io.StringIO()
+        with dump.open_dump(self.dump_path) as lines:
+            summary: dict = validator.validate(lines, output)
+        self.mock_get.assert_not_called()
+        results: list = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(["Q1728820", "Q100532807"], [result["entity"] for result in results[:2]])
+        self.assertEqual(len(results), summary["entities"])
+
+        context: EntityContext = EntityContext("Q1728820", "en", self.entities[0], names)
+        comparison: CompareJSONLD = CompareJSONLD(shapes[0][2], "Q1728820", "en", context)
+        self.assertEqual(comparison.get_properties(), results[0]["properties"])
+        self.assertEqual(comparison.get_statements(), results[0]["statements"])
+        self.assertEqual("instance of", results[0]["properties"]["P31"]["name"])
+        self.assertEqual(sum(len(result["properties"]) for result in results),
+                         sum(summary["properties"]["E236"].values()))
+
+    def test_validate_in_parallel(self):
+        with dump.open_dump(self.dump_path) as lines:
+            names: dict = dump.read_property_names(lines, "en")
+        shapes: list = dump.load_shapes([os.path.join(self.fixture_path, "E236.json")], "en")
+        output: io.StringIO = io.StringIO()
+        with dump.open_dump(self.dump_path) as lines:
+            summary: dict = dump.DumpValidator(shapes, "en", names).validate(lines, output)
+        parallel_output: io.StringIO = io.StringIO()
+        with dump.open_dump(self.dump_path) as lines:
+            parallel_summary: dict = dump.validate_in_parallel(lines, parallel_output, shapes, "en", names,
+                                                               processes=2, chunk_size=10)
+        self.assertEqual(output.getvalue(), parallel_output.getvalue())
+        self.assertEqual(summary, parallel_summary)
+
+    def test_validate_instance_of(self):
+        shapes: list = dump.load_shapes([os.path.join(self.fixture_path, "E236.json")], "en")
+        validator: dump.DumpValidator = dump.DumpValidator(shapes, "en", {}, ["Q5"])
+        output: io.StringIO = io.StringIO()
+        with dump.open_dump(self.dump_path) as lines:
+            summary: dict = validator.validate(lines, output)
+        results: list = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(["Q1728820"], [result["entity"] for result in results])
+        self.assertEqual(1, summary["entities"])
+
+    def test_validate_bad_lines(self):
+        shapes: list = dump.load_shapes([os.path.join(self.fixture_path, "E236.json")], "en")
+        validator: dump.DumpValidator = dump.DumpValidator(shapes, "en", {})
+        lines: list = ["[\n",
+                       '{"type":"item","id":"Q1",\n',
+                       '{"type":"item","claims":{}},\n',
+                       json.dumps(self.entities[0]) + ",\n",
+                       "]\n"]
+        output: io.StringIO = io.StringIO()
+        with patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            summary: dict = validator.validate(lines, output)
+        self.assertEqual(1, summary["entities"])
+        self.assertEqual(2, summary["errors"])
+        self.assertEqual(2, len(stderr.getvalue().splitlines()))
+        self.assertEqual("Q1728820", json.loads(output.getvalue())["entity"])
+
+    def test_main_instance_of(self):
+        output_path: str = os.path.join(self.directory.name, "results.ndjson")
+        with patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            dump.main([self.dump_path,
+                       "--schema", os.path.join(self.fixture_path, "E236.json"),
+                       "--output", output_path,
+                       "--instance-of", "Q5",
+                       "--instance-of", "Q110430875",
+                       "--processes", "2"])
+        with open(output_path, "r") as results:
+            self.assertEqual(["Q1728820", "Q100532807"], [json.loads(line)["entity"] for line in results])
+        summary: dict = json.loads(stderr.getvalue())
+        self.assertEqual(2, summary["entities"])
+        self.assertEqual(0, summary["errors"])
+
+    def test_main(self):
+        output_path: str = os.path.join(self.directory.name, "results.ndjson")
+        with patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            dump.main([self.dump_path,
+                       "--schema", os.path.join(self.fixture_path, "E236.json"),
+                       "--output", output_path])
+        with open(output_path, "r") as results:
+            self.assertEqual(json.loads(stderr.getvalue())["entities"], len(results.readlines()))
+
+
+if __name__ == '__main__':
+    unittest.main()
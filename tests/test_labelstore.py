@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from entityshape.labelstore import LabelStore
+
+
+class LabelStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "labels.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_names_with_nothing(self):
+        store = LabelStore(60)
+        self.assertEqual({}, store.get_names(["P31"], "en"))
+
+    def test_get_names_with_values(self):
+        store = LabelStore(60)
+        store.set_names({"P31": "instance of", "P279": ""}, "en")
+        self.assertEqual({"P31": "instance of", "P279": ""}, store.get_names(["P31", "P279", "P21"], "en"))
+        self.assertEqual({}, store.get_names(["P31"], "ga"))
+
+    def test_names_expire(self):
+        store = LabelStore(60)
+        with patch("entityshape.labelstore.time.time", return_value=1000):
+            store.set_names({"P31": "instance of"}, "en")
+        with patch("entityshape.labelstore.time.time", return_value=1061):
+            self.assertEqual({}, store.get_names(["P31"], "en"))
+
+    def test_names_shared_on_disk(self):
+        LabelStore(60, self.path).set_names({"P31": "instance of"}, "en")
+        store = LabelStore(60, self.path)
+        self.assertEqual({"P31": "instance of"}, store.get_names(["P31"], "en"))
+        self.assertEqual(1, store.stats()["size"])
+
+    def test_clear(self):
+        store = LabelStore(60, self.path)
+        store.set_names({"P31": "instance of"}, "en")
+        store.clear()
+        self.assertEqual({}, store.get_names(["P31"], "en"))
+
+
+if __name__ == '__main__':
+    unittest.main()
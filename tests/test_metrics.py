@@ -0,0 +1,120 @@
+"""
+Tests to test the metrics served at /metrics
+"""
+import json
+import os
+import re
+import unittest
+from unittest.mock import MagicMock, patch
+
+from entityshape import metrics, wikidata
+from entityshape.app import app
+from entityshape.cache import LRUCache
+
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        app.config["TESTING"] = True
+        self.app = app.test_client()
+        self.fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+        for metric in [metrics.stage_seconds, metrics.wikidata_requests, metrics.requests_in_flight]:
+            metric.clear()
+
+    def load_fixture(self, target_id: str) -> dict:
+        fixture_file = os.path.join(self.fixture_path, f"{target_id}.json")
+        if not os.path.exists(fixture_file):
+            return {}
+        with open(fixture_file, 'r') as f:
+            return json.load(f)
+
+    def dynamic_mock_response(self, url, *args, **kwargs):
+        mock_resp = MagicMock()
+        mock_resp.status_code = 200
+        params = kwargs.get('params') or {}
+        if url == "https://www.wikidata.org/w/api.php":
+            mock_resp.json.return_value = self.load_fixture("names") if params.get("props") == "labels" else {}
+            return mock_resp
+        match = re.search(r'([EQL]\d+)', url)
+        mock_resp.json.return_value = self.load_fixture(match.group(1)) if match else {}
+        return mock_resp
+
+    def test_histogram(self):
+        histogram = metrics.Histogram("test_seconds", "A test histogram", ("stage",), buckets=(0.1, 1.0))
+        metrics._registry.remove(histogram)
+        histogram.observe(0.05, "parse")
+        histogram.observe(0.5, "parse")
+        histogram.observe(5, "parse")
+        self.assertEqual(3, histogram.get("parse"))
+        self.assertEqual(['# HELP test_seconds A test histogram',
+                          '# TYPE test_seconds histogram',
+                          'test_seconds_bucket{stage="parse",le="0.1"} 1',
+                          'test_seconds_bucket{stage="parse",le="1"} 2',
+                          'test_seconds_bucket{stage="parse",le="+Inf"} 3',
+                          'test_seconds_sum{stage="parse"} 5.55',
+                          'test_seconds_count{stage="parse"} 3'],
+                         histogram.render())
+
+    def test_counter_and_gauge(self):
+        counter = metrics.Counter("test_total", "A test counter", ("action",))
+        gauge = metrics.Gauge("test_in_flight", "A test gauge")
+        metrics._registry.remove(counter)
+        metrics._registry.remove(gauge)
+        counter.inc("wbgetentities")
+        counter.inc("wbgetentities", amount=2)
+        counter.inc('say "hi"')
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        self.assertEqual(['# HELP test_total A test counter',
+                          '# TYPE test_total counter',
+                          'test_total{action="say \\"hi\\""} 1',
+                          'test_total{action="wbgetentities"} 3'],
+                         counter.render())
+        self.assertEqual("test_in_flight 1", gauge.render()[-1])
+
+    def test_cache_hit_ratio(self):
+        cache: LRUCache = LRUCache()
+        metrics.register_cache("test", cache)
+        self.addCleanup(metrics._caches.pop, "test")
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("a")
+        cache.get("a")
+        cache.get("b")
+        text: str = metrics.render()
+        self.assertIn('entityshape_cache_hit_ratio{cache="test"} 0.75', text)
+        self.assertIn('entityshape_cache_hits_total{cache="test"} 3', text)
+        self.assertIn('entityshape_cache_entries{cache="test"} 1', text)
+
+    def test_wikidata_requests_counted_by_action(self):
+        with patch.object(wikidata.session, "get") as mock_get:
+            mock_get.return_value.status_code = 200
+            wikidata.get(wikidata.API_URL, params={"action": "wbgetentities", "ids": "Q42"})
+            wikidata.get(f"{wikidata.WIKI_URL}/EntitySchema:E10?action=raw")
+            mock_get.return_value.status_code = 429
+            wikidata.get(f"{wikidata.WIKI_URL}/Special:EntityData/Q42.json")
+        self.assertEqual(1, metrics.wikidata_requests.get("wbgetentities", "200"))
+        self.assertEqual(1, metrics.wikidata_requests.get("entityschema", "200"))
+        self.assertEqual(1, metrics.wikidata_requests.get("entitydata", "429"))
+        self.assertEqual(0, metrics.wikidata_requests_in_flight.get())
+
+    def test_metrics_endpoint(self):
+        with patch("entityshape.wikidata.get", side_effect=self.dynamic_mock_response):
+            self.app.get('/api/v2/?entityschema=E236&entity=Q1728820&language=en')
+            self.app.get('/api/?entityschema=E236&entity=Q1728820&language=en')
+        response = self.app.get('/metrics')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("text/plain; version=0.0.4; charset=utf-8", response.content_type)
+        for stage in ["schema_fetch", "entity_fetch", "label_fetch", "statement_comparison", "property_comparison"]:
+            with self.subTest(stage=stage):
+                self.assertGreaterEqual(metrics.stage_seconds.get(stage), 2)
+        text: str = response.get_data(as_text=True)
+        self.assertIn('entityshape_stage_seconds_count{stage="statement_comparison"}', text)
+        self.assertIn('entityshape_requests_in_flight{endpoint="get_metrics"} 1', text)
+        self.assertEqual(0, metrics.requests_in_flight.get("api_v2.v2"))
+        self.assertEqual(0, metrics.requests_in_flight.get("api_v1.v1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
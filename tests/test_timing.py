@@ -0,0 +1,100 @@
+"""
+Tests to test the Server-Timing header and the timing block of responses from the api
+"""
+import json
+import os
+import re
+import unittest
+from unittest.mock import MagicMock, patch
+
+from entityshape import metrics
+from entityshape.app import app
+
+
+class TimingTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        app.config["TESTING"] = True
+        self.app = app.test_client()
+        self.fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+    def load_fixture(self, target_id: str) -> dict:
+        fixture_file = os.path.join(self.fixture_path, f"{target_id}.json")
+        if not os.path.exists(fixture_file):
+            return {}
+        with open(fixture_file, 'r') as f:
+            return json.load(f)
+
+    def dynamic_mock_response(self, url, *args, **kwargs):
+        mock_resp = MagicMock()
+        mock_resp.status_code = 200
+        params = kwargs.get('params') or {}
+        if url == "https://www.wikidata.org/w/api.php":
+            mock_resp.json.return_value = self.load_fixture("names") if params.get("props") == "labels" else {}
+            return mock_resp
+        match = re.search(r'([EQL]\d+)', url)
+        mock_resp.json.return_value = self.load_fixture(match.group(1)) if match else {}
+        return mock_resp
+
+    def test_request_timings(self):
+        timings: metrics.RequestTimings = metrics.RequestTimings()
+        timings.add("entity_fetch", 0.002)
+        timings.add("statement_comparison", 0.001, "E236")
+        timings.add("property_comparison", 0.0005, "E236")
+        timing: dict = timings.get_json()
+        self.assertEqual({"fetch-entity": 2.0, "compare": 1.5}, timing["stages"])
+        self.assertEqual({"E236": {"compare": 1.5}}, timing["schemas"])
+        header: str = timings.get_header()
+        self.assertTrue(header.startswith('fetch-entity;dur=2.0, compare;dur=1.5, compare;desc="E236";dur=1.5, '))
+        self.assertRegex(header, r"total;dur=[\d.]+$")
+
+    def test_server_timing_header(self):
+        with patch("entityshape.wikidata.get", side_effect=self.dynamic_mock_response):
+            for path in ['/api/v2/?entityschema=E236&entity=Q1728820&language=en',
+                         '/api/?entityschema=E236&entity=Q1728820&language=en']:
+                with self.subTest(path=path):
+                    response = self.app.get(path)
+                    self.assertEqual(200, response.status_code)
+                    self.assertIn("fetch-entity;dur=", response.headers["Server-Timing"])
+                    self.assertIn('compare;desc="E236";dur=', response.headers["Server-Timing"])
+                    self.assertEqual("*", response.headers["Timing-Allow-Origin"])
+                    self.assertNotIn("timing", response.json)
+
+    def test_server_timing_with_unusual_schemas(self):
+        with patch("entityshape.wikidata.get", side_effect=self.dynamic_mock_response):
+            response = self.app.get('/api/v2/?entityschema=E236%22%2C%20E297%0A%2C%20E236%E2%9C%93'
+                                    '&entity=Q1728820&language=en&debug=timing')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("application/json", response.mimetype)
+        assert response.json is not None
+        self.assertEqual(['E236"', 'E297\n', 'E236\u2713'], response.json["schema"])
+        self.assertEqual(['E236"', 'E236\u2713', 'E297\n'], sorted(response.json["timing"]["schemas"]))
+        header: str = response.headers["Server-Timing"]
+        header.encode("latin-1")
+        self.assertNotIn("desc", header)
+        self.assertNotIn("\n", header)
+        self.assertIn("compare;dur=", header)
+
+    def test_debug_timing(self):
+        with patch("entityshape.wikidata.get", side_effect=self.dynamic_mock_response):
+            response = self.app.get('/api/v2/?entityschema=E236, E297&entity=Q1728820&language=en&debug=timing')
+        timing: dict = response.json["timing"]
+        self.assertEqual(["E236", "E297"], sorted(timing["schemas"]))
+        for schema in ["E236", "E297"]:
+            with self.subTest(schema=schema):
+                self.assertIn("compare", timing["schemas"][schema])
+        # the entity is downloaded once for every entityschema
+        self.assertIn("fetch-entity", timing["stages"])
+
+    def test_streamed_responses_have_no_header(self):
+        with patch("entityshape.wikidata.get", side_effect=self.dynamic_mock_response):
+            response = self.app.get('/api/v2/?entityschema=E236&entity=Q1728820&language=en',
+                                    headers={"Accept": "application/x-ndjson"})
+            response.get_data()
+        self.assertNotIn("Server-Timing", response.headers)
+        self.assertNotIn("Server-Timing", self.app.get('/metrics').headers)
+        self.assertEqual(0, metrics.requests_in_flight.get("api_v2.v2"))
+
+
+if __name__ == '__main__':
+    unittest.main()
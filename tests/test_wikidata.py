@@ -0,0 +1,210 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from entityshape import settings, wikidata
+from entityshape.labelstore import label_store
+
+
+class WikidataTests(unittest.TestCase):
+
+    def setUp(self):
+        label_store.clear()
+        wikidata.schema_store.clear()
+        wikidata.entity_store.clear()
+        wikidata.entity_schema_store.clear()
+        self.revision: (int | None) = 100
+        self.etag: str = '"etag-100"'
+        self.schema_json: dict = {"id": "E10", "schemaText": "start = @<human>", "labels": {"en": "human"}}
+
+    def tearDown(self):
+        label_store.clear()
+        wikidata.schema_store.clear()
+        wikidata.entity_store.clear()
+        wikidata.entity_schema_store.clear()
+
+    def test_session_user_agent(self):
+        self.assertEqual(settings.USER_AGENT, wikidata.session.headers["User-Agent"])
+
+    def test_session_pool_size(self):
+        # the ASGI app makes the pool of the shared session larger when it is imported, so a new session is checked
+        adapter = wikidata._create_session().get_adapter("https://www.wikidata.org/w/api.php")
+        self.assertEqual(settings.POOL_SIZE, adapter._pool_maxsize)
+
+    def test_get_uses_session_with_timeout(self):
+        with patch.object(wikidata.session, "get") as mock_get:
+            wikidata.get(url="https://www.wikidata.org/w/api.php", params={"action": "wbgetentities"})
+        mock_get.assert_called_once_with(url="https://www.wikidata.org/w/api.php",
+                                         params={"action": "wbgetentities"},
+                                         headers=None,
+                                         timeout=(settings.CONNECT_TIMEOUT, settings.READ_TIMEOUT))
+
+    @staticmethod
+    def mock_labels(url, params=None, headers=None):
+        mock_resp = MagicMock()
+        mock_resp.json.return_value = {"entities": {
+            prop: {"id": prop, "labels": {"en": {"language": "en", "value": f"name of {prop}"}}}
+            for prop in params["ids"].split("|") if prop != "P2"}}
+        return mock_resp
+
+    def test_get_property_names_with_nothing(self):
+        with patch("entityshape.wikidata.get") as mock_get:
+            self.assertEqual({}, wikidata.get_property_names([], "en"))
+        mock_get.assert_not_called()
+
+    def test_get_property_names_chunks(self):
+        props: list = [f"P{number}" for number in range(1, 121)]
+        with patch("entityshape.wikidata.get", side_effect=self.mock_labels) as mock_get:
+            names: dict = wikidata.get_property_names(props, "en")
+        self.assertEqual(3, mock_get.call_count)
+        chunk_sizes: list = sorted(len(call.kwargs["params"]["ids"].split("|"))
+                                   for call in mock_get.call_args_list)
+        self.assertEqual([20, 50, 50], chunk_sizes)
+        self.assertEqual(props, list(names))
+        self.assertEqual("name of P120", names["P120"])
+        self.assertEqual("", names["P2"])
+
+    def test_get_property_names_only_fetches_missing(self):
+        label_store.set_names({"P31": "instance of"}, "en")
+        with patch("entityshape.wikidata.get", side_effect=self.mock_labels) as mock_get:
+            names: dict = wikidata.get_property_names(["P31", "P21"], "en")
+        self.assertEqual({"P31": "instance of", "P21": "name of P21"}, names)
+        self.assertEqual("P21", mock_get.call_args.kwargs["params"]["ids"])
+        with patch("entityshape.wikidata.get", side_effect=self.mock_labels) as mock_get:
+            wikidata.get_property_names(["P31", "P21"], "en")
+        mock_get.assert_not_called()
+
+    def mock_schema(self, url, params=None, headers=None):
+        mock_resp = MagicMock()
+        mock_resp.status_code = 200
+        mock_resp.headers = {"ETag": self.etag}
+        if url == wikidata.API_URL:
+            page: dict = {"title": params["titles"]}
+            if self.revision is not None:
+                page["lastrevid"] = self.revision
+            mock_resp.json.return_value = {"query": {"pages": {"123": page}}}
+        elif headers and headers.get("If-None-Match") == self.etag:
+            mock_resp.status_code = 304
+        else:
+            mock_resp.json.return_value = self.schema_json
+        return mock_resp
+
+    @staticmethod
+    def schema_downloads(mock_get: MagicMock) -> list:
+        return [call for call in mock_get.call_args_list if "action=raw" in call.kwargs["url"]]
+
+    def test_get_schema_unchanged_revision(self):
+        with patch("entityshape.wikidata.get", side_effect=self.mock_schema) as mock_get:
+            self.assertEqual((self.schema_json, "100"), wikidata.get_schema("E10"))
+            self.assertEqual((self.schema_json, "100"), wikidata.get_schema("E10"))
+        self.assertEqual(1, len(self.schema_downloads(mock_get)))
+        self.assertEqual("EntitySchema:E10", mock_get.call_args.kwargs["params"]["titles"])
+
+    def test_get_schema_edited(self):
+        with patch("entityshape.wikidata.get", side_effect=self.mock_schema) as mock_get:
+            wikidata.get_schema("E10")
+            self.revision = 101
+            self.etag = '"etag-101"'
+            self.schema_json = {"id": "E10", "schemaText": "start = @<person>", "labels": {}}
+            self.assertEqual((self.schema_json, "101"), wikidata.get_schema("E10"))
+        self.assertEqual(2, len(self.schema_downloads(mock_get)))
+
+    def test_get_schema_without_revision_uses_etag(self):
+        self.revision = None
+        with patch("entityshape.wikidata.get", side_effect=self.mock_schema) as mock_get:
+            wikidata.get_schema("E10")
+            self.assertEqual((self.schema_json, ""), wikidata.get_schema("E10"))
+        downloads: list = self.schema_downloads(mock_get)
+        self.assertEqual(2, len(downloads))
+        self.assertIsNone(downloads[0].kwargs["headers"])
+        self.assertEqual({"If-None-Match": '"etag-100"'}, downloads[1].kwargs["headers"])
+
+    def test_get_schema_missing(self):
+        self.revision = None
+        with patch("entityshape.wikidata.get") as mock_get:
+            mock_get.return_value.status_code = 404
+            self.assertEqual(({}, ""), wikidata.get_schema("E0"))
+        self.assertEqual(0, len(wikidata.schema_store))
+
+    def mock_entity(self, url, params=None, headers=None):
+        mock_resp = MagicMock()
+        mock_resp.status_code = 200
+        if url == wikidata.API_URL:
+            mock_resp.json.return_value = {"entities": {"Q42": {"id": "Q42", "lastrevid": self.revision}}}
+        else:
+            mock_resp.json.return_value = {"entities": {"Q42": {"id": "Q42", "lastrevid": self.revision,
+                                                                "claims": {}}}}
+            mock_resp.content = b"x" * 1000
+        return mock_resp
+
+    @staticmethod
+    def entity_downloads(mock_get: MagicMock) -> list:
+        return [call for call in mock_get.call_args_list if "Special:EntityData" in call.kwargs["url"]]
+
+    def test_get_entity_unchanged_revision(self):
+        with patch("entityshape.wikidata.get", side_effect=self.mock_entity) as mock_get:
+            first: dict = wikidata.get_entity("Q42")
+            second: dict = wikidata.get_entity("Q42")
+        self.assertIs(first, second)
+        self.assertEqual(1, len(self.entity_downloads(mock_get)))
+        self.assertEqual({"action": "wbgetentities", "ids": "Q42", "props": "info", "format": "json"},
+                         mock_get.call_args.kwargs["params"])
+
+    def test_get_entity_weighted_by_memory(self):
+        with patch("entityshape.wikidata.get", side_effect=self.mock_entity):
+            wikidata.get_entity("Q42")
+        self.assertEqual(1000 * wikidata.JSON_MEMORY_FACTOR, wikidata.entity_store._weight)
+
+    def test_get_entity_edited(self):
+        with patch("entityshape.wikidata.get", side_effect=self.mock_entity) as mock_get:
+            wikidata.get_entity("Q42")
+            self.revision = 101
+            self.assertEqual(101, wikidata.get_entity("Q42")["entities"]["Q42"]["lastrevid"])
+        self.assertEqual(2, len(self.entity_downloads(mock_get)))
+
+    def test_get_entity_expired(self):
+        with patch("entityshape.wikidata.get", side_effect=self.mock_entity) as mock_get, \
+                patch("entityshape.wikidata.time.time", side_effect=[1000, 1000 + settings.ENTITY_CACHE_TTL, 2000]):
+            wikidata.get_entity("Q42")
+            wikidata.get_entity("Q42")
+        self.assertEqual(2, mock_get.call_count)
+        self.assertEqual(2, len(self.entity_downloads(mock_get)))
+
+    def test_get_entity_missing(self):
+        with patch("entityshape.wikidata.get") as mock_get:
+            mock_get.return_value.status_code = 404
+            self.assertEqual({}, wikidata.get_entity("Q0"))
+        self.assertEqual(0, len(wikidata.entity_store))
+
+    @staticmethod
+    def mock_entity_schemas(url, params=None, headers=None):
+        mock_resp = MagicMock()
+        mock_resp.status_code = 200
+        entities: dict = {}
+        for entity in params["ids"].split("|"):
+            claims: dict = {}
+            if entity == "Q5":
+                claims["P12861"] = [{"mainsnak": {"property": "P12861", "snaktype": "value",
+                                                  "datavalue": {"value": {"id": "E10"}}}},
+                                    {"mainsnak": {"property": "P12861", "snaktype": "somevalue"}}]
+            entities[entity] = {"id": entity, "claims": claims}
+        mock_resp.json.return_value = {"entities": entities}
+        return mock_resp
+
+    def test_get_entity_schemas(self):
+        with patch("entityshape.wikidata.get", side_effect=self.mock_entity_schemas) as mock_get:
+            self.assertEqual({"P31": [], "Q5": ["E10"]}, wikidata.get_entity_schemas(["P31", "Q5"]))
+            self.assertEqual({"Q5": ["E10"], "Q42": []}, wikidata.get_entity_schemas(["Q5", "Q42"]))
+        self.assertEqual(2, mock_get.call_count)
+        self.assertEqual({"action": "wbgetentities", "ids": "Q42", "props": "claims", "format": "json"},
+                         mock_get.call_args.kwargs["params"])
+
+    def test_get_entity_schemas_expired(self):
+        with patch("entityshape.wikidata.get", side_effect=self.mock_entity_schemas) as mock_get, \
+                patch("entityshape.wikidata.time.time", side_effect=[1000, 1000 + settings.SCHEMA_DISCOVERY_TTL]):
+            wikidata.get_entity_schemas(["Q5"])
+            wikidata.get_entity_schemas(["Q5"])
+        self.assertEqual(2, mock_get.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,9 @@ from unittest.mock import MagicMock, patch
 
 import requests
 
+from entityshape import wikidata
+from entityshape.api_v1 import shape
+from entityshape.api_v1.shape import Shape
 from entityshape.app import app
 
 
@@ -21,18 +24,14 @@ class V1Tests(unittest.TestCase):
         parent_dir = os.path.dirname(os.path.dirname(__file__))
         self.fixture_path = os.path.join(parent_dir, 'fixtures')
 
-        self.schema_patcher = patch('entityshape.api_v1.shape.requests.get')
-        self.entity_patcher = patch('entityshape.api_v1.compareshape.requests.get')
-
-        self.mock_schema_get = self.schema_patcher.start()
-        self.mock_entity_get = self.entity_patcher.start()
-
-        self.mock_schema_get.side_effect = self.dynamic_mock_response
-        self.mock_entity_get.side_effect = self.dynamic_mock_response
+        self.wikidata_patcher = patch('entityshape.wikidata.get')
+        self.mock_get = self.wikidata_patcher.start()
+        self.mock_get.side_effect = self.dynamic_mock_response
+        shape.shape_cache.clear()
 
     def tearDown(self) -> None:
-        self.schema_patcher.stop()
-        self.entity_patcher.stop()
+        self.wikidata_patcher.stop()
+        shape.shape_cache.clear()
 
     def dynamic_mock_response(self, url, *args, **kwargs):
         mock_resp = MagicMock()
@@ -172,6 +171,86 @@ class V1Tests(unittest.TestCase):
             with self.subTest(prop=prop):
                 self.assertIn(response.json["properties"][prop]["response"], ["correct", "present"])
 
+    def test_required_statements_fetched_once(self):
+        """
+        Tests that the statements of an entity are only compared once, and that the values
+        of statements with required constraints are downloaded together in a single request
+        """
+        response = self.app.get('/api?entityschema=E297&entity=Q97179551&language=en',
+                                follow_redirects=True)
+        self.assertEqual(200, response.status_code)
+        actions: list = [call.kwargs.get("params", {}) for call in self.mock_get.call_args_list]
+        self.assertEqual(0, len([params for params in actions if params.get("action") == "wbgetclaims"]))
+        self.assertEqual(1, len([params for params in actions if params.get("props") == "claims"]))
+
+    def test_shape_translation(self):
+        """
+        Tests that shapes are found whether their opening bracket is on the same line as
+        their name or the next one, and that sub-shapes are translated into qualifiers
+        """
+        schema_text: str = ("PREFIX wdt: <http://www.wikidata.org/prop/direct/>\n"
+                            "start = @<human>\n"
+                            "# a comment with a <fake> {\n"
+                            "<human> EXTRA wdt:P31 {\n"
+                            "  wdt:P31 [ wd:Q5 ] ;\n"
+                            "  p:P39 @<position> * ;\n"
+                            "  wdt:P569 xsd:dateTime ?\n"
+                            "}\n"
+                            "<position>\n"
+                            "{\n"
+                            "  pq:P580 . ;\n"
+                            "}")
+        self.mock_get.side_effect = None
+        self.mock_get.return_value.status_code = 200
+        self.mock_get.return_value.json.return_value = {"schemaText": schema_text, "labels": {}}
+        schema_shape: dict = Shape("E1", "en").get_schema_shape()
+        self.assertEqual({"extra": "allowed", "allowed": ["Q5"], "cardinality": {"min": 1, "max": 1},
+                          "necessity": "required", "status": "statement"}, schema_shape["P31"])
+        self.assertEqual({"cardinality": {"min": 0, "max": 1}, "necessity": "optional", "status": "statement"},
+                         schema_shape["P569"])
+        self.assertEqual(["P580"], list(schema_shape["P39"]["qualifiers"]))
+
+    def test_schema_shape_cached(self):
+        """
+        Tests that a schema is translated once and shared between languages, and that
+        changing a translated shape doesn't change the cached one
+        """
+        english: Shape = Shape("E236", "en")
+        english.get_schema_shape()["P31"]["allowed"] = ["Q1"]
+        irish: Shape = Shape("E236", "ga")
+        self.assertEqual(1, shape.shape_cache.misses)
+        self.assertEqual(1, shape.shape_cache.hits)
+        self.assertEqual(["Q5"], irish.get_schema_shape()["P31"]["allowed"])
+        self.assertEqual("Member of the Oireachtas", english.get_name())
+        self.assertNotEqual(english.get_name(), irish.get_name())
+
+    def test_failed_download_not_cached(self):
+        """
+        Tests that a schema which can't be downloaded isn't cached as an empty shape, so it is
+        translated once wikidata answers again
+        """
+        wikidata.schema_store.clear()
+        self.addCleanup(wikidata.schema_store.clear)
+        responses: dict = {"raw": 429}
+
+        def mock_response(url, *args, **kwargs):
+            if kwargs.get("params", {}).get("action") == "query":
+                mock_resp = MagicMock()
+                mock_resp.status_code = 200
+                mock_resp.json.return_value = {"query": {"pages": {"1": {"lastrevid": 5}}}}
+                return mock_resp
+            if url.endswith("?action=raw") and responses["raw"] != 200:
+                mock_resp = MagicMock()
+                mock_resp.status_code = responses["raw"]
+                return mock_resp
+            return self.dynamic_mock_response(url, *args, **kwargs)
+
+        self.mock_get.side_effect = mock_response
+        self.assertEqual({}, Shape("E236", "en").get_schema_shape())
+        self.assertEqual(0, len(shape.shape_cache))
+        responses["raw"] = 200
+        self.assertEqual(["Q5"], Shape("E236", "en").get_schema_shape()["P31"]["allowed"])
+
     def test_entityschema_e295(self):
         """
         Tests item with cardinality of 0 evaluates correctly
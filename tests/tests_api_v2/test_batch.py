@@ -0,0 +1,163 @@
+"""
+Tests to test checking many wikidata entities against entityschemas in a single request
+"""
+import json
+import os
+import re
+import unittest
+from unittest.mock import MagicMock, patch
+
+from entityshape import settings
+from entityshape.app import app
+
+
+class BatchTests(unittest.TestCase):
+    """
+    Testcases to test the batch endpoint of the v2 api
+    """
+
+    def setUp(self) -> None:
+        app.config["TESTING"] = True
+        self.app = app.test_client()
+        parent_dir = os.path.dirname(os.path.dirname(__file__))
+        self.fixture_path = os.path.join(parent_dir, 'fixtures')
+
+        self.wikidata_patcher = patch('entityshape.wikidata.get')
+        self.mock_get = self.wikidata_patcher.start()
+        self.mock_get.side_effect = self.dynamic_mock_response
+
+    def tearDown(self) -> None:
+        self.wikidata_patcher.stop()
+
+    def load_fixture(self, target_id: str) -> dict:
+        fixture_file = os.path.join(self.fixture_path, f"{target_id}.json")
+        if not os.path.exists(fixture_file):
+            return {}
+        with open(fixture_file, 'r') as f:
+            return json.load(f)
+
+    def dynamic_mock_response(self, url, *args, **kwargs):
+        mock_resp = MagicMock()
+        mock_resp.status_code = 200
+        params = kwargs.get('params') or {}
+        if url == "https://www.wikidata.org/w/api.php":
+            ids: list = params.get("ids", "").split("|")
+            if ids[0].startswith("P"):
+                mock_resp.json.return_value = self.load_fixture("names")
+                return mock_resp
+            entities: dict = {}
+            for target_id in ids:
+                fixture: dict = self.load_fixture(target_id)
+                if fixture:
+                    entities[target_id] = fixture["entities"][target_id]
+                else:
+                    entities[target_id] = {"id": target_id, "missing": ""}
+            mock_resp.json.return_value = {"entities": entities}
+            return mock_resp
+        match = re.search(r'([EQL]\d+)', url)
+        fixture = self.load_fixture(match.group(1)) if match else {}
+        if fixture:
+            mock_resp.json.return_value = fixture
+            return mock_resp
+        mock_resp.status_code = 404
+        return mock_resp
+
+    def test_batch_matches_single_requests(self):
+        """
+        Tests that each entity in a batch gets the same result as it does when checked on its own
+        """
+        entities: list = ["Q1728820", "Q100532807"]
+        response = self.app.post('/api/v2/batch',
+                                 json={"entityschema": ["E236"], "entities": entities, "language": "en"})
+        self.assertEqual(200, response.status_code)
+        assert response.json is not None
+        self.assertEqual(["Member of the Oireachtas"], response.json["name"])
+        for entity, result in zip(entities, response.json["entities"]):
+            with self.subTest(entity=entity):
+                single = self.app.get(f'/api/v2?entityschema=E236&entity={entity}&language=en',
+                                      follow_redirects=True)
+                assert single.json is not None
+                self.assertEqual(entity, result["entity"])
+                self.assertEqual(single.json["general"], result["general"])
+                self.assertEqual(single.json["properties"], result["properties"])
+                self.assertEqual(single.json["statements"], result["statements"])
+
+    def test_batch_fetches_entities_in_bulk(self):
+        """
+        Tests that the entities in a batch are downloaded together and the schema only once
+        """
+        self.app.post('/api/v2/batch',
+                      json={"entityschema": "E236", "entities": ["Q1728820", "Q100532807"], "language": "en"})
+        urls: list = [call.kwargs["url"] for call in self.mock_get.call_args_list]
+        self.assertEqual(0, len([url for url in urls if "Special:EntityData" in url]))
+        self.assertEqual(1, len([url for url in urls if "EntitySchema:E236" in url]))
+
+    def test_batch_with_missing_entity(self):
+        """
+        Tests that an entity which doesn't exist gets empty results
+        """
+        response = self.app.post('/api/v2/batch',
+                                 json={"entityschema": ["E236"], "entities": ["Q6"], "language": "en"})
+        self.assertEqual(200, response.status_code)
+        assert response.json is not None
+        self.assertEqual([{}], response.json["entities"][0]["properties"])
+
+    def test_batch_too_large(self):
+        """
+        Tests that a batch with too many entities is rejected
+        """
+        entities: list = [f"Q{number}" for number in range(settings.BATCH_SIZE_LIMIT + 1)]
+        response = self.app.post('/api/v2/batch',
+                                 json={"entityschema": ["E236"], "entities": entities, "language": "en"})
+        self.assertEqual(400, response.status_code)
+        self.mock_get.assert_not_called()
+
+    def test_batch_with_wrong_types(self):
+        """
+        Tests that a batch whose body doesn't have the expected types is rejected with a json error
+        """
+        bodies: list = [{"entityschema": ["E236"], "entities": [42], "language": "en"},
+                        {"entityschema": ["E236"], "entities": "Q1728820", "language": "en"},
+                        {"entityschema": [236], "entities": ["Q1728820"], "language": "en"},
+                        {"entityschema": ["E236"], "entities": ["Q1728820"], "language": ["en"]},
+                        ["E236", "Q1728820"]]
+        for body in bodies:
+            with self.subTest(body=body):
+                response = self.app.post('/api/v2/batch', json=body)
+                self.assertEqual(400, response.status_code)
+                assert response.json is not None
+                self.assertIn("must be", response.json["error"])
+        self.mock_get.assert_not_called()
+
+    def test_batch_streamed_as_ndjson(self):
+        """
+        Tests that a batch is streamed as one line per entity and schema when ndjson is accepted
+        """
+        entities: list = ["Q1728820", "Q100532807"]
+        body: dict = {"entityschema": ["E236", "E297"], "entities": entities, "language": "en"}
+        response = self.app.post('/api/v2/batch', json=body, headers={"Accept": "application/x-ndjson"})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("application/x-ndjson", response.mimetype)
+        lines: list = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([(entity, schema) for entity in entities for schema in ["E236", "E297"]],
+                         [(line["entity"], line["schema"]) for line in lines])
+        result = self.app.post('/api/v2/batch', json=body).json
+        assert result is not None
+        self.assertEqual(result["entities"][1]["properties"][0], lines[2]["properties"])
+        self.assertEqual(result["entities"][1]["statements"][1], lines[3]["statements"])
+
+    def test_v2_streamed_as_ndjson(self):
+        """
+        Tests that a single entity checked against several schemas is streamed as one line per schema
+        """
+        response = self.app.get('/api/v2?entityschema=E236, E297&entity=Q1728820&language=en',
+                                headers={"Accept": "application/x-ndjson"},
+                                follow_redirects=True)
+        self.assertEqual("application/x-ndjson", response.mimetype)
+        lines: list = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(["E236", "E297"], [line["schema"] for line in lines])
+        self.assertEqual("Member of the Oireachtas", lines[0]["name"])
+
+
+if __name__ == '__main__':
+    unittest.main()
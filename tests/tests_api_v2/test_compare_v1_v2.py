@@ -22,18 +22,12 @@ class CompareV1V2Tests(unittest.TestCase):
         parent_dir = os.path.dirname(os.path.dirname(__file__))
         self.fixture_path = os.path.join(parent_dir, 'fixtures')
 
-        self.schema_patcher = patch('entityshape.api_v2.getjsonld.requests.get')
-        self.entity_patcher = patch('entityshape.api_v2.comparejsonld.requests.get')
-
-        self.mock_schema_get = self.schema_patcher.start()
-        self.mock_entity_get = self.entity_patcher.start()
-
-        self.mock_schema_get.side_effect = self.dynamic_mock_response
-        self.mock_entity_get.side_effect = self.dynamic_mock_response
+        self.wikidata_patcher = patch('entityshape.wikidata.get')
+        self.mock_get = self.wikidata_patcher.start()
+        self.mock_get.side_effect = self.dynamic_mock_response
 
     def tearDown(self) -> None:
-        self.schema_patcher.stop()
-        self.entity_patcher.stop()
+        self.wikidata_patcher.stop()
 
     def dynamic_mock_response(self, url, *args, **kwargs):
         mock_resp = MagicMock()
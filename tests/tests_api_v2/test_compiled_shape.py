@@ -0,0 +1,153 @@
+import json
+import os
+import unittest
+
+from entityshape.api_v2.comparejsonld import CompareJSONLD, EntityContext
+from entityshape.api_v2.compiledshape import CompiledShape
+
+
+class CompiledShapeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = {"type": "Schema",
+                       "start": "human",
+                       "shapes": [
+                           {"type": "Shape",
+                            "id": "human",
+                            "extra": ["http://www.wikidata.org/prop/direct/P31"],
+                            "expression": {
+                                "type": "EachOf",
+                                "expressions": [
+                                    {"type": "TripleConstraint",
+                                     "predicate": "http://www.wikidata.org/prop/direct/P31"},
+                                    {"type": "TripleConstraint",
+                                     "predicate": "http://www.wikidata.org/prop/direct/P21",
+                                     "min": 0,
+                                     "max": 1},
+                                    {"type": "TripleConstraint",
+                                     "predicate": "http://www.wikidata.org/prop/direct/P361",
+                                     "min": 0,
+                                     "max": 0}
+                                ]
+                            }}
+                       ]}
+        self.compiled_shape = CompiledShape(self.schema)
+
+    def test_start_shape(self):
+        self.assertEqual(self.schema["shapes"][0], self.compiled_shape.start_shape)
+        self.assertTrue(self.compiled_shape.has_expressions)
+
+    def test_start_shape_with_nothing(self):
+        compiled_shape = CompiledShape({})
+        self.assertEqual({}, compiled_shape.start_shape)
+        self.assertFalse(compiled_shape.has_expressions)
+        self.assertEqual([], compiled_shape.constraints("P31"))
+        self.assertEqual("absent", compiled_shape.necessity("P31"))
+
+    def test_constraints(self):
+        expressions = self.schema["shapes"][0]["expression"]["expressions"]
+        self.assertEqual([expressions[0]], self.compiled_shape.constraints("P31"))
+        self.assertEqual([expressions[0]], self.compiled_shape.triple_constraints("P31"))
+        self.assertEqual([], self.compiled_shape.constraints("P279"))
+
+    def test_necessity(self):
+        self.assertEqual("required", self.compiled_shape.necessity("P31"))
+        self.assertEqual("optional", self.compiled_shape.necessity("P21"))
+        self.assertEqual("absent", self.compiled_shape.necessity("P361"))
+        self.assertEqual("absent", self.compiled_shape.necessity("P279"))
+
+    def test_necessity_with_single_expression(self):
+        shape = {"type": "Shape",
+                 "id": "test",
+                 "expression": {"type": "TripleConstraint",
+                                "predicate": "http://www.wikidata.org/prop/direct/P31"}}
+        compiled_shape = CompiledShape({}, shape)
+        self.assertEqual("required", compiled_shape.necessity("P31"))
+        self.assertEqual([], compiled_shape.constraints("P31"))
+
+    def test_bounds(self):
+        self.assertEqual((1, 1), self.compiled_shape.bounds("P31"))
+        self.assertEqual((0, 1), self.compiled_shape.bounds("P21"))
+        self.assertEqual((1, 1), self.compiled_shape.bounds("P279"))
+
+    def test_extra(self):
+        self.assertTrue(self.compiled_shape.is_extra("P31"))
+        self.assertTrue(self.compiled_shape.is_direct_extra("P31"))
+        self.assertFalse(self.compiled_shape.is_extra("P21"))
+
+    def test_properties(self):
+        self.assertEqual(["P31", "P21", "P361"], self.compiled_shape.properties)
+
+    def test_properties_ignore_labels_and_shape_names(self):
+        schema = {"type": "Schema",
+                  "shapes": [
+                      {"type": "Shape",
+                       "id": "P1234_shape",
+                       "expression": {
+                           "type": "TripleConstraint",
+                           "predicate": "http://www.wikidata.org/prop/P569",
+                           "valueExpr": {
+                               "type": "Shape",
+                               "expression": {"type": "TripleConstraint",
+                                              "predicate": "http://www.wikidata.org/prop/qualifier/P1480"}},
+                           "annotations": [{"type": "Annotation",
+                                            "predicate": "http://www.w3.org/2000/01/rdf-schema#comment",
+                                            "object": {"value": "see P570"}}]}}
+                  ]}
+        self.assertEqual(["P569", "P1480"], CompiledShape(schema).properties)
+
+    def test_general_constraints(self):
+        schema = {"type": "Schema",
+                  "start": "verb",
+                  "shapes": [
+                      {"type": "Shape",
+                       "id": "verb",
+                       "expression": {
+                           "type": "EachOf",
+                           "expressions": [
+                               {"type": "TripleConstraint",
+                                "predicate": "http://purl.org/dc/terms/language",
+                                "valueExpr": {"type": "NodeConstraint",
+                                              "values": ["http://www.wikidata.org/entity/Q9035"]}},
+                               {"type": "TripleConstraint",
+                                "predicate": "http://wikiba.se/ontology#lexicalCategory"},
+                               {"type": "TripleConstraint",
+                                "predicate": "http://www.w3.org/2000/01/rdf-schema#label",
+                                "valueExpr": {"type": "NodeConstraint",
+                                              "values": [{"type": "Language", "languageTag": "da"}]}}
+                           ]}}
+                  ]}
+        self.assertEqual({"language": ["http://www.wikidata.org/entity/Q9035"],
+                          "lexicalCategory": []},
+                         CompiledShape(schema).general_constraints)
+        self.assertEqual({}, self.compiled_shape.general_constraints)
+
+    def test_compare_general(self):
+        fixture = os.path.join(os.path.dirname(__file__), "..", "fixtures", "L42.json")
+        with open(fixture, "r", encoding="utf-8") as lexeme_file:
+            lexeme = json.load(lexeme_file)["entities"]["L42"]
+        context = EntityContext("L42", "en", lexeme, {})
+        schema = {"type": "Schema",
+                  "start": "noun",
+                  "shapes": [
+                      {"type": "Shape",
+                       "id": "noun",
+                       "expression": {
+                           "type": "EachOf",
+                           "expressions": [
+                               {"type": "TripleConstraint",
+                                "predicate": "http://wikiba.se/ontology#lexicalCategory",
+                                "valueExpr": {"type": "NodeConstraint",
+                                              "values": ["http://www.wikidata.org/entity/Q1084"]}},
+                               {"type": "TripleConstraint",
+                                "predicate": "http://purl.org/dc/terms/language",
+                                "valueExpr": {"type": "NodeConstraint",
+                                              "values": ["http://www.wikidata.org/entity/Q9035"]}}
+                           ]}}
+                  ]}
+        comparison = CompareJSONLD(CompiledShape(schema), "L42", "en", context)
+        self.assertEqual({"lexicalCategory": "correct", "language": "incorrect"}, comparison.get_general())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,244 @@
+"""
+Tests to test comparing an entity with entityschemas again after a single property is edited
+"""
+import copy
+import json
+import os
+import re
+import unittest
+from unittest.mock import MagicMock, patch
+
+from entityshape import wikidata
+from entityshape.api_v2 import api_v2_blueprint
+from entityshape.app import app
+
+
+class DeltaTests(unittest.TestCase):
+    """
+    Testcases to test the delta endpoint of the v2 api
+    """
+
+    def setUp(self) -> None:
+        app.config["TESTING"] = True
+        self.app = app.test_client()
+        parent_dir = os.path.dirname(os.path.dirname(__file__))
+        self.fixture_path = os.path.join(parent_dir, 'fixtures')
+        # the entity as it is on wikidata, and the revision each edit was made to
+        self.entity: dict = self.load_fixture("Q1728820")
+        self.parents: dict = {}
+        # the entityschemas linked to items and properties with P12861
+        self.linked_schemas: dict = {"Q5": ["E236"], "P39": ["E297"]}
+        wikidata.entity_store.clear()
+        wikidata.entity_schema_store.clear()
+        api_v2_blueprint.result_store.clear()
+
+        self.wikidata_patcher = patch('entityshape.wikidata.get')
+        self.mock_get = self.wikidata_patcher.start()
+        self.mock_get.side_effect = self.dynamic_mock_response
+
+    def tearDown(self) -> None:
+        self.wikidata_patcher.stop()
+        wikidata.entity_store.clear()
+        wikidata.entity_schema_store.clear()
+        api_v2_blueprint.result_store.clear()
+
+    def load_fixture(self, target_id: str) -> dict:
+        fixture_file = os.path.join(self.fixture_path, f"{target_id}.json")
+        if not os.path.exists(fixture_file):
+            return {}
+        with open(fixture_file, 'r') as f:
+            return json.load(f)
+
+    def dynamic_mock_response(self, url, *args, **kwargs):
+        mock_resp = MagicMock()
+        mock_resp.status_code = 200
+        params = kwargs.get('params') or {}
+        entity_json: dict = self.entity["entities"]["Q1728820"]
+        if url == "https://www.wikidata.org/w/api.php":
+            if params.get("action") == "wbgetclaims":
+                mock_resp.json.return_value = {"claims": {params["property"]: entity_json["claims"][params["property"]]}
+                                               if params["property"] in entity_json["claims"] else {}}
+            elif params.get("action") == "query" and "revids" in params:
+                revision: int = int(params["revids"])
+                mock_resp.json.return_value = {"query": {"pages": {"1": {
+                    "title": "Q1728820", "lastrevid": entity_json["lastrevid"],
+                    "revisions": [{"revid": revision, "parentid": self.parents.get(revision, 0)}]}}}}
+            elif params.get("action") == "query":
+                mock_resp.json.return_value = {"query": {"pages": {"1": {"lastrevid": 1}}}}
+            elif params.get("props") == "claims":
+                mock_resp.json.return_value = {"entities": {target_id: {"id": target_id, "claims": {"P12861": [
+                    {"mainsnak": {"snaktype": "value", "property": "P12861", "datatype": "entity-schema",
+                                  "datavalue": {"value": {"id": schema, "entity-type": "entity-schema"},
+                                                "type": "wikibase-entityid"}}}
+                    for schema in self.linked_schemas.get(target_id, [])]}} for target_id in params["ids"].split("|")}}
+            elif params.get("ids", "").startswith("P"):
+                mock_resp.json.return_value = self.load_fixture("names")
+            else:
+                mock_resp.json.return_value = {"entities": {"Q1728820": {"id": "Q1728820",
+                                                                         "lastrevid": entity_json["lastrevid"]}}}
+            return mock_resp
+        if "Special:EntityData" in url:
+            mock_resp.json.return_value = copy.deepcopy(self.entity)
+            return mock_resp
+        match = re.search(r'(E\d+)', url)
+        fixture = self.load_fixture(match.group(1)) if match else {}
+        if fixture:
+            mock_resp.json.return_value = fixture
+            return mock_resp
+        mock_resp.status_code = 404
+        return mock_resp
+
+    def edit(self, prop: str, statements: list) -> str:
+        """
+        Replaces the statements the entity has for a property, as an edit would
+
+        :return: the revision id of the edit
+        """
+        entity_json: dict = self.entity["entities"]["Q1728820"]
+        revision: int = entity_json["lastrevid"] + 1
+        self.parents[revision] = entity_json["lastrevid"]
+        entity_json["lastrevid"] = revision
+        if statements:
+            entity_json["claims"][prop] = statements
+        else:
+            del entity_json["claims"][prop]
+        return str(revision)
+
+    def calls(self, action: str) -> list:
+        return [call for call in self.mock_get.call_args_list
+                if call.kwargs.get("params") and call.kwargs["params"].get("action") == action]
+
+    def assert_patch_matches_full_result(self, query: str, prop: str, statements: list) -> dict:
+        """
+        Checks that patching the first result gives the same result as comparing the edited entity again
+        """
+        before = self.app.get(f'/api/v2/?{query}').json
+        revision: str = self.edit(prop, statements)
+        self.mock_get.reset_mock()
+        response = self.app.get(f'/api/v2/delta?{query}&property={prop}&lastrevid={revision}').json
+        assert before is not None and response is not None
+        self.assertFalse(response["full"])
+        self.assertEqual(revision, response["lastrevid"])
+        self.assertEqual(0, len([call for call in self.mock_get.call_args_list
+                                 if "Special:EntityData" in call.kwargs["url"]]))
+        self.assertEqual(1, len(self.calls("wbgetclaims")))
+        for index, patch_json in enumerate(response["patch"]):
+            for part in ["properties", "statements"]:
+                for key, value in patch_json[part].items():
+                    if value is None:
+                        del before[part][index][key]
+                    else:
+                        before[part][index][key] = value
+        wikidata.entity_store.clear()
+        expected = self.app.get(f'/api/v2/?{query}').json
+        assert expected is not None
+        self.assertEqual(expected["properties"], before["properties"])
+        self.assertEqual(expected["statements"], before["statements"])
+        return response
+
+    def test_statement_removed(self):
+        """
+        Tests that removing a statement patches the property and removes the statement
+        """
+        statements: list = self.entity["entities"]["Q1728820"]["claims"]["P39"]
+        removed: str = statements[0]["id"]
+        response: dict = self.assert_patch_matches_full_result(
+            "entityschema=E236, E297&entity=Q1728820&language=en", "P39", statements[1:])
+        self.assertIsNone(response["patch"][0]["statements"][removed])
+        self.assertIn("P39", response["patch"][1]["properties"])
+
+    def test_property_removed(self):
+        """
+        Tests that removing every statement for a property patches it as missing or removes it
+        """
+        self.assert_patch_matches_full_result("entityschema=E236&entity=Q1728820&language=en", "P102", [])
+        self.assert_patch_matches_full_result("entityschema=E236&entity=Q1728820&language=en", "P856", [])
+
+    def test_statement_added(self):
+        """
+        Tests that adding a statement patches the property and adds the statement
+        """
+        statement: dict = copy.deepcopy(self.entity["entities"]["Q1728820"]["claims"]["P21"][0])
+        statement["id"] = "Q1728820$new"
+        statement["mainsnak"]["datavalue"]["value"]["id"] = "Q6581072"
+        statements: list = self.entity["entities"]["Q1728820"]["claims"]["P21"] + [statement]
+        response: dict = self.assert_patch_matches_full_result(
+            "entityschema=E236&entity=Q1728820&language=en", "P21", statements)
+        self.assertIn("Q1728820$new", response["patch"][0]["statements"])
+
+    def test_consecutive_edits(self):
+        """
+        Tests that a patched result can be patched again
+        """
+        statements: list = self.entity["entities"]["Q1728820"]["claims"]["P39"]
+        self.assert_patch_matches_full_result("entityschema=E236&entity=Q1728820&language=en", "P39", statements[1:])
+        self.assert_patch_matches_full_result("entityschema=E236&entity=Q1728820&language=en", "P39", statements[2:])
+
+    def test_auto(self):
+        """
+        Tests that a result for discovered entityschemas is patched if the edit doesn't change
+        which entityschemas are discovered
+        """
+        statements: list = self.entity["entities"]["Q1728820"]["claims"]["P39"]
+        response: dict = self.assert_patch_matches_full_result("entityschema=auto&entity=Q1728820&language=en",
+                                                               "P39", statements[1:])
+        self.assertEqual(["E297", "E236"], response["schema"])
+        response = self.app.get('/api/v2/delta?entityschema=E297, E236&entity=Q1728820&language=en&property=P39').json
+        assert response is not None
+        self.assertEqual({"schema": ["E297", "E236"], "lastrevid": response["lastrevid"], "full": False,
+                          "patch": [{}, {}], "error": ""}, response)
+
+    def test_auto_discovery_changed(self):
+        """
+        Tests that the whole entity is compared again if the edit changes which entityschemas are discovered
+        """
+        self.app.get('/api/v2/?entityschema=auto&entity=Q1728820&language=en')
+        revision: str = self.edit("P39", [])
+        response = self.app.get(f'/api/v2/delta?entityschema=auto&entity=Q1728820&language=en'
+                                f'&property=P39&lastrevid={revision}').json
+        assert response is not None
+        self.assertTrue(response["full"])
+        self.assertEqual(["E236"], response["schema"])
+
+    def test_unchanged(self):
+        """
+        Tests that an empty patch is returned if the entity hasn't been edited since it was compared
+        """
+        self.app.get('/api/v2/?entityschema=E236&entity=Q1728820&language=en')
+        response = self.app.get('/api/v2/delta?entityschema=E236&entity=Q1728820&language=en&property=P39')
+        self.assertEqual({"schema": ["E236"], "lastrevid": "2454179461", "full": False, "patch": [{}], "error": ""},
+                         response.json)
+
+    def test_stored_result_not_changed_by_timing(self):
+        """
+        Tests that the timing block added to a response isn't added to the stored result
+        """
+        response = self.app.get('/api/v2/?entityschema=E236&entity=Q1728820&language=en&debug=timing')
+        assert response.json is not None
+        self.assertIn("timing", response.json)
+        stored: dict = api_v2_blueprint.result_store.get(("Q1728820", ("E236",), "en"))
+        self.assertNotIn("timing", stored["payload"])
+        # entities can be large, so only the revision they were compared at is kept
+        self.assertEqual(["payload", "revision"], sorted(stored))
+
+    def test_missed_edit_compares_again(self):
+        """
+        Tests that the whole entity is compared again if there has been another edit since the
+        last comparison, or there is no last comparison
+        """
+        response = self.app.get('/api/v2/delta?entityschema=E236&entity=Q1728820&language=en&property=P39')
+        assert response.json is not None
+        self.assertTrue(response.json["full"])
+        self.edit("P856", [])
+        revision: str = self.edit("P39", [])
+        response = self.app.get(f'/api/v2/delta?entityschema=E236&entity=Q1728820&language=en'
+                                f'&property=P39&lastrevid={revision}')
+        assert response.json is not None
+        self.assertTrue(response.json["full"])
+        self.assertEqual(revision, response.json["lastrevid"])
+        self.assertNotIn("P856", response.json["properties"][0])
+        self.assertEqual(0, len(self.calls("wbgetclaims")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+Tests to test finding the entityschemas which may apply to a wikidata entity
+"""
+import json
+import os
+import re
+import unittest
+from unittest.mock import MagicMock, patch
+
+from entityshape import wikidata
+from entityshape.app import app
+
+
+class DiscoverTests(unittest.TestCase):
+    """
+    Testcases to test the discover endpoint of the v2 api
+    """
+
+    def setUp(self) -> None:
+        app.config["TESTING"] = True
+        self.app = app.test_client()
+        parent_dir = os.path.dirname(os.path.dirname(__file__))
+        self.fixture_path = os.path.join(parent_dir, 'fixtures')
+        # the entityschemas linked to items and properties with P12861
+        self.linked_schemas: dict = {"Q5": ["E236"], "P31": ["E236"], "Q27": ["E297", "E236"]}
+        wikidata.entity_store.clear()
+        wikidata.entity_schema_store.clear()
+
+        self.wikidata_patcher = patch('entityshape.wikidata.get')
+        self.mock_get = self.wikidata_patcher.start()
+        self.mock_get.side_effect = self.dynamic_mock_response
+
+    def tearDown(self) -> None:
+        self.wikidata_patcher.stop()
+        wikidata.entity_store.clear()
+        wikidata.entity_schema_store.clear()
+
+    def load_fixture(self, target_id: str) -> dict:
+        fixture_file = os.path.join(self.fixture_path, f"{target_id}.json")
+        if not os.path.exists(fixture_file):
+            return {}
+        with open(fixture_file, 'r') as f:
+            return json.load(f)
+
+    def dynamic_mock_response(self, url, *args, **kwargs):
+        mock_resp = MagicMock()
+        mock_resp.status_code = 200
+        params = kwargs.get('params') or {}
+        if url == "https://www.wikidata.org/w/api.php":
+            entities: dict = {}
+            for target_id in params.get("ids", "").split("|"):
+                claims: list = [{"mainsnak": {"snaktype": "value", "property": "P12861", "datatype": "entity-schema",
+                                              "datavalue": {"value": {"id": schema, "entity-type": "entity-schema"},
+                                                            "type": "wikibase-entityid"}}}
+                                for schema in self.linked_schemas.get(target_id, [])]
+                entities[target_id] = {"id": target_id, "claims": {"P12861": claims} if claims else {}}
+            mock_resp.json.return_value = {"entities": entities}
+            return mock_resp
+        match = re.search(r'([EQL]\d+)', url)
+        fixture = self.load_fixture(match.group(1)) if match else {}
+        if fixture:
+            mock_resp.json.return_value = fixture
+            return mock_resp
+        mock_resp.status_code = 404
+        return mock_resp
+
+    def wbgetentities_calls(self) -> list:
+        return [call for call in self.mock_get.call_args_list
+                if call.kwargs.get("params", {}).get("action") == "wbgetentities"]
+
+    def test_discover(self):
+        """
+        Tests that the entityschemas linked to the properties and item values of an entity are
+        found in bulk, without duplicates
+        """
+        response = self.app.get('/api/v2/discover?entity=Q1728820')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({"entity": "Q1728820", "schemas": ["E236", "E297"], "error": ""}, response.json)
+        calls: list = self.wbgetentities_calls()
+        self.assertEqual(2, len(calls))
+        ids: list = [entity for call in calls for entity in call.kwargs["params"]["ids"].split("|")]
+        self.assertIn("P31", ids)
+        self.assertIn("Q5", ids)
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(call.kwargs["params"]["props"] == "claims" for call in calls))
+
+    def test_discover_caches_linked_ids(self):
+        """
+        Tests that the entityschemas of linked items are only looked up once
+        """
+        self.app.get('/api/v2/discover?entity=Q1728820')
+        self.mock_get.reset_mock()
+        response = self.app.get('/api/v2/discover?entity=Q100532807')
+        assert response.json is not None
+        self.assertEqual(["E236", "E297"], response.json["schemas"])
+        ids: list = [entity for call in self.wbgetentities_calls()
+                     if call.kwargs["params"].get("props") == "claims"
+                     for entity in call.kwargs["params"]["ids"].split("|")]
+        self.assertEqual(["P279", "P361", "P17", "P1001", "P12861", "Q100532772", "Q3039797", "Q110430875"], ids)
+
+    def test_discover_missing_entity(self):
+        """
+        Tests that an entity which doesn't exist has no entityschemas
+        """
+        response = self.app.get('/api/v2/discover?entity=Q0')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({"entity": "Q0", "schemas": [], "error": ""}, response.json)
+
+    def test_v2_auto(self):
+        """
+        Tests that entityschema=auto checks the entity against the discovered entityschemas,
+        downloading the entity only once
+        """
+        response = self.app.get('/api/v2/?entityschema=auto&entity=Q1728820&language=en')
+        self.assertEqual(200, response.status_code)
+        downloads: list = [call for call in self.mock_get.call_args_list if "Special:EntityData" in call.kwargs["url"]]
+        self.assertEqual(1, len(downloads))
+        wikidata.entity_store.clear()
+        expected = self.app.get('/api/v2/?entityschema=E236, E297&entity=Q1728820&language=en')
+        self.assertEqual(expected.json, response.json)
+        assert response.json is not None
+        self.assertEqual(["E236", "E297"], response.json["schema"])
+
+    def test_v2_auto_with_other_schemas(self):
+        """
+        Tests that auto can be given along with other entityschemas, without checking any twice
+        """
+        response = self.app.get('/api/v2/?entityschema=E297, AUTO&entity=Q1728820&language=en')
+        assert response.json is not None
+        self.assertEqual(["E297", "E236"], response.json["schema"])
+
+    def test_v2_auto_streamed(self):
+        """
+        Tests that entityschema=auto streams a line for each discovered entityschema
+        """
+        response = self.app.get('/api/v2/?entityschema=auto&entity=Q1728820&language=en',
+                                headers={"Accept": "application/x-ndjson"})
+        lines: list = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(["E236", "E297"], [line["schema"] for line in lines])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Tests to test the caching of parsed schemas in getjsonld.py
+"""
+import json
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from entityshape.api_v2 import getjsonld
+from entityshape.api_v2.getjsonld import JSONLDShape
+
+
+class JSONLDShapeTests(unittest.TestCase):
+    """
+    Testcases to test the caching of parsed schemas
+    """
+    def setUp(self) -> None:
+        parent_dir = os.path.dirname(os.path.dirname(__file__))
+        with open(os.path.join(parent_dir, 'fixtures', 'E236.json'), 'r') as f:
+            self.schema_json: dict = json.load(f)
+
+        self.schema_patcher = patch('entityshape.wikidata.get')
+        self.mock_schema_get = self.schema_patcher.start()
+        self.mock_schema_get.side_effect = self.mock_response
+        self.parse_patcher = patch('entityshape.api_v2.getjsonld.parse', wraps=getjsonld.parse)
+        self.mock_parse = self.parse_patcher.start()
+        getjsonld.schema_cache.clear()
+
+    def tearDown(self) -> None:
+        self.schema_patcher.stop()
+        self.parse_patcher.stop()
+        getjsonld.schema_cache.clear()
+
+    def mock_response(self, url, *args, **kwargs):
+        mock_resp = MagicMock()
+        mock_resp.status_code = 200
+        mock_resp.json.return_value = self.schema_json
+        return mock_resp
+
+    def test_schema_is_parsed_once(self):
+        first: dict = JSONLDShape("E236", "en").get_json_ld()
+        second: dict = JSONLDShape("E236", "en").get_json_ld()
+        self.assertEqual(first, second)
+        self.assertEqual(1, self.mock_parse.call_count)
+        self.assertEqual(1, getjsonld.schema_cache.hits)
+        self.assertEqual(1, getjsonld.schema_cache.misses)
+
+    def test_cached_schema_is_not_shared(self):
+        first: dict = JSONLDShape("E236", "en").get_json_ld()
+        first["shapes"].clear()
+        second: dict = JSONLDShape("E236", "en").get_json_ld()
+        self.assertNotEqual([], second["shapes"])
+
+    def test_edited_schema_is_parsed_again(self):
+        JSONLDShape("E236", "en").get_json_ld()
+        self.schema_json = dict(self.schema_json)
+        self.schema_json["schemaText"] += "\n# an edit"
+        JSONLDShape("E236", "en").get_json_ld()
+        self.assertEqual(2, self.mock_parse.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,20 +22,9 @@ class JSONLDTests(unittest.TestCase):
         parent_dir = os.path.dirname(os.path.dirname(__file__))
         cls.fixture_path = os.path.join(parent_dir, 'fixtures')
 
-        cls.patcher_item_v1 = patch('entityshape.api_v1.compareshape.requests.get')
-        cls.patcher_schema_v1 = patch('entityshape.api_v1.shape.requests.get')
-        cls.patcher_item_v2 = patch('entityshape.api_v2.comparejsonld.requests.get')
-        cls.patcher_schema_v2 = patch('entityshape.api_v2.getjsonld.requests.get')
-
-        cls.mock_item_v1 = cls.patcher_item_v1.start()
-        cls.mock_schema_v1 = cls.patcher_schema_v1.start()
-        cls.mock_item_v2 = cls.patcher_item_v2.start()
-        cls.mock_schema_v2 = cls.patcher_schema_v2.start()
-
-        cls.mock_item_v1.side_effect = cls.dynamic_mock_response
-        cls.mock_schema_v1.side_effect = cls.dynamic_mock_response
-        cls.mock_item_v2.side_effect = cls.dynamic_mock_response
-        cls.mock_schema_v2.side_effect = cls.dynamic_mock_response
+        cls.wikidata_patcher = patch('entityshape.wikidata.get')
+        cls.mock_get = cls.wikidata_patcher.start()
+        cls.mock_get.side_effect = cls.dynamic_mock_response
 
         language: str = "en"
         schema: str = "E236"
@@ -47,11 +36,8 @@ class JSONLDTests(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls) -> None:
-        # Stop the patchers when the class is finished
-        cls.patcher_item_v1.stop()
-        cls.patcher_schema_v1.stop()
-        cls.patcher_item_v2.stop()
-        cls.patcher_schema_v2.stop()
+        # Stop the patcher when the class is finished
+        cls.wikidata_patcher.stop()
 
     @staticmethod
     def dynamic_mock_response(url, *args, **kwargs):
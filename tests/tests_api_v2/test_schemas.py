@@ -24,18 +24,12 @@ class SchemasTests(unittest.TestCase):
         parent_dir = os.path.dirname(os.path.dirname(__file__))
         self.fixture_path = os.path.join(parent_dir, 'fixtures')
 
-        self.schema_patcher = patch('entityshape.api_v2.getjsonld.requests.get')
-        self.entity_patcher = patch('entityshape.api_v2.comparejsonld.requests.get')
-
-        self.mock_schema_get = self.schema_patcher.start()
-        self.mock_entity_get = self.entity_patcher.start()
-
-        self.mock_schema_get.side_effect = self.dynamic_mock_response
-        self.mock_entity_get.side_effect = self.dynamic_mock_response
+        self.wikidata_patcher = patch('entityshape.wikidata.get')
+        self.mock_get = self.wikidata_patcher.start()
+        self.mock_get.side_effect = self.dynamic_mock_response
 
     def tearDown(self) -> None:
-        self.schema_patcher.stop()
-        self.entity_patcher.stop()
+        self.wikidata_patcher.stop()
 
     def load_fixture(self, filename):
         with open(os.path.join(self.fixture_path, filename), 'r') as f:
@@ -444,6 +438,22 @@ class SchemasTests(unittest.TestCase):
                                 follow_redirects=True)
         self.assertEqual(200, response.status_code)
 
+    def test_multiple_entityschemas_fetch_entity_once(self):
+        """
+        Tests that the entity is only downloaded once when checked against several schemas
+
+        This test tests entityschemas E236 and E297 against entity Q1728820 and checks that
+        Special:EntityData is only requested once and both schemas are assessed
+        """
+        response = self.app.get('/api/v2?entityschema=E236, E297&entity=Q1728820&language=en',
+                                follow_redirects=True)
+        self.assertEqual(200, response.status_code)
+        assert response.json is not None
+        self.assertEqual(2, len(response.json["properties"]))
+        entity_calls: list = [call for call in self.mock_get.call_args_list
+                              if "Special:EntityData" in call.kwargs["url"]]
+        self.assertEqual(1, len(entity_calls))
+
 
 if __name__ == '__main__':
     unittest.main()